@@ -0,0 +1,78 @@
+"""
+Inner Bloom Extraction Benchmark
+Times each HTML extractor backend over the saved page fixtures and checks they agree
+
+Run from backend/:  python -m benchmarks.extract_benchmark [--repeat N]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+from src.html_extract import BACKENDS
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixtures():
+    fixtures = {}
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if name.endswith('.html'):
+            with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+                fixtures[name] = f.read()
+    return fixtures
+
+
+def time_backend(extractor, body, repeat):
+    extractor.extract(body)  # warm-up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        extractor.extract(body)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    fixtures = load_fixtures()
+    backends = {name: cls() for name, cls in BACKENDS.items() if cls.available()}
+    missing = sorted(set(BACKENDS) - set(backends))
+    if missing:
+        print(f"Not installed, skipped: {', '.join(missing)}")
+
+    print(f"{'fixture':<22}{'KB':>6}" + "".join(f"{name + ' ms':>12}" for name in backends)
+          + ("   speedup vs soup" if 'soup' in backends else ""))
+
+    totals = dict.fromkeys(backends, 0.0)
+    mismatches = []
+    for fixture, body in fixtures.items():
+        timings = {name: time_backend(extractor, body, args.repeat) for name, extractor in backends.items()}
+        for name, ms in timings.items():
+            totals[name] += ms
+
+        row = f"{fixture:<22}{len(body) // 1024:>6}" + "".join(f"{ms:>12.3f}" for ms in timings.values())
+        if 'soup' in timings:
+            row += "   " + ", ".join(f"{name} {timings['soup'] / ms:.1f}x"
+                                     for name, ms in timings.items() if name != 'soup')
+        print(row)
+
+        # Every backend should produce exactly what the reference path produces
+        reference_name = 'soup' if 'soup' in backends else next(iter(backends))
+        reference = backends[reference_name].extract(body)
+        for name, extractor in backends.items():
+            result = extractor.extract(body)
+            if (result.title, result.content, sorted(result.keywords)) != \
+                    (reference.title, reference.content, sorted(reference.keywords)):
+                mismatches.append((fixture, name, reference_name))
+
+    print(f"{'total':<28}" + "".join(f"{ms:>12.3f}" for ms in totals.values()))
+    for fixture, name, reference_name in mismatches:
+        print(f"MISMATCH: {name} differs from {reference_name} on {fixture}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Inner Bloom Template Benchmark
+Renders per second for the daily_inspiration newsletter, per-recipient parsing vs compiled vs split rendering
+
+Run from backend/:  python -m benchmarks.template_benchmark [--recipients N]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+from jinja2 import Template
+
+from src.db_pool import connection
+from src.newsletter_system import NewsletterSystem
+
+TEMPLATE = 'daily_inspiration'
+CAMPAIGN_DATA = {
+    'date': 'October 17, 2026',
+    'affirmation_title': 'Divine Empowerment Affirmation',
+    'daily_affirmation': 'I am divinely guided, abundantly blessed, and powerfully equipped for my purpose.',
+    'daily_message': 'Today, remember that you are not here by accident.',
+    'action_step': 'Write down three things you\'re grateful for.',
+    'platform_url': 'https://innerbloom.com'
+}
+
+
+def per_recipient(system, recipients):
+    """What send_template_email used to do: look up and parse the template for every message"""
+    rendered = []
+    for recipient in recipients:
+        with connection(system.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT subject_template, html_template FROM email_templates WHERE name = ?', (TEMPLATE,))
+            subject_template, html_template = cursor.fetchone()
+        data = dict(CAMPAIGN_DATA, **recipient)
+        rendered.append((Template(subject_template).render(**data), Template(html_template).render(**data)))
+    return rendered
+
+
+def compiled(system, recipients):
+    template = system.templates.get(TEMPLATE)
+    return [template.render(**dict(CAMPAIGN_DATA, **recipient))[:2] for recipient in recipients]
+
+
+def split(system, recipients):
+    renderer = system.templates.get(TEMPLATE).campaign(CAMPAIGN_DATA)
+    return [rendered[:2] for rendered in renderer.render_batch(recipients)]
+
+
+PIPELINES = {'per-recipient': per_recipient, 'compiled': compiled, 'split': split}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--recipients', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    recipients = [{'name': f"Sister {i}", 'email': f"sister{i}@example.com"} for i in range(args.recipients)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        system = NewsletterSystem(os.path.join(directory, 'benchmark.db'))
+        system.setup_email_templates()
+
+        print(f"{'pipeline':<16}{'seconds':>10}{'renders/s':>14}{'speedup':>10}")
+        outputs = {}
+        baseline = None
+        for name, pipeline in PIPELINES.items():
+            system.templates.invalidate()
+            started = time.perf_counter()
+            outputs[name] = pipeline(system, recipients)
+            seconds = time.perf_counter() - started
+            baseline = baseline or seconds
+            print(f"{name:<16}{seconds:>10.3f}{len(recipients) / seconds:>14,.0f}{baseline / seconds:>9.1f}x")
+
+    reference = outputs['per-recipient']
+    mismatches = [name for name, output in outputs.items() if output != reference]
+    for name in mismatches:
+        print(f"MISMATCH: {name} output differs from per-recipient rendering")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,6 +6,9 @@ cd /home/ubuntu/inner_bloom_backend
 # Install dependencies from requirements.txt
 pip install -r requirements.txt
 
+# Create tables once, before any worker starts
+python -m src.manage migrate
+
 # Run the Flask application
 python src/main.py
 
@@ -0,0 +1,274 @@
+"""
+Inner Bloom AI Client
+Pooled OpenAI HTTP session with timeouts, retries, a circuit breaker and a per-key concurrency limit
+"""
+
+import os
+import json
+import time
+import random
+import logging
+import threading
+from typing import Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+AI_CONNECT_TIMEOUT = float(os.getenv('AI_CONNECT_TIMEOUT', 5))
+AI_READ_TIMEOUT = float(os.getenv('AI_READ_TIMEOUT', 30))  # also the longest gap between streamed chunks
+AI_POOL_SIZE = int(os.getenv('AI_POOL_SIZE', 10))
+AI_MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', 2))
+AI_RETRY_BACKOFF = float(os.getenv('AI_RETRY_BACKOFF', 0.5))
+AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', 8))  # requests in flight per API key
+AI_QUEUE_TIMEOUT = float(os.getenv('AI_QUEUE_TIMEOUT', 10))
+AI_BREAKER_FAILURES = int(os.getenv('AI_BREAKER_FAILURES', 5))
+AI_BREAKER_RESET_SECONDS = float(os.getenv('AI_BREAKER_RESET_SECONDS', 30))
+MAX_RETRY_AFTER = 10.0
+
+# Worth another attempt: rate limited, or the upstream is overloaded or restarting
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+class AIUnavailable(Exception):
+    """Raised without calling the API when it is known to be down or saturated"""
+
+
+class CircuitOpenError(AIUnavailable):
+    """The circuit breaker is open after repeated upstream failures"""
+
+
+class ConcurrencyLimitError(AIUnavailable):
+    """No request slot for the API key became free in time"""
+
+
+def is_transient(error) -> bool:
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code in RETRY_STATUSES
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+class CircuitBreaker:
+    """Stops calls to an upstream that keeps failing, and lets one probe through to test recovery.
+
+    After ``failure_threshold`` consecutive failed calls the circuit opens
+    and calls fail at once. After ``reset_seconds`` the next call is let
+    through as a probe. If the probe succeeds the circuit closes; if it
+    fails the circuit opens again.
+    """
+
+    def __init__(self, failure_threshold=AI_BREAKER_FAILURES, reset_seconds=AI_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if self._probing or time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half_open'
+        return 'open'
+
+    def admit(self) -> Optional[bool]:
+        """None if the call is refused, True if it is the half-open probe, else False"""
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if self._probing or time.monotonic() - self.opened_at < self.reset_seconds:
+                return None
+            self._probing = True
+            return True
+
+    def allow(self) -> bool:
+        return self.admit() is not None
+
+    def abandon_probe(self):
+        """The probe ended without a verdict (cancelled or never sent); let the next call probe"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("AI circuit closed; upstream recovered")
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._probing:
+                    logger.warning(f"AI circuit open after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+_key_slots = {}
+_key_slots_lock = threading.Lock()
+
+
+def _slots_for(api_key, limit) -> threading.BoundedSemaphore:
+    """One semaphore per API key, shared by every client in the process"""
+    with _key_slots_lock:
+        slots = _key_slots.get(api_key)
+        if slots is None:
+            slots = _key_slots[api_key] = threading.BoundedSemaphore(limit)
+        return slots
+
+
+class AIClient:
+    """Calls the OpenAI HTTP API over one keep-alive session.
+
+    Connections are pooled, so calls after the first skip the TCP and TLS
+    handshakes. Every request has connect and read timeouts. Timeouts,
+    connection errors, 429 and 5xx are retried with jittered exponential
+    backoff, honouring ``Retry-After``. A call that still fails counts
+    toward the circuit breaker; while it is open, calls raise
+    ``CircuitOpenError`` at once so callers can use their canned fallback.
+    """
+
+    def __init__(self, api_key=None, api_base=None, connect_timeout=AI_CONNECT_TIMEOUT,
+                 read_timeout=AI_READ_TIMEOUT, pool_size=AI_POOL_SIZE, max_retries=AI_MAX_RETRIES,
+                 backoff=AI_RETRY_BACKOFF, max_concurrency=AI_MAX_CONCURRENCY,
+                 queue_timeout=AI_QUEUE_TIMEOUT, breaker=None):
+        self.api_key = api_key
+        self.api_base = (api_base or "https://api.openai.com/v1").rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = _slots_for(api_key, max_concurrency)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        })
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'failures': 0, 'short_circuited': 0, 'queue_timeouts': 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def _acquire(self) -> bool:
+        """Take a request slot; returns whether this call is the breaker's half-open probe"""
+        probe = self.breaker.admit()
+        if probe is None:
+            self._count('short_circuited')
+            raise CircuitOpenError("AI API unavailable; circuit open")
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count('queue_timeouts')
+            if probe:
+                self.breaker.abandon_probe()
+            raise ConcurrencyLimitError(f"No AI request slot free after {self.queue_timeout}s")
+        return probe
+
+    def _release(self, probe, settled):
+        # Every exit path gives up the slot, and a probe without a verdict
+        # must not leave the breaker half-open for good
+        if probe and not settled:
+            self.breaker.abandon_probe()
+        self._slots.release()
+
+    def _open(self, endpoint, payload, stream=False) -> requests.Response:
+        """POST with retries; returns a successful response or raises the last error"""
+        url = f"{self.api_base}/{endpoint}"
+        for attempt in range(self.max_retries + 1):
+            self._count('requests')
+            response = None
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout, stream=stream)
+                response.raise_for_status()
+                return response
+            except requests.exceptions.RequestException as e:
+                if response is not None:
+                    response.close()
+                if not is_transient(e) or attempt == self.max_retries:
+                    raise
+                self._count('retries')
+                delay = self.backoff * (2 ** attempt)
+                delay += random.uniform(0, delay / 2)
+                retry_after = response.headers.get('Retry-After') if response is not None else None
+                if retry_after:
+                    try:
+                        delay = max(delay, min(MAX_RETRY_AFTER, float(retry_after)))
+                    except ValueError:
+                        pass
+                logger.debug(f"Retrying {endpoint} in {delay:.2f}s after: {e}")
+                time.sleep(delay)
+
+    def _failed(self, error):
+        self._count('failures')
+        # A rejected request (400, 401, ...) says nothing about upstream health
+        if isinstance(error, requests.exceptions.HTTPError) and not is_transient(error):
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def post(self, endpoint: str, payload: Dict) -> Dict:
+        """JSON response of a POST to ``endpoint``"""
+        probe = self._acquire()
+        settled = False
+        try:
+            response = self._open(endpoint, payload)
+            result = response.json()
+            self.breaker.record_success()
+            settled = True
+            return result
+        except Exception as e:
+            self._failed(e)
+            settled = True
+            raise
+        finally:
+            self._release(probe, settled)
+
+    def stream(self, endpoint: str, payload: Dict) -> Iterator[Dict]:
+        """Parsed server-sent event chunks of a streamed completion.
+
+        Only opening the stream is retried; the request slot is held until
+        the stream ends or the generator is closed. Closing it early counts
+        as neither success nor failure.
+        """
+        probe = self._acquire()
+        settled = False
+        try:
+            response = self._open(endpoint, dict(payload, stream=True), stream=True)
+            with response:
+                # "data: {chunk}" lines, ending with "data: [DONE]". chunk_size=None
+                # hands over data as it arrives instead of in 512-byte reads
+                for raw_line in response.iter_lines(chunk_size=None):
+                    line = raw_line.decode("utf-8") if isinstance(raw_line, bytes) else raw_line
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    yield json.loads(data)
+            self.breaker.record_success()
+            settled = True
+        except Exception as e:
+            self._failed(e)
+            settled = True
+            raise
+        finally:
+            self._release(probe, settled)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['circuit'] = self.breaker.state
+        stats['consecutive_failures'] = self.breaker.failures
+        return stats
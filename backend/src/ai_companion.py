@@ -1,108 +1,181 @@
 import os
+import re
 import json
-import sqlite3
-from datetime import datetime
-from typing import Dict, List, Optional
-import requests
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.ai_client import AIClient
+from src.conversation_store import ConversationStore
+from src.db_pool import connection
+from src.response_cache import ResponseCache, fingerprint
+from src.storage import database_path
+from src.lazy import LazySingleton
+
+# "combined": one chat call returns both the reply and the mood score as JSON.
+# "parallel": separate reply and mood calls, issued at the same time.
+# Combined mode falls back to parallel if the call fails or its JSON is unusable.
+AI_INFERENCE_MODE = os.environ.get("AI_INFERENCE_MODE", "combined")
+
+COMBINED_OUTPUT_FORMAT = """
+
+Answer with only a JSON object, no other text:
+{"mood": <integer 1-10 rating the emotional tone of the user's message, 1 very negative/sad, 10 very positive/happy>, "reply": "<your response to the user>"}"""
+
+STREAM_METRICS_WINDOW = 500
+
+# Model outputs kept in memory per worker; affirmations are also stored per user and day
+AI_CACHE_SIZE = int(os.environ.get("AI_CACHE_SIZE", 5000))
+AI_CHAT_CACHE_SECONDS = float(os.environ.get("AI_CHAT_CACHE_SECONDS", 3600))
+# Users who chatted within this many days get their affirmation pre-generated overnight
+AFFIRMATION_ACTIVE_DAYS = int(os.environ.get("AFFIRMATION_ACTIVE_DAYS", 7))
+AFFIRMATION_WORKERS = 4
+AFFIRMATION_KEEP_DAYS = 7
+
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def parse_combined_reply(content: str) -> Tuple[str, int]:
+    """(reply, mood_score) from a combined-mode completion; raises ValueError if malformed"""
+    match = _JSON_OBJECT_RE.search(content or "")
+    if not match:
+        raise ValueError("no JSON object in combined reply")
+    try:
+        data = json.loads(match.group(0))
+        reply = str(data["reply"]).strip()
+        mood_score = int(round(float(data["mood"])))
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"malformed combined reply: {e}")
+    if not reply:
+        raise ValueError("combined reply is empty")
+    return reply, max(1, min(10, mood_score))
+
+
+def _elapsed_ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 1)
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
 
 class BloomAICompanion:
-    def __init__(self):
+    def __init__(self, db_path=None, inference_mode=None):
         self.openai_api_key = os.environ.get("OPENAI_API_KEY")
         self.openai_api_base = os.environ.get("OPENAI_API_BASE", "https://api.openai.com/v1")
-        self.db_path = os.path.join(os.path.dirname(__file__), "database", "bloom_ai.db")
+        self.inference_mode = inference_mode or AI_INFERENCE_MODE
+        # Keep-alive session with timeouts, retries and a circuit breaker
+        self.client = AIClient(self.openai_api_key, self.openai_api_base)
+        self.db_path = db_path or database_path()
+        # Runs the mood call alongside the reply call in parallel mode
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bloom-ai")
+        # (first_token_ms, total_ms) of recent streamed replies
+        self._stream_timings = deque(maxlen=STREAM_METRICS_WINDOW)
+        self._stream_lock = threading.Lock()
+        # (user_id, day) and (prompt fingerprint, day) -> affirmation
+        self.affirmation_cache = ResponseCache(AI_CACHE_SIZE, ttl=86400)
+        # fingerprint of system prompt + message -> (reply, mood_score)
+        self.chat_cache = ResponseCache(AI_CACHE_SIZE, ttl=AI_CHAT_CACHE_SECONDS)
         self.init_database()
+        # Rolling summary + recent window; older turns are folded in and archived
+        self.conversations = ConversationStore(self.db_path, summarize=self.summarize_turns)
     
     def init_database(self):
         """Initialize SQLite database for conversation history"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS conversations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                message TEXT NOT NULL,
-                response TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                mood_score INTEGER,
-                session_id TEXT
-            )
-        """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    mood_score INTEGER,
+                    session_id TEXT
+                )
+            """)
         
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_profiles (
-                user_id TEXT PRIMARY KEY,
-                name TEXT,
-                goals TEXT,
-                personality_type TEXT,
-                preferences TEXT,
-                mood_history TEXT,
-                last_interaction DATETIME
-            )
-        """)
-        
-        conn.commit()
-        conn.close()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS user_profiles (
+                    user_id TEXT PRIMARY KEY,
+                    name TEXT,
+                    goals TEXT,
+                    personality_type TEXT,
+                    preferences TEXT,
+                    mood_history TEXT,
+                    last_interaction DATETIME
+                )
+            """)
+            
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS daily_affirmations (
+                    user_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    affirmation TEXT NOT NULL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (day, user_id)
+                )
+            """)
     
     def get_user_context(self, user_id: str) -> Dict:
-        """Get user's conversation history and profile"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get user profile
-        cursor.execute(
-            "SELECT * FROM user_profiles WHERE user_id = ?", 
-            (user_id,)
-        )
-        profile = cursor.fetchone()
+        """Get user's profile, summary of older conversations and the most recent ones (newest first)"""
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
         
-        # Get recent conversations (last 10)
-        cursor.execute(
-            "SELECT message, response, mood_score, timestamp FROM conversations WHERE user_id = ? ORDER BY timestamp DESC LIMIT 10", 
-            (user_id,)
-        )
-        conversations = cursor.fetchall()
+            # Get user profile
+            cursor.execute(
+                "SELECT * FROM user_profiles WHERE user_id = ?", 
+                (user_id,)
+            )
+            profile = cursor.fetchone()
         
-        conn.close()
+            conversations = self.conversations.context(user_id)
         
         return {
             'profile': profile,
-            'recent_conversations': conversations
+            'summary': conversations['summary'],
+            'recent_conversations': conversations['recent']
         }
     
     def save_conversation(self, user_id: str, message: str, response: str, mood_score: int = None):
         """Save conversation to database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
         
-        cursor.execute(
-            "INSERT INTO conversations (user_id, message, response, mood_score) VALUES (?, ?, ?, ?)",
-            (user_id, message, response, mood_score)
-        )
+            compact = self.conversations.add_turn(user_id, message, response, mood_score)
         
-        # Update user's last interaction
-        cursor.execute(
-            "INSERT OR REPLACE INTO user_profiles (user_id, last_interaction) VALUES (?, ?)",
-            (user_id, datetime.now())
-        )
+            # Update user's last interaction
+            cursor.execute(
+                "INSERT OR REPLACE INTO user_profiles (user_id, last_interaction) VALUES (?, ?)",
+                (user_id, datetime.now())
+            )
         
-        conn.commit()
-        conn.close()
+        if compact:
+            self._executor.submit(self.conversations.compact, user_id)
     
     def _call_openai_api(self, endpoint: str, payload: Dict) -> Dict:
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.openai_api_key}"
-        }
-        url = f"{self.openai_api_base}/{endpoint}"
         try:
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()  # Raise an exception for HTTP errors
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            return self.client.post(endpoint, payload)
+        except Exception as e:
             print(f"OpenAI API request failed: {e}")
             raise
     
+    def _stream_openai_api(self, endpoint: str, payload: Dict) -> Iterator[str]:
+        """Yield the text deltas of a streamed completion as the server sends them"""
+        for chunk in self.client.stream(endpoint, payload):
+            choices = chunk.get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                yield delta
+    
     def analyze_mood(self, message: str) -> int:
         """Analyze mood from message (1-10 scale)"""
         try:
@@ -129,32 +202,42 @@ class BloomAICompanion:
             print(f"Mood analysis failed: {e}")
             return 5  # Default neutral mood
     
-    def generate_response(self, user_id: str, message: str, user_name: str = "Beautiful") -> Dict:
-        """Generate personalized AI response"""
-        try:
-            # Get user context
-            context = self.get_user_context(user_id)
-            
-            # Analyze mood
-            mood_score = self.analyze_mood(message)
-            
-            # Build conversation history for context
-            conversation_history = ""
-            if context['recent_conversations']:
-                conversation_history = "\n".join([
-                    f"User: {conv[0]}\nAI: {conv[1]}" 
-                    for conv in context['recent_conversations'][-3:]  # Last 3 conversations
-                ])
-            
-            # Create personalized system prompt
-            system_prompt = f"""You are Bloom, an empowering AI companion for women on the Inner Bloom platform. You are warm, supportive, intuitive, and deeply caring.
+    def prepare_prompt(self, user_id: str, message: str, user_name: str, timings: Dict) -> str:
+        """System prompt for a chat turn, with history and relevant articles; records stage timings"""
+        # Get user context
+        stage = time.perf_counter()
+        context = self.get_user_context(user_id)
+        timings['context_ms'] = _elapsed_ms(stage)
+        
+        # Build conversation history for context: summary of older turns, then the recent ones in order
+        history = []
+        if context['summary']:
+            history.append(f"Summary of earlier conversations:\n{context['summary']}\n")
+        history.extend(
+            f"User: {conv[0]}\nAI: {conv[1]}"
+            for conv in reversed(context['recent_conversations'])
+        )
+        conversation_history = "\n".join(history)
+        
+        # Scraped articles most relevant to this message
+        stage = time.perf_counter()
+        relevant_content = self.get_relevant_content(message)
+        if relevant_content:
+            relevant_content = f"\nArticles you can draw on if they help:\n{relevant_content}\n"
+        timings['retrieval_ms'] = _elapsed_ms(stage)
+        
+        return self.build_system_prompt(user_name, conversation_history, relevant_content)
+    
+    def build_system_prompt(self, user_name: str, conversation_history: str, relevant_content: str) -> str:
+        """Bloom's persona prompt for one chat turn"""
+        return f"""You are Bloom, an empowering AI companion for women on the Inner Bloom platform. You are warm, supportive, intuitive, and deeply caring.
 
 Your personality:
 - Speak like a wise, loving sister who truly believes in the user's potential
 - Use empowering language that builds confidence and self-worth
 - Be specific and actionable in your advice
 - Remember you're talking to {user_name}
-- Current mood detected: {mood_score}/10
+- Sense the mood behind their message and meet them where they are
 
 Your responses should:
 - Be 2-3 sentences maximum for quick interactions
@@ -165,45 +248,246 @@ Your responses should:
 
 Recent conversation context:
 {conversation_history}
-
+{relevant_content}
 Remember: You're not just an AI, you're their personal growth companion who genuinely cares about their success and happiness."""
-
-            payload = {
-                "model": "gpt-4",
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": message}
-                ],
-                "max_tokens": 150,
-                "temperature": 0.7
-            }
+    
+    def summarize_turns(self, summary: str, turns: List[Tuple]) -> str:
+        """Fold (message, response, mood_score) turns into the running summary of a user's chats"""
+        transcript = "\n".join(
+            f"User (mood {mood_score}/10): {message}\nBloom: {response}" if mood_score else f"User: {message}\nBloom: {response}"
+            for message, response, mood_score in turns
+        )
+        payload = {
+            "model": "gpt-3.5-turbo",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You keep a running summary of a woman's conversations with Bloom, her empowerment companion. Update the summary with the new conversations. Keep her goals, struggles, wins, people she mentions, recurring feelings and any advice she acted on. Write plain notes, under 150 words."
+                },
+                {
+                    "role": "user",
+                    "content": f"Current summary:\n{summary or '(none yet)'}\n\nNew conversations:\n{transcript}"
+                }
+            ],
+            "max_tokens": 250,
+            "temperature": 0.3
+        }
+        response_json = self._call_openai_api("chat/completions", payload)
+        return response_json["choices"][0]["message"]["content"].strip()
+    
+    def _chat_completion(self, system_prompt: str, message: str, max_tokens: int) -> str:
+        payload = {
+            "model": "gpt-4",
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": message}
+            ],
+            "max_tokens": max_tokens,
+            "temperature": 0.7
+        }
+        
+        response_json = self._call_openai_api("chat/completions", payload)
+        return response_json["choices"][0]["message"]["content"].strip()
+    
+    def combined_reply(self, system_prompt: str, message: str) -> Tuple[str, int]:
+        """Reply and mood score from a single completion"""
+        content = self._chat_completion(system_prompt + COMBINED_OUTPUT_FORMAT, message, 180)
+        return parse_combined_reply(content)
+    
+    def parallel_reply(self, system_prompt: str, message: str, timings: Dict) -> Tuple[str, int]:
+        """Reply and mood score from two completions issued at the same time"""
+        def timed_mood():
+            started = time.perf_counter()
+            mood_score = self.analyze_mood(message)
+            return mood_score, _elapsed_ms(started)
+        
+        mood_future = self._executor.submit(timed_mood)
+        started = time.perf_counter()
+        ai_response = self._chat_completion(system_prompt, message, 150)
+        timings['reply_ms'] = _elapsed_ms(started)
+        mood_score, timings['mood_ms'] = mood_future.result()
+        return ai_response, mood_score
+    
+    def generate_response(self, user_id: str, message: str, user_name: str = "Beautiful") -> Dict:
+        """Generate personalized AI response.
+        
+        The result includes ``timings``: milliseconds spent in each stage
+        (context, retrieval, the model call(s), saving) and in total.
+        """
+        started = time.perf_counter()
+        timings = {}
+        try:
+            system_prompt = self.prepare_prompt(user_id, message, user_name, timings)
             
-            response_json = self._call_openai_api("chat/completions", payload)
-            ai_response = response_json["choices"][0]["message"]["content"].strip()
+            # The same prompt and message, ignoring case, punctuation and spacing, reuse the last reply
+            cache_key = fingerprint(system_prompt, message)
+            cached = self.chat_cache.get(cache_key)
+            if cached:
+                mode = "cache"
+                ai_response, mood_score = cached
+            else:
+                mode = self.inference_mode
+            
+            # Reply and mood in one call, or two concurrent calls as the fallback
+            if mode == "combined":
+                stage = time.perf_counter()
+                try:
+                    ai_response, mood_score = self.combined_reply(system_prompt, message)
+                    timings['combined_ms'] = _elapsed_ms(stage)
+                except Exception as e:
+                    print(f"Combined inference failed, falling back to parallel calls: {e}")
+                    timings['combined_failed_ms'] = _elapsed_ms(stage)
+                    mode = "parallel"
+            if mode not in ("combined", "cache"):
+                mode = "parallel"
+                ai_response, mood_score = self.parallel_reply(system_prompt, message, timings)
+            if mode != "cache":
+                self.chat_cache.set(cache_key, (ai_response, mood_score))
             
             # Save conversation
+            stage = time.perf_counter()
             self.save_conversation(user_id, message, ai_response, mood_score)
+            timings['save_ms'] = _elapsed_ms(stage)
             
             # Generate follow-up suggestions
             suggestions = self.generate_suggestions(message, mood_score)
+            timings['total_ms'] = _elapsed_ms(started)
             
             return {
                 'response': ai_response,
                 'mood_score': mood_score,
                 'suggestions': suggestions,
+                'inference_mode': mode,
+                'timings': timings,
                 'timestamp': datetime.now().isoformat()
             }
             
         except Exception as e:
             print(f"AI Companion Error: {e}")
+            timings['total_ms'] = _elapsed_ms(started)
             # Fallback response
             return {
                 'response': f"I'm here for you, {user_name}. Sometimes I need a moment to gather my thoughts. What's on your heart today? 💕",
                 'mood_score': 5,
                 'suggestions': ["Tell me more about how you're feeling", "What's your biggest goal right now?", "How can I support you today?"],
+                'timings': timings,
                 'timestamp': datetime.now().isoformat()
             }
     
+    def stream_response(self, user_id: str, message: str, user_name: str = "Beautiful") -> Iterator[Tuple[str, Dict]]:
+        """Yield ("token", {"text"}) events as the reply streams in, then one ("done", result) event.
+        
+        The mood call runs alongside the stream, so it adds no time. A cached
+        reply is sent as a single token. The finished turn is saved like
+        generate_response's. ``result`` carries
+        the same fields as generate_response plus first_token_ms, measured
+        from the start of the request. If the model fails before any token
+        arrives, the usual fallback reply is streamed instead; after that,
+        an ("error", ...) event ends the stream and nothing is saved.
+        """
+        started = time.perf_counter()
+        timings = {}
+        parts = []
+        try:
+            system_prompt = self.prepare_prompt(user_id, message, user_name, timings)
+            cache_key = fingerprint(system_prompt, message)
+            cached = self.chat_cache.get(cache_key)
+            
+            if cached:
+                mode = "cache"
+                ai_response, mood_score = cached
+                timings['first_token_ms'] = _elapsed_ms(started)
+                parts.append(ai_response)
+                yield "token", {"text": ai_response}
+            else:
+                mode = "stream"
+                mood_future = self._executor.submit(self.analyze_mood, message)
+                payload = {
+                    "model": "gpt-4",
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": message}
+                    ],
+                    "max_tokens": 150,
+                    "temperature": 0.7
+                }
+                stage = time.perf_counter()
+                for text in self._stream_openai_api("chat/completions", payload):
+                    if not parts:
+                        timings['first_token_ms'] = _elapsed_ms(started)
+                        timings['model_first_token_ms'] = _elapsed_ms(stage)
+                    parts.append(text)
+                    yield "token", {"text": text}
+                timings['stream_ms'] = _elapsed_ms(stage)
+                
+                ai_response = "".join(parts).strip()
+                mood_score = mood_future.result()
+                self.chat_cache.set(cache_key, (ai_response, mood_score))
+            
+            stage = time.perf_counter()
+            self.save_conversation(user_id, message, ai_response, mood_score)
+            timings['save_ms'] = _elapsed_ms(stage)
+            timings['total_ms'] = _elapsed_ms(started)
+            self._record_stream_timings(timings)
+            
+            yield "done", {
+                'response': ai_response,
+                'mood_score': mood_score,
+                'suggestions': self.generate_suggestions(message, mood_score),
+                'inference_mode': mode,
+                'timings': timings,
+                'timestamp': datetime.now().isoformat()
+            }
+            
+        except Exception as e:
+            print(f"AI Companion streaming error: {e}")
+            timings['total_ms'] = _elapsed_ms(started)
+            if parts:
+                yield "error", {'error': 'The reply was interrupted', 'timings': timings}
+                return
+            fallback = f"I'm here for you, {user_name}. Sometimes I need a moment to gather my thoughts. What's on your heart today? 💕"
+            yield "token", {"text": fallback}
+            yield "done", {
+                'response': fallback,
+                'mood_score': 5,
+                'suggestions': ["Tell me more about how you're feeling", "What's your biggest goal right now?", "How can I support you today?"],
+                'timings': timings,
+                'timestamp': datetime.now().isoformat()
+            }
+    
+    def _record_stream_timings(self, timings: Dict):
+        with self._stream_lock:
+            self._stream_timings.append((timings.get('first_token_ms'), timings['total_ms']))
+    
+    def streaming_metrics(self) -> Dict:
+        """Time-to-first-token and total latency over the most recent streamed replies"""
+        with self._stream_lock:
+            samples = list(self._stream_timings)
+        first_token = [first for first, _ in samples if first is not None]
+        totals = [total for _, total in samples]
+        return {
+            'samples': len(samples),
+            'first_token_ms': {
+                'p50': _percentile(first_token, 0.5),
+                'p95': _percentile(first_token, 0.95),
+                'mean': round(sum(first_token) / len(first_token), 1) if first_token else None
+            },
+            'total_ms': {
+                'p50': _percentile(totals, 0.5),
+                'p95': _percentile(totals, 0.95)
+            }
+        }
+    
+    def get_relevant_content(self, message: str, limit: int = 2) -> str:
+        """Titles and openings of the scraped articles most relevant to a message"""
+        try:
+            from src.web_scraper import scraper
+            articles = scraper.get_content_for_ai(limit=limit, query=message)
+        except Exception as e:
+            print(f"Content retrieval failed: {e}")
+            return ""
+        return "\n".join(f"- {article['title']}: {article['content'][:200]}" for article in articles)
+    
     def generate_suggestions(self, message: str, mood_score: int) -> List[str]:
         """Generate contextual follow-up suggestions"""
         if mood_score <= 3:
@@ -225,29 +509,86 @@ Remember: You're not just an AI, you're their personal growth companion who genu
                 "I want to work on self-improvement"
             ]
     
-    def get_daily_affirmation(self, user_id: str) -> str:
-        """Generate personalized daily affirmation"""
+    def affirmation_prompt(self, user_id: str) -> str:
+        """Short summary of the user for the affirmation prompt: goals, recent mood, latest message"""
+        context = self.get_user_context(user_id)
+        details = []
+        profile = context['profile']
+        if profile:
+            # user_id, name, goals, personality_type, ...
+            if profile[2]:
+                details.append(f"Goals: {profile[2]}")
+            if profile[3]:
+                details.append(f"Personality: {profile[3]}")
+        conversations = context['recent_conversations']
+        moods = [conv[2] for conv in conversations if conv[2] is not None]
+        if moods:
+            details.append(f"Recent mood: {round(sum(moods) / len(moods))}/10")
+        if conversations:
+            details.append(f"Latest message: {conversations[0][0][:200]}")
+        if not details:
+            return "Create an affirmation for today."
+        return "Create an affirmation for today for someone with this context:\n" + "\n".join(details)
+    
+    def generate_affirmation(self, user_id: str, day: str) -> str:
+        return self._affirmation_for_prompt(self.affirmation_prompt(user_id), day)
+    
+    def _affirmation_for_prompt(self, prompt: str, day: str) -> str:
+        """Model-written affirmation for ``day``; prompts that normalize the same share one call"""
+        prompt_key = (fingerprint(prompt), day)
+        affirmation = self.affirmation_cache.get(prompt_key)
+        if affirmation:
+            return affirmation
+        
+        payload = {
+            "model": "gpt-3.5-turbo",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "Create a powerful, personalized daily affirmation for a woman on her empowerment journey. Make it specific, uplifting, and actionable. Keep it to 1-2 sentences."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "max_tokens": 50,
+            "temperature": 0.8
+        }
+        
+        response_json = self._call_openai_api("chat/completions", payload)
+        affirmation = response_json["choices"][0]["message"]["content"].strip()
+        self.affirmation_cache.set(prompt_key, affirmation)
+        return affirmation
+    
+    def _stored_affirmation(self, user_id: str, day: str) -> Optional[str]:
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT affirmation FROM daily_affirmations WHERE user_id = ? AND day = ?",
+                (user_id, day)
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def _store_affirmation(self, user_id: str, day: str, affirmation: str):
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT OR REPLACE INTO daily_affirmations (user_id, day, affirmation) VALUES (?, ?, ?)",
+                (user_id, day, affirmation)
+            )
+    
+    def get_daily_affirmation(self, user_id: str, day: str = None) -> str:
+        """The user's affirmation for the day: from memory, then the nightly batch, then the model"""
+        day = day or date.today().isoformat()
         try:
-            context = self.get_user_context(user_id)
-            
-            payload = {
-                "model": "gpt-3.5-turbo",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "Create a powerful, personalized daily affirmation for a woman on her empowerment journey. Make it specific, uplifting, and actionable. Keep it to 1-2 sentences."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Create an affirmation for today based on this context: {context}"
-                    }
-                ],
-                "max_tokens": 50,
-                "temperature": 0.8
-            }
-            
-            response_json = self._call_openai_api("chat/completions", payload)
-            return response_json["choices"][0]["message"]["content"].strip()
+            affirmation = self.affirmation_cache.get((user_id, day)) or self._stored_affirmation(user_id, day)
+            if not affirmation:
+                affirmation = self.generate_affirmation(user_id, day)
+                self._store_affirmation(user_id, day, affirmation)
+            self.affirmation_cache.set((user_id, day), affirmation)
+            return affirmation
         except Exception as e:
             print(f"Daily affirmation failed: {e}")
             affirmations = [
@@ -259,8 +600,70 @@ Remember: You're not just an AI, you're their personal growth companion who genu
             ]
             import random
             return random.choice(affirmations)
+    
+    def pregenerate_affirmations(self, day: str = None, active_days: int = AFFIRMATION_ACTIVE_DAYS) -> Dict:
+        """Write ``day``'s affirmation for every recently active user that has none yet.
+        
+        Meant to run nightly, so daytime requests are answered from
+        daily_affirmations without a model call. Rows older than
+        AFFIRMATION_KEEP_DAYS are deleted.
+        """
+        day = day or date.today().isoformat()
+        started = time.perf_counter()
+        cutoff = datetime.now() - timedelta(days=active_days)
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT user_id FROM user_profiles
+                WHERE last_interaction >= ?
+                AND user_id NOT IN (SELECT user_id FROM daily_affirmations WHERE day = ?)
+            """, (cutoff, day))
+            user_ids = [row[0] for row in cursor.fetchall()]
+        
+        # Users whose prompts normalize the same (e.g. no history yet) share one model call
+        prompts = {user_id: self.affirmation_prompt(user_id) for user_id in user_ids}
+        by_fingerprint = {fingerprint(prompt): prompt for prompt in prompts.values()}
+        
+        def generate(prompt):
+            try:
+                return self._affirmation_for_prompt(prompt, day)
+            except Exception as e:
+                print(f"Affirmation pre-generation failed: {e}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=AFFIRMATION_WORKERS) as executor:
+            written = dict(zip(by_fingerprint, executor.map(generate, by_fingerprint.values())))
+        
+        generated = 0
+        for user_id, prompt in prompts.items():
+            affirmation = written[fingerprint(prompt)]
+            if affirmation:
+                self._store_affirmation(user_id, day, affirmation)
+                generated += 1
+        
+        expired = (date.fromisoformat(day) - timedelta(days=AFFIRMATION_KEEP_DAYS)).isoformat()
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM daily_affirmations WHERE day < ?", (expired,))
+            deleted = cursor.rowcount
+        
+        return {
+            'day': day,
+            'users': len(user_ids),
+            'generated': generated,
+            'model_calls': len(by_fingerprint),
+            'failed': len(user_ids) - generated,
+            'deleted': deleted,
+            'seconds': round(time.perf_counter() - started, 2)
+        }
+    
+    def cache_stats(self) -> Dict:
+        return {
+            'affirmations': self.affirmation_cache.stats(),
+            'chat': self.chat_cache.stats()
+        }
 
-# Initialize the AI companion
-bloom_ai = BloomAICompanion()
+# Shared instance, created on first use
+bloom_ai = LazySingleton(BloomAICompanion)
 
 
@@ -0,0 +1,217 @@
+"""
+Inner Bloom Conversation Store
+Rolling per-user summary plus a bounded window of recent chat turns; older turns are archived
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from src.db_pool import connection
+
+logger = logging.getLogger(__name__)
+
+AI_CONTEXT_TURNS = int(os.getenv('AI_CONTEXT_TURNS', 3))
+AI_COMPACT_BATCH = int(os.getenv('AI_COMPACT_BATCH', 20))
+AI_SUMMARY_MAX_CHARS = int(os.getenv('AI_SUMMARY_MAX_CHARS', 1200))
+TURN_MAX_CHARS = 500
+SUMMARY_LINE_CHARS = 160
+
+_TURN_COLUMNS = "id, user_id, message, response, timestamp, mood_score, session_id"
+
+
+def extractive_summary(summary: str, turns: List[tuple], max_chars=AI_SUMMARY_MAX_CHARS) -> str:
+    """Summary without a model: the previous summary plus one line per user message, oldest lines dropped first"""
+    lines = summary.splitlines() if summary else []
+    lines += [f"- {message[:SUMMARY_LINE_CHARS]}" for message, _, _ in turns]
+    while lines and len("\n".join(lines)) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ConversationStore:
+    """Chat history as one summary row per user plus the turns since.
+
+    ``context()`` reads the summary and the last ``window`` turns, with
+    text capped at TURN_MAX_CHARS. The reads and the prompt size stay
+    the same however long a user has been chatting.
+
+    Once a user has ``window + batch`` live turns, ``compact()`` folds the
+    oldest ones into the summary through ``summarize(summary, turns)``. If
+    that fails it falls back to ``extractive_summary``. The folded turns
+    move to ``conversations_archive``, so ``conversations`` holds only
+    recent turns.
+    """
+
+    def __init__(self, db_path, summarize: Optional[Callable] = None,
+                 window=AI_CONTEXT_TURNS, batch=AI_COMPACT_BATCH, max_chars=AI_SUMMARY_MAX_CHARS):
+        self.db_path = db_path
+        self.summarize = summarize
+        self.window = window
+        self.batch = batch
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._compacting = set()
+        self.init_database()
+
+    def init_database(self):
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_summaries (
+                    user_id TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    turns_summarized INTEGER NOT NULL DEFAULT 0,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS conversations_archive (
+                    id INTEGER PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    timestamp DATETIME,
+                    mood_score INTEGER,
+                    session_id TEXT,
+                    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+    def add_turn(self, user_id, message, response, mood_score=None) -> bool:
+        """Save one chat turn; returns True when the user is due for compaction"""
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO conversations (user_id, message, response, mood_score) VALUES (?, ?, ?, ?)",
+                (user_id, message, response, mood_score)
+            )
+            # Counts at most window + batch + 1 index entries
+            cursor.execute(
+                "SELECT COUNT(*) FROM (SELECT 1 FROM conversations WHERE user_id = ? LIMIT ?)",
+                (user_id, self.window + self.batch + 1)
+            )
+            return cursor.fetchone()[0] > self.window + self.batch
+
+    def context(self, user_id) -> Dict:
+        """Summary of older turns and the newest ``window`` turns as (message, response, mood_score, timestamp)"""
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT summary, turns_summarized FROM conversation_summaries WHERE user_id = ?",
+                (user_id,)
+            )
+            row = cursor.fetchone()
+            cursor.execute("""
+                SELECT substr(message, 1, ?), substr(response, 1, ?), mood_score, timestamp
+                FROM conversations WHERE user_id = ?
+                ORDER BY timestamp DESC, id DESC LIMIT ?
+            """, (TURN_MAX_CHARS, TURN_MAX_CHARS, user_id, self.window))
+            recent = cursor.fetchall()
+        return {
+            'summary': row[0] if row else "",
+            'turns_summarized': row[1] if row else 0,
+            'recent': recent
+        }
+
+    def _oldest_turns(self, user_id) -> List[tuple]:
+        """Up to ``batch`` turns older than the newest ``window``, oldest first"""
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT timestamp, id FROM conversations WHERE user_id = ?
+                ORDER BY timestamp DESC, id DESC LIMIT 1 OFFSET ?
+            """, (user_id, max(0, self.window - 1)))
+            boundary = cursor.fetchone()
+            if not boundary:
+                return []
+            cursor.execute("""
+                SELECT id, message, response, mood_score FROM conversations
+                WHERE user_id = ? AND (timestamp, id) < (?, ?)
+                ORDER BY timestamp, id LIMIT ?
+            """, (user_id, boundary[0], boundary[1], self.batch))
+            return cursor.fetchall()
+
+    def _summarize(self, summary, turns) -> str:
+        texts = [(message, response, mood_score) for _, message, response, mood_score in turns]
+        new_summary = None
+        if self.summarize:
+            try:
+                new_summary = self.summarize(summary, texts)
+            except Exception as e:
+                logger.warning(f"Conversation summary fell back to extractive: {e}")
+        if not new_summary:
+            return extractive_summary(summary, texts, self.max_chars)
+        return new_summary.strip()[:self.max_chars]
+
+    def compact(self, user_id) -> int:
+        """Fold all but the newest ``window`` turns into the summary; returns turns archived"""
+        with self._lock:
+            if user_id in self._compacting:
+                return 0
+            self._compacting.add(user_id)
+        archived = 0
+        try:
+            while True:
+                turns = self._oldest_turns(user_id)
+                if not turns:
+                    return archived
+                current = self.context(user_id)
+                # The model call runs outside any transaction
+                summary = self._summarize(current['summary'], turns)
+                ids = [turn[0] for turn in turns]
+                marks = ", ".join("?" * len(ids))
+
+                with connection(self.db_path) as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("BEGIN IMMEDIATE")
+                    cursor.execute(
+                        "SELECT turns_summarized FROM conversation_summaries WHERE user_id = ?",
+                        (user_id,)
+                    )
+                    row = cursor.fetchone()
+                    if (row[0] if row else 0) != current['turns_summarized']:
+                        # Another process compacted this user first
+                        return archived
+                    cursor.execute(f"""
+                        INSERT OR IGNORE INTO conversations_archive ({_TURN_COLUMNS})
+                        SELECT {_TURN_COLUMNS} FROM conversations WHERE id IN ({marks})
+                    """, ids)
+                    cursor.execute(f"DELETE FROM conversations WHERE id IN ({marks})", ids)
+                    cursor.execute("""
+                        INSERT INTO conversation_summaries (user_id, summary, turns_summarized, updated_at)
+                        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                        ON CONFLICT(user_id) DO UPDATE SET
+                            summary = excluded.summary,
+                            turns_summarized = excluded.turns_summarized,
+                            updated_at = excluded.updated_at
+                    """, (user_id, summary, current['turns_summarized'] + len(ids)))
+                archived += len(ids)
+        finally:
+            with self._lock:
+                self._compacting.discard(user_id)
+
+    def compact_all(self) -> Dict:
+        """Compact every user with more than ``window`` live turns"""
+        started = time.perf_counter()
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT user_id FROM conversations GROUP BY user_id HAVING COUNT(*) > ?",
+                (self.window,)
+            )
+            user_ids = [row[0] for row in cursor.fetchall()]
+
+        archived = 0
+        for user_id in user_ids:
+            try:
+                archived += self.compact(user_id)
+            except Exception as e:
+                logger.error(f"Error compacting conversations for {user_id}: {e}")
+        return {
+            'users': len(user_ids),
+            'archived': archived,
+            'seconds': round(time.perf_counter() - started, 2)
+        }
@@ -0,0 +1,292 @@
+"""
+Inner Bloom Post Counters
+Write-through like/comment counters with in-memory sharding for hot posts
+"""
+
+import os
+import time
+import atexit
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from src.db_pool import connection, get_pool
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ('likes', 'comments_count')
+COUNTER_SHARDS = int(os.getenv('POST_COUNTER_SHARDS', 16))
+HOT_POST_THRESHOLD = int(os.getenv('HOT_POST_THRESHOLD', 20))
+FOLD_INTERVAL = float(os.getenv('POST_COUNTER_FOLD_INTERVAL', 2.0))
+FENCE_GRACE_SECONDS = 60.0
+
+
+class _Shard:
+    __slots__ = ('lock', 'deltas', 'touches', 'base')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.deltas = {}    # (post_id, field) -> change not yet in the row
+        self.touches = {}   # post_id -> counter writes since the last fold
+        self.base = {}      # (post_id, field) -> row value as of the last write
+
+
+class PostCounters:
+    """Counter columns on ``community_posts`` kept in step with likes and comments.
+
+    A counter change normally goes straight to the row with
+    ``UPDATE ... RETURNING`` inside the caller's transaction. Once a post
+    takes more than ``hot_threshold`` counter writes between two folds it is
+    hot: further changes are added to an in-memory delta instead, spread over
+    lock-striped shards so hot posts do not contend on one lock or on the
+    row. A delta is buffered only once the caller's transaction commits, so
+    a rollback leaves no trace. A background fold writes the deltas back
+    every ``fold_interval`` seconds.
+
+    Buffers are per worker, so a row can trail the true count by up to one
+    fold interval of other workers' changes. ``check_consistency`` recounts
+    from ``post_likes`` and ``post_comments`` and is the backstop for deltas
+    lost in a crash. Before repairing it raises a fence row that every
+    worker reads at its next fold: while the fence is up, workers fold
+    their buffers and write changes straight to the row, so the repair
+    cannot be overtaken by deltas still buffered elsewhere.
+    """
+
+    def __init__(self, db_path, shards=COUNTER_SHARDS, hot_threshold=HOT_POST_THRESHOLD,
+                 fold_interval=FOLD_INTERVAL):
+        self.db_path = db_path
+        self.hot_threshold = hot_threshold
+        self.fold_interval = fold_interval
+        self._shards = [_Shard() for _ in range(shards)]
+        self._fold_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._write_through = False
+        self.init_database()
+
+        atexit.register(self.close)
+        if fold_interval > 0:
+            thread = threading.Thread(target=self._run, name='post-counters', daemon=True)
+            thread.start()
+
+    def init_database(self):
+        with connection(self.db_path) as conn:
+            conn.cursor().execute('''
+                CREATE TABLE IF NOT EXISTS post_counter_fence (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    until REAL NOT NULL
+                )
+            ''')
+
+    def _shard(self, post_id) -> _Shard:
+        return self._shards[hash(post_id) % len(self._shards)]
+
+    @staticmethod
+    def _check_field(field):
+        if field not in COUNTER_FIELDS:
+            raise ValueError(f"Unknown post counter: {field}")
+
+    def increment(self, cursor, post_id, field, delta=1) -> Optional[int]:
+        """Apply ``delta`` to a post counter in the caller's transaction.
+
+        Returns the new count, or None if the post does not exist. For a hot
+        post the change is buffered when the transaction commits.
+        """
+        self._check_field(field)
+        key = (post_id, field)
+        shard = self._shard(post_id)
+        pool = get_pool(self.db_path)
+
+        with shard.lock:
+            touches = shard.touches.get(post_id, 0) + 1
+            shard.touches[post_id] = touches
+            hot = touches > self.hot_threshold and key in shard.base and not self._write_through
+            if hot:
+                count = shard.base[key] + shard.deltas.get(key, 0) + delta
+        if hot:
+            pool.after_commit(lambda: self._buffer(key, delta))
+            return count
+
+        cursor.execute(
+            f"UPDATE community_posts SET {field} = {field} + ? WHERE id = ? RETURNING {field}",
+            (delta, post_id)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+
+        value = row[0]
+        pool.after_commit(lambda: self._set_base(key, value))
+        with shard.lock:
+            return value + shard.deltas.get(key, 0)
+
+    def _set_base(self, key, value):
+        shard = self._shard(key[0])
+        with shard.lock:
+            shard.base[key] = value
+
+    def _buffer(self, key, delta):
+        """Add a committed change to the shard, or to the row while a repair fence is up"""
+        shard = self._shard(key[0])
+        with shard.lock:
+            # fold() raises _write_through before draining, under this lock,
+            # so a delta is either drained by that fold or written here
+            if not self._write_through:
+                shard.deltas[key] = shard.deltas.get(key, 0) + delta
+                return
+        post_id, field = key
+        with connection(self.db_path) as conn:
+            conn.cursor().execute(
+                f"UPDATE community_posts SET {field} = {field} + ? WHERE id = ?", (delta, post_id)
+            )
+
+    def pending(self, post_id, field) -> int:
+        """Change buffered in memory that the row does not show yet"""
+        shard = self._shard(post_id)
+        with shard.lock:
+            return shard.deltas.get((post_id, field), 0)
+
+    def fold(self) -> int:
+        """Write buffered deltas into their rows; returns the number of counters written"""
+        with self._fold_lock:
+            return self._fold()
+
+    def _fold(self) -> int:
+        fenced = self._fence_up()
+        drained = []
+        for shard in self._shards:
+            with shard.lock:
+                self._write_through = fenced
+                drained.extend((key, delta) for key, delta in shard.deltas.items() if delta)
+                shard.deltas = {}
+                shard.touches = {}
+                shard.base = {}
+
+        if not drained:
+            return 0
+
+        try:
+            bases = {}
+            with connection(self.db_path) as conn:
+                cursor = conn.cursor()
+                for (post_id, field), delta in drained:
+                    cursor.execute(
+                        f"UPDATE community_posts SET {field} = {field} + ? WHERE id = ? RETURNING {field}",
+                        (delta, post_id)
+                    )
+                    row = cursor.fetchone()
+                    if row is not None:
+                        bases[(post_id, field)] = row[0]
+        except Exception:
+            # Put the deltas back so the next fold retries them
+            for key, delta in drained:
+                shard = self._shard(key[0])
+                with shard.lock:
+                    shard.deltas[key] = shard.deltas.get(key, 0) + delta
+            raise
+
+        # Posts that were hot stay hot for the next interval; one that
+        # goes quiet simply ages out at the following fold
+        for key, value in bases.items():
+            shard = self._shard(key[0])
+            with shard.lock:
+                shard.base.setdefault(key, value)
+                shard.touches[key[0]] = max(shard.touches.get(key[0], 0), self.hot_threshold)
+
+        return len(drained)
+
+    def _fence_up(self) -> bool:
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT until FROM post_counter_fence WHERE id = 1")
+            row = cursor.fetchone()
+        return row is not None and row[0] > time.time()
+
+    def _set_fence(self, until=None):
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            if until is None:
+                cursor.execute("DELETE FROM post_counter_fence")
+            else:
+                cursor.execute("INSERT OR REPLACE INTO post_counter_fence (id, until) VALUES (1, ?)", (until,))
+
+    def check_consistency(self, repair=False) -> List[Dict]:
+        """Compare every post's counters with COUNT(*) over likes and comments.
+
+        Returns one entry per post whose stored counts disagree; with
+        ``repair`` the stored counts are rewritten from the recount. A
+        report without ``repair`` may list posts whose changes are still
+        buffered in another worker. A repair first raises the fence and
+        waits two fold intervals for every worker to fold, then folds this
+        worker's buffer, recounts and rewrites in one transaction.
+        """
+        if not repair:
+            self.fold()
+            with connection(self.db_path) as conn:
+                mismatches = self._mismatches(conn.cursor())
+            if mismatches:
+                logger.warning(f"{len(mismatches)} posts had counters out of step")
+            return mismatches
+
+        settle = 2 * self.fold_interval if self.fold_interval > 0 else 0
+        self._set_fence(time.time() + settle + FENCE_GRACE_SECONDS)
+        try:
+            self.fold()
+            time.sleep(settle)
+            # The fold lock is taken before the write lock, as fold() does
+            with self._fold_lock, connection(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                self._fold()
+                mismatches = self._mismatches(cursor)
+                if mismatches:
+                    cursor.executemany('''
+                        UPDATE community_posts
+                        SET likes = (SELECT COUNT(*) FROM post_likes WHERE post_id = ?),
+                            comments_count = (SELECT COUNT(*) FROM post_comments WHERE post_id = ?)
+                        WHERE id = ?
+                    ''', [(m['post_id'], m['post_id'], m['post_id']) for m in mismatches])
+        finally:
+            self._set_fence(None)
+            self.fold()
+
+        if mismatches:
+            logger.warning(f"{len(mismatches)} posts had counters out of step (repaired)")
+        return mismatches
+
+    @staticmethod
+    def _mismatches(cursor) -> List[Dict]:
+        cursor.execute('''
+            SELECT p.id, p.likes, COALESCE(l.total, 0), p.comments_count, COALESCE(c.total, 0)
+            FROM community_posts p
+            LEFT JOIN (SELECT post_id, COUNT(*) AS total FROM post_likes GROUP BY post_id) l
+                ON l.post_id = p.id
+            LEFT JOIN (SELECT post_id, COUNT(*) AS total FROM post_comments GROUP BY post_id) c
+                ON c.post_id = p.id
+            WHERE p.likes IS NOT COALESCE(l.total, 0)
+               OR p.comments_count IS NOT COALESCE(c.total, 0)
+        ''')
+        mismatches = [
+            {
+                'post_id': row[0],
+                'likes': row[1],
+                'actual_likes': row[2],
+                'comments_count': row[3],
+                'actual_comments': row[4]
+            }
+            for row in cursor.fetchall()
+        ]
+        return mismatches
+
+    def _run(self):
+        while not self._stop.wait(self.fold_interval):
+            try:
+                self.fold()
+            except Exception as e:
+                logger.error(f"Post counter fold failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        try:
+            self.fold()
+        except Exception as e:
+            logger.error(f"Post counter fold at shutdown failed: {e}")
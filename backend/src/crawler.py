@@ -0,0 +1,381 @@
+"""
+Inner Bloom Crawler
+Concurrent, polite crawling of scraping targets as background jobs
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+from requests.adapters import HTTPAdapter
+
+from src.db_pool import connection
+
+logger = logging.getLogger(__name__)
+
+CRAWL_CONCURRENCY = int(os.getenv('CRAWL_CONCURRENCY', 8))
+CRAWL_PER_DOMAIN = int(os.getenv('CRAWL_PER_DOMAIN', 2))
+CRAWL_DOMAIN_DELAY = float(os.getenv('CRAWL_DOMAIN_DELAY', 1.0))
+ROBOTS_TTL = int(os.getenv('CRAWL_ROBOTS_TTL', 3600))
+CRAWL_JOB_STALE_SECONDS = int(os.getenv('CRAWL_JOB_STALE_SECONDS', 300))
+MAX_JOBS_KEPT = 20
+PREVIEW_RESULTS = 5
+
+_JOB_COLUMNS = ('id', 'status', 'total', 'done', 'succeeded', 'failed', 'skipped', 'fetched',
+                'unchanged', 'changed', 'results', 'error', 'created_at', 'started_at', 'finished_at')
+
+
+class RobotsCache:
+    """robots.txt per scheme+host, fetched once and kept for ``ttl`` seconds"""
+
+    def __init__(self, session, ttl=ROBOTS_TTL):
+        self.session = session
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._parsers = {}  # origin -> (fetched_at, RobotFileParser)
+        self._fetching = {}  # origin -> Lock, so one thread fetches per origin
+
+    def _fetch(self, origin) -> RobotFileParser:
+        parser = RobotFileParser(f"{origin}/robots.txt")
+        try:
+            response = self.session.get(parser.url, timeout=10)
+        except Exception as e:
+            logger.warning(f"Could not fetch {parser.url}: {e}")
+            parser.allow_all = True
+            return parser
+
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif response.status_code >= 400:
+            parser.allow_all = True
+        else:
+            parser.parse(response.text.splitlines())
+        parser.modified()
+        return parser
+
+    def parser(self, url) -> RobotFileParser:
+        parts = urlparse(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+
+        with self._lock:
+            cached = self._parsers.get(origin)
+            if cached and time.monotonic() - cached[0] < self.ttl:
+                return cached[1]
+            fetch_lock = self._fetching.setdefault(origin, threading.Lock())
+
+        with fetch_lock:
+            with self._lock:
+                cached = self._parsers.get(origin)
+                if cached and time.monotonic() - cached[0] < self.ttl:
+                    return cached[1]
+            parser = self._fetch(origin)
+            with self._lock:
+                self._parsers[origin] = (time.monotonic(), parser)
+            return parser
+
+    def allowed(self, url, user_agent) -> bool:
+        return self.parser(url).can_fetch(user_agent, url)
+
+    def crawl_delay(self, url, user_agent) -> Optional[float]:
+        delay = self.parser(url).crawl_delay(user_agent)
+        return float(delay) if delay is not None else None
+
+
+class DomainThrottle:
+    """At most ``per_domain`` requests in flight per host, spaced ``delay`` seconds apart"""
+
+    def __init__(self, per_domain=CRAWL_PER_DOMAIN, delay=CRAWL_DOMAIN_DELAY):
+        self.per_domain = per_domain
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._next_start = {}
+
+    def acquire(self, domain, delay=None):
+        with self._lock:
+            slots = self._slots.setdefault(domain, threading.Semaphore(self.per_domain))
+        slots.acquire()
+
+        # Reserve the next start time for this host, then sleep until it comes
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(domain, now))
+            self._next_start[domain] = start + max(self.delay, delay or 0)
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, domain):
+        self._slots[domain].release()
+
+
+class CrawlJob:
+    """Progress of one crawl, stored in ``crawl_jobs`` so any worker can read it.
+
+    Counters are written through to the row as each target finishes, and
+    every write refreshes ``updated_at``. A queued or running row that has
+    not been updated for CRAWL_JOB_STALE_SECONDS belongs to a worker that
+    died, and no longer blocks new crawls.
+    """
+
+    def __init__(self, total, db_path=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.db_path = db_path
+        self.status = 'queued'
+        self.total = total
+        self.done = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.fetched = 0
+        self.unchanged = 0
+        self.changed = 0
+        self.results = []
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_row(cls, row, db_path=None) -> 'CrawlJob':
+        job = cls(0, db_path)
+        values = dict(zip(_JOB_COLUMNS, row))
+        for name in _JOB_COLUMNS:
+            setattr(job, name, values[name])
+        job.results = json.loads(values['results'] or '[]')
+        for name in ('created_at', 'started_at', 'finished_at'):
+            if values[name]:
+                setattr(job, name, datetime.fromisoformat(values[name]))
+        return job
+
+    def _row(self) -> tuple:
+        values = dict(self.__dict__, results=json.dumps(self.results[:PREVIEW_RESULTS]))
+        for name in ('created_at', 'started_at', 'finished_at'):
+            values[name] = values[name].isoformat() if values[name] else None
+        return tuple(values[name] for name in _JOB_COLUMNS)
+
+    def save(self):
+        """Write the job's current state to its row"""
+        if not self.db_path:
+            return
+        with self._lock:
+            row = self._row()
+        with connection(self.db_path) as conn:
+            conn.cursor().execute(f'''
+                INSERT OR REPLACE INTO crawl_jobs ({", ".join(_JOB_COLUMNS)}, updated_at)
+                VALUES ({", ".join("?" * len(_JOB_COLUMNS))}, CURRENT_TIMESTAMP)
+            ''', row)
+
+    def record(self, outcome, result=None):
+        with self._lock:
+            self.done += 1
+            if outcome == 'succeeded':
+                self.succeeded += 1
+                # fetched: full body downloaded; unchanged: 304 or same content hash
+                self.fetched += 1 if result.get('fetched', True) else 0
+                if result.get('status') == 'unchanged':
+                    self.unchanged += 1
+                else:
+                    self.changed += 1
+                    if len(self.results) < PREVIEW_RESULTS:
+                        self.results.append(result)
+            elif outcome == 'skipped':
+                self.skipped += 1
+            else:
+                self.failed += 1
+        self.save()
+
+    @property
+    def finished(self):
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'total': self.total,
+                'done': self.done,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'skipped_by_robots': self.skipped,
+                'fetched': self.fetched,
+                'unchanged': self.unchanged,
+                'changed': self.changed,
+                'progress': round(self.done / self.total * 100, 1) if self.total else 100.0,
+                'results': self.results[:PREVIEW_RESULTS],
+                'error': self.error,
+                'created_at': self.created_at.isoformat(),
+                'started_at': self.started_at.isoformat() if self.started_at else None,
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None
+            }
+
+
+class Crawler:
+    """Fetches scraping targets concurrently on behalf of an InnerBloomScraper.
+
+    A thread pool of ``concurrency`` workers shares the scraper's session,
+    whose connection pool is sized to match so connections are reused.
+    Each host gets at most ``per_domain`` requests in flight, spaced by
+    ``domain_delay`` or the host's robots.txt Crawl-delay if that is longer.
+    URLs that robots.txt disallows are skipped. Background jobs live in the
+    ``crawl_jobs`` table, so every worker sees the same jobs and at most one
+    crawl runs at a time.
+    """
+
+    def __init__(self, scraper, concurrency=CRAWL_CONCURRENCY, per_domain=CRAWL_PER_DOMAIN,
+                 domain_delay=CRAWL_DOMAIN_DELAY):
+        self.scraper = scraper
+        self.concurrency = concurrency
+        self.session = scraper.session
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.robots = RobotsCache(self.session)
+        self.throttle = DomainThrottle(per_domain, domain_delay)
+        self.db_path = scraper.db_path
+        self.init_database()
+
+    def init_database(self):
+        with connection(self.db_path) as conn:
+            conn.cursor().execute('''
+                CREATE TABLE IF NOT EXISTS crawl_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    total INTEGER DEFAULT 0,
+                    done INTEGER DEFAULT 0,
+                    succeeded INTEGER DEFAULT 0,
+                    failed INTEGER DEFAULT 0,
+                    skipped INTEGER DEFAULT 0,
+                    fetched INTEGER DEFAULT 0,
+                    unchanged INTEGER DEFAULT 0,
+                    changed INTEGER DEFAULT 0,
+                    results TEXT,
+                    error TEXT,
+                    created_at TEXT,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+    @property
+    def user_agent(self):
+        return self.session.headers.get('User-Agent', '*')
+
+    def _fetch(self, url, category):
+        if not self.robots.allowed(url, self.user_agent):
+            logger.info(f"robots.txt disallows {url}")
+            return 'skipped', None
+
+        domain = urlparse(url).netloc
+        self.throttle.acquire(domain, self.robots.crawl_delay(url, self.user_agent))
+        try:
+            result = self.scraper.scrape_url(url, category)
+        finally:
+            self.throttle.release(domain)
+        return ('succeeded', result) if result else ('failed', None)
+
+    def crawl(self, targets, job=None) -> List[Dict]:
+        """Scrape (url, category) pairs; blocks until all are done and returns the results"""
+        job = job or CrawlJob(len(targets))
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        job.save()
+
+        def work(target):
+            url, category = target
+            try:
+                outcome, result = self._fetch(url, category)
+            except Exception as e:
+                logger.error(f"Error crawling {url}: {e}")
+                outcome, result = 'failed', None
+            job.record(outcome, result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='crawler') as pool:
+            results = [result for result in pool.map(work, targets) if result]
+
+        self.scraper.mark_scraped([result['url'] for result in results])
+        if job.changed:
+            self.scraper.update_trends()
+        job.status = 'completed'
+        job.finished_at = datetime.utcnow()
+        job.save()
+        logger.info(f"Crawl {job.id} finished: {job.fetched} fetched, {job.changed} changed, "
+                    f"{job.unchanged} unchanged, {job.failed} failed, {job.skipped} skipped of {job.total}")
+        return results
+
+    def start(self, targets) -> CrawlJob:
+        """Crawl in a background thread; returns the job for progress polling.
+
+        If a crawl is already running in any worker, that job is returned
+        instead of starting a second one over the same targets. The check
+        and the new job's row are written in one BEGIN IMMEDIATE
+        transaction, so two workers cannot both start a crawl.
+        """
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f'''
+                SELECT {", ".join(_JOB_COLUMNS)} FROM crawl_jobs
+                WHERE status IN ('queued', 'running') AND updated_at > datetime('now', ?)
+                ORDER BY created_at DESC LIMIT 1
+            ''', (f"-{CRAWL_JOB_STALE_SECONDS} seconds",))
+            row = cursor.fetchone()
+            if row:
+                return CrawlJob.from_row(row, self.db_path)
+
+            cursor.execute('''
+                UPDATE crawl_jobs
+                SET status = 'failed', error = 'Abandoned: worker stopped reporting progress',
+                    finished_at = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE status IN ('queued', 'running')
+            ''', (datetime.utcnow().isoformat(),))
+            job = CrawlJob(len(targets), self.db_path)
+            job.save()
+            cursor.execute('''
+                DELETE FROM crawl_jobs WHERE id NOT IN (
+                    SELECT id FROM crawl_jobs ORDER BY created_at DESC LIMIT ?
+                )
+            ''', (MAX_JOBS_KEPT,))
+
+        def run():
+            try:
+                self.crawl(targets, job)
+            except Exception as e:
+                logger.error(f"Crawl {job.id} failed: {e}")
+                job.error = str(e)
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+                job.save()
+
+        threading.Thread(target=run, name=f'crawl-{job.id}', daemon=True).start()
+        return job
+
+    def job(self, job_id) -> Optional[CrawlJob]:
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM crawl_jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+        return CrawlJob.from_row(row, self.db_path) if row else None
+
+    def jobs(self) -> List[CrawlJob]:
+        """Recent jobs from every worker, most recent first"""
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {", ".join(_JOB_COLUMNS)} FROM crawl_jobs
+                ORDER BY created_at DESC LIMIT ?
+            ''', (MAX_JOBS_KEPT,))
+            rows = cursor.fetchall()
+        return [CrawlJob.from_row(row, self.db_path) for row in rows]
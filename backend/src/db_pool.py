@@ -0,0 +1,249 @@
+"""
+Inner Bloom SQLite Connection Pool
+Shared connection management for the raw-sqlite data layer
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Applied to every new connection. WAL lets readers run alongside the single
+# writer, NORMAL sync is durable under WAL except on power loss, and the page
+# cache / mmap sizes keep hot tables in memory.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+)
+
+DEFAULT_MAX_CONNECTIONS = int(os.getenv('SQLITE_POOL_SIZE', 16))
+DEFAULT_ACQUIRE_TIMEOUT = float(os.getenv('SQLITE_POOL_TIMEOUT', 30))
+BUSY_TIMEOUT = 5.0
+
+
+def apply_pragmas(conn):
+    """Apply the shared connection settings to a DB-API sqlite3 connection"""
+    cursor = conn.cursor()
+    for pragma in CONNECTION_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free in time"""
+
+
+class SQLiteConnectionPool:
+    """Bounded pool of SQLite connections for a single database file.
+
+    A thread holds at most one connection at a time: nested ``connection()``
+    blocks on the same thread reuse the connection it already holds, so a
+    method can call another pooled method without deadlocking the pool.
+    """
+
+    def __init__(self, db_path, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 timeout=DEFAULT_ACQUIRE_TIMEOUT):
+        self.db_path = db_path
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._idle = deque()
+        self._created = 0
+        self._pid = os.getpid()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'timeouts': 0,
+        }
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        apply_pragmas(conn)
+        return conn
+
+    def _check_fork(self):
+        """Drop connections inherited from a parent process (e.g. gunicorn preload)"""
+        if self._pid != os.getpid():
+            with self._cond:
+                self._idle.clear()
+                self._created = 0
+                self._pid = os.getpid()
+                self._local = threading.local()
+
+    def acquire(self):
+        """Check out a connection for the current thread"""
+        self._check_fork()
+
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            with self._cond:
+                self._stats['hits'] += 1
+            return held
+
+        conn = None
+        waited_since = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    self._stats['hits'] += 1
+                    break
+                if self._created < self.max_connections:
+                    self._created += 1
+                    self._stats['misses'] += 1
+                    break
+
+                now = time.monotonic()
+                if waited_since is None:
+                    waited_since = now
+                    self._stats['waits'] += 1
+                remaining = self.timeout - (now - waited_since)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f"No SQLite connection available for {self.db_path} after {self.timeout}s")
+                self._cond.wait(remaining)
+
+            if waited_since is not None:
+                waited = time.monotonic() - waited_since
+                self._stats['wait_time'] += waited
+                self._stats['max_wait_time'] = max(self._stats['max_wait_time'], waited)
+
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+
+        self._local.conn = conn
+        self._local.depth = 1
+        self._local.on_commit = []
+        return conn
+
+    def release(self, conn):
+        """Return a connection checked out with ``acquire``"""
+        if getattr(self._local, 'conn', None) is not conn:
+            return
+
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+
+        self._local.conn = None
+        self._local.on_commit = []
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            # Broken connection: discard it rather than hand it out again
+            logger.error(f"Discarding SQLite connection for {self.db_path}: {e}")
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Yield a pooled connection, committing on success and rolling back on error.
+
+        Only the outermost block on a thread commits or rolls back, so nested
+        blocks join the enclosing transaction.
+        """
+        conn = self.acquire()
+        outermost = self._local.depth == 1
+        callbacks = []
+        try:
+            yield conn
+            if outermost:
+                conn.commit()
+                callbacks, self._local.on_commit = self._local.on_commit, []
+        except BaseException:
+            if outermost:
+                conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"after_commit callback failed for {self.db_path}: {e}")
+
+    def after_commit(self, callback):
+        """Run ``callback`` once the current thread's transaction commits; dropped on rollback.
+
+        Outside a ``connection()`` block it runs at once.
+        """
+        if getattr(self._local, 'conn', None) is None:
+            callback()
+        else:
+            self._local.on_commit.append(callback)
+
+    def stats(self) -> Dict:
+        """Pool hit/miss and wait-time counters"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['open_connections'] = self._created
+            stats['idle_connections'] = len(self._idle)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['avg_wait_time'] = stats['wait_time'] / stats['waits'] if stats['waits'] else 0.0
+        return stats
+
+    def close_all(self):
+        """Close every idle connection in the pool"""
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._created -= 1
+
+
+_pools: Dict[str, SQLiteConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path) -> SQLiteConnectionPool:
+    """Return the shared pool for a database file, creating it on first use"""
+    key = os.path.abspath(db_path)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = SQLiteConnectionPool(key)
+                _pools[key] = pool
+    return pool
+
+
+def connection(db_path=None):
+    """Shortcut for ``get_pool(db_path).connection()``; defaults to the configured store"""
+    if db_path is None:
+        from src.storage import database_path
+        db_path = database_path()
+    return get_pool(db_path).connection()
+
+
+def pool_stats() -> Dict:
+    """Counters for every pool opened in this process"""
+    return {path: pool.stats() for path, pool in _pools.items()}
@@ -0,0 +1,227 @@
+"""
+Inner Bloom Email Queue
+Durable per-recipient outbox and delivery log, so campaigns survive restarts and report progress
+"""
+
+import os
+import logging
+from itertools import islice
+from typing import Dict, Iterable, List, Optional
+
+from src.db_pool import connection
+
+logger = logging.getLogger(__name__)
+
+EMAIL_QUEUE_BATCH = int(os.getenv('EMAIL_QUEUE_BATCH', 200))
+EMAIL_QUEUE_LEASE_SECONDS = int(os.getenv('EMAIL_QUEUE_LEASE_SECONDS', 600))
+THROUGHPUT_WINDOW_SECONDS = 60
+ENQUEUE_CHUNK = 1000
+# Engagement action -> outbox column holding the recipient's first occurrence
+ENGAGEMENT_COLUMNS = {'open': 'opened_at', 'click': 'clicked_at'}
+
+
+class EmailQueue:
+    """One ``email_outbox`` row per campaign recipient, moved pending → sending → sent/failed.
+
+    The rows double as the delivery log: content lives once on the
+    campaign, and each recipient only has an address, status and timestamps.
+
+    Workers claim a batch in one write transaction and write its outcomes
+    in another. A claim is a lease: rows left ``sending`` by a process that
+    died are claimed again after ``lease_seconds``. So delivery is
+    at-least-once, and only for the batch that was in flight.
+    """
+
+    def __init__(self, db_path, batch_size=EMAIL_QUEUE_BATCH, lease_seconds=EMAIL_QUEUE_LEASE_SECONDS):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.init_database()
+
+    def init_database(self):
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS email_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    campaign_id INTEGER NOT NULL,
+                    email TEXT NOT NULL,
+                    name TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER DEFAULT 0,
+                    last_error TEXT,
+                    claimed_at TIMESTAMP,
+                    sent_at TIMESTAMP,
+                    opened_at TIMESTAMP,
+                    clicked_at TIMESTAMP,
+                    UNIQUE (campaign_id, email),
+                    FOREIGN KEY (campaign_id) REFERENCES newsletter_campaigns (id)
+                )
+            ''')
+
+    def enqueue(self, campaign_id, recipients: Iterable) -> int:
+        """Add (email, name) recipients to a campaign; duplicates are ignored. Returns rows added."""
+        added = 0
+        recipients = iter(recipients)
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            while True:
+                chunk = list(islice(recipients, ENQUEUE_CHUNK))
+                if not chunk:
+                    break
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO email_outbox (campaign_id, email, name)
+                    VALUES (?, ?, ?)
+                ''', [(campaign_id, email, name) for email, name in chunk])
+                added += cursor.rowcount
+        return added
+
+    def record_delivery(self, campaign_id, email, name=None) -> bool:
+        """Log a message sent outside the queue; returns True if the recipient is new to the campaign"""
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR IGNORE INTO email_outbox (campaign_id, email, name, status, attempts, sent_at)
+                VALUES (?, ?, ?, 'sent', 1, CURRENT_TIMESTAMP)
+            ''', (campaign_id, email, name))
+            if cursor.rowcount:
+                return True
+            cursor.execute('''
+                UPDATE email_outbox
+                SET status = 'sent', attempts = attempts + 1, sent_at = CURRENT_TIMESTAMP
+                WHERE campaign_id = ? AND email = ?
+            ''', (campaign_id, email))
+            return False
+
+    def record_engagement(self, campaign_id, email, action) -> Optional[bool]:
+        """Stamp a recipient's first open or click.
+
+        Returns True the first time, False for a repeat, and None when the
+        campaign has no delivery row for the address (history from before
+        the outbox).
+        """
+        column = ENGAGEMENT_COLUMNS[action]
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                UPDATE email_outbox SET {column} = CURRENT_TIMESTAMP
+                WHERE campaign_id = ? AND email = ? AND {column} IS NULL
+            ''', (campaign_id, email))
+            if cursor.rowcount:
+                return True
+            cursor.execute("SELECT 1 FROM email_outbox WHERE campaign_id = ? AND email = ?", (campaign_id, email))
+            return False if cursor.fetchone() else None
+
+    def claim(self, campaign_id, limit=None) -> List[tuple]:
+        """Lease up to ``limit`` unsent rows; returns (id, email, name) tuples"""
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            limit = limit or self.batch_size
+            # Two index range scans on (campaign_id, status, id); an OR of the
+            # two statuses would sort the whole campaign on every claim
+            cursor.execute('''
+                SELECT id, email, name FROM email_outbox
+                WHERE campaign_id = ? AND status = 'sending' AND claimed_at < datetime('now', ?)
+                ORDER BY id
+                LIMIT ?
+            ''', (campaign_id, f"-{self.lease_seconds} seconds", limit))
+            rows = cursor.fetchall()
+            if len(rows) < limit:
+                cursor.execute('''
+                    SELECT id, email, name FROM email_outbox
+                    WHERE campaign_id = ? AND status = 'pending'
+                    ORDER BY id
+                    LIMIT ?
+                ''', (campaign_id, limit - len(rows)))
+                rows += cursor.fetchall()
+            cursor.executemany('''
+                UPDATE email_outbox
+                SET status = 'sending', attempts = attempts + 1, claimed_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', [(row[0],) for row in rows])
+        return rows
+
+    def record(self, outcomes):
+        """Persist (outbox id, error or None) pairs from a finished batch"""
+        sent = [(outbox_id,) for outbox_id, error in outcomes if error is None]
+        failed = [(str(error)[:500], outbox_id) for outbox_id, error in outcomes if error is not None]
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE email_outbox
+                SET status = 'sent', sent_at = CURRENT_TIMESTAMP, last_error = NULL
+                WHERE id = ?
+            ''', sent)
+            cursor.executemany('''
+                UPDATE email_outbox SET status = 'failed', last_error = ? WHERE id = ?
+            ''', failed)
+
+    def release(self, outbox_ids):
+        """Return claimed rows that were never attempted to pending, without counting the claim"""
+        with connection(self.db_path) as conn:
+            conn.executemany('''
+                UPDATE email_outbox
+                SET status = 'pending', attempts = attempts - 1, claimed_at = NULL
+                WHERE id = ? AND status = 'sending'
+            ''', [(outbox_id,) for outbox_id in outbox_ids])
+
+    def progress(self, campaign_id) -> Dict:
+        """Counts per status, recent throughput and an ETA for the unsent rows"""
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT status, COUNT(*) FROM email_outbox WHERE campaign_id = ? GROUP BY status
+            ''', (campaign_id,))
+            counts = dict(cursor.fetchall())
+            cursor.execute('''
+                SELECT
+                    SUM(sent_at >= datetime('now', ?)),
+                    (julianday('now') - julianday(MIN(sent_at))) * 86400,
+                    (julianday(MAX(sent_at)) - julianday(MIN(sent_at))) * 86400
+                FROM email_outbox
+                WHERE campaign_id = ? AND status = 'sent'
+            ''', (f"-{THROUGHPUT_WINDOW_SECONDS} seconds", campaign_id))
+            recent, since_first, sending_span = cursor.fetchone()
+
+        sent = counts.get('sent', 0)
+        failed = counts.get('failed', 0)
+        remaining = counts.get('pending', 0) + counts.get('sending', 0)
+        total = sent + failed + remaining
+
+        # Rate over the last minute while sending; over the whole send once it has stopped
+        if recent:
+            per_second = recent / max(1.0, min(THROUGHPUT_WINDOW_SECONDS, since_first))
+        elif sent:
+            per_second = sent / max(1.0, sending_span)
+        else:
+            per_second = 0.0
+
+        if not remaining:
+            eta_seconds = 0
+        elif per_second:
+            eta_seconds = round(remaining / per_second)
+        else:
+            eta_seconds = None
+
+        return {
+            'total': total,
+            'sent': sent,
+            'failed': failed,
+            'pending': counts.get('pending', 0),
+            'in_flight': counts.get('sending', 0),
+            'percent_complete': round((sent + failed) * 100 / total, 1) if total else 100.0,
+            'messages_per_second': round(per_second, 2),
+            'eta_seconds': eta_seconds
+        }
+
+    def failures(self, campaign_id, limit=50) -> List[Dict]:
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT email, attempts, last_error FROM email_outbox
+                WHERE campaign_id = ? AND status = 'failed'
+                ORDER BY id
+                LIMIT ?
+            ''', (campaign_id, limit))
+            return [{'email': row[0], 'attempts': row[1], 'error': row[2]} for row in cursor.fetchall()]
@@ -0,0 +1,172 @@
+"""
+Inner Bloom Email Templates
+Compiled, version-checked newsletter templates and per-campaign rendering
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from jinja2 import Template
+
+from src.db_pool import connection
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_REFRESH_SECONDS = float(os.getenv('TEMPLATE_REFRESH_SECONDS', 30))
+# Template variables that differ per subscriber; everything else is the same
+# for the whole campaign and is rendered once
+RECIPIENT_FIELDS = ('name', 'email')
+
+_MARKER_RE = re.compile('\x00(\\d+)\x00')
+_PROBE = 'Prøbe <&> "{field}"'
+
+
+class CompiledTemplate:
+    """Parsed subject, HTML and text templates for one email_templates row"""
+
+    def __init__(self, name, version, subject, html, text=None):
+        self.name = name
+        self.version = version
+        self.subject = Template(subject or '')
+        self.html = Template(html)
+        self.text = Template(text) if text else None
+
+    def parts(self):
+        return [part for part in (self.subject, self.html, self.text) if part is not None]
+
+    def render(self, **data):
+        """(subject, html, text) with a full template render"""
+        return (self.subject.render(**data), self.html.render(**data),
+                self.text.render(**data) if self.text else None)
+
+    def campaign(self, data, recipient_fields=RECIPIENT_FIELDS) -> 'CampaignRenderer':
+        return CampaignRenderer(self, data, recipient_fields)
+
+
+class SplitPart:
+    """One template rendered with the campaign data, cut where recipient fields go.
+
+    The template is rendered once with a marker in place of every
+    recipient field; the output splits into static text and slots. Rendering
+    a recipient is then a string join, with no template evaluation.
+    """
+
+    def __init__(self, template, data, fields):
+        markers = {field: f"\x00{i}\x00" for i, field in enumerate(fields)}
+        pieces = _MARKER_RE.split(template.render(**dict(data, **markers)))
+        self.static = pieces[0::2]
+        self.slots = [fields[int(index)] for index in pieces[1::2]]
+
+    def render(self, recipient) -> str:
+        out = [self.static[0]]
+        for field, static in zip(self.slots, self.static[1:]):
+            # Same as Jinja: a missing variable renders empty, anything else via str()
+            out.append(str(recipient[field]) if field in recipient else '')
+            out.append(static)
+        return ''.join(out)
+
+
+class CampaignRenderer:
+    """Renders one template for many recipients that share the campaign ``data``.
+
+    Static parts are rendered once per campaign. A template that uses a
+    recipient field in logic or a filter (``{% if name %}``,
+    ``{{ name|upper }}``) cannot be split. A probe recipient detects that,
+    and those templates fall back to a full render per recipient.
+    """
+
+    def __init__(self, template, data, recipient_fields=RECIPIENT_FIELDS):
+        self.template = template
+        self.data = {key: value for key, value in data.items() if key not in recipient_fields}
+        self.recipient_fields = tuple(recipient_fields)
+        self.split = self._split()
+
+    def _split(self) -> Optional[List[SplitPart]]:
+        probe = {field: _PROBE.format(field=field) for field in self.recipient_fields}
+        try:
+            parts = [SplitPart(part, self.data, self.recipient_fields) for part in self.template.parts()]
+        except Exception as e:
+            logger.debug(f"Template {self.template.name} not split: {e}")
+            return None
+        for part, split in zip(self.template.parts(), parts):
+            if split.render(probe) != part.render(**dict(self.data, **probe)):
+                logger.debug(f"Template {self.template.name} uses recipient fields in logic; rendering in full")
+                return None
+        return parts
+
+    def render(self, recipient: Dict):
+        """(subject, html, text) for one recipient dict"""
+        if self.split is None:
+            return self.template.render(**dict(self.data, **recipient))
+        rendered = [part.render(recipient) for part in self.split]
+        return rendered[0], rendered[1], rendered[2] if len(rendered) > 2 else None
+
+    def render_batch(self, recipients: Iterable[Dict]) -> List[tuple]:
+        return [self.render(recipient) for recipient in recipients]
+
+
+class TemplateRegistry:
+    """Compiles each email template once and recompiles it when it changes.
+
+    Every ``refresh_interval`` seconds one query reads each template's
+    ``(id, version)``. Editing a template bumps ``version`` via a trigger;
+    replacing it changes ``id``. Either way the stale compiled copy is dropped.
+    """
+
+    def __init__(self, db_path, refresh_interval=TEMPLATE_REFRESH_SECONDS):
+        self.db_path = db_path
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._templates = {}  # name -> CompiledTemplate
+        self._next_check = 0.0
+        self.compiles = 0
+
+    def _check_versions(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name, id, version FROM email_templates")
+            versions = {name: (row_id, version) for name, row_id, version in cursor.fetchall()}
+        with self._lock:
+            self._next_check = now + self.refresh_interval
+            for name, compiled in list(self._templates.items()):
+                if versions.get(name) != compiled.version:
+                    del self._templates[name]
+
+    def get(self, name) -> Optional[CompiledTemplate]:
+        """Compiled template by name, or None if there is no such template"""
+        self._check_versions()
+        compiled = self._templates.get(name)
+        if compiled:
+            return compiled
+
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, version, subject_template, html_template, text_template
+                FROM email_templates WHERE name = ?
+            ''', (name,))
+            row = cursor.fetchone()
+        if not row:
+            return None
+
+        compiled = CompiledTemplate(name, (row[0], row[1]), row[2], row[3], row[4])
+        with self._lock:
+            self._templates[name] = compiled
+            self.compiles += 1
+        logger.debug(f"Compiled email template {name} version {row[1]}")
+        return compiled
+
+    def invalidate(self, name=None):
+        """Drop one compiled template, or all of them"""
+        with self._lock:
+            if name:
+                self._templates.pop(name, None)
+            else:
+                self._templates.clear()
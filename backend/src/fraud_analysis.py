@@ -0,0 +1,342 @@
+"""
+Inner Bloom Fraud Analysis
+Whole-user-base multi-account fraud scoring over the referral graph
+"""
+
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from src.db_pool import connection
+
+logger = logging.getLogger(__name__)
+
+# Same weights and thresholds as the original per-user check
+CIRCULAR_REFERRAL_SCORE = 30.0
+RAPID_REFERRAL_SCORE = 25.0
+SHARED_DOMAIN_SCORE = 15.0
+RAPID_REFERRAL_WINDOW = timedelta(hours=24)
+RAPID_REFERRAL_LIMIT = 10
+SHARED_DOMAIN_LIMIT = 5
+FLAG_THRESHOLD = 50.0
+
+
+def strongly_connected_components(graph) -> List[List]:
+    """Tarjan's algorithm, iterative so long referral chains cannot hit the recursion limit.
+
+    ``graph`` maps node -> iterable of successors. Returns every component
+    as a list of nodes.
+    """
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    components = []
+    counter = 0
+
+    for root in graph:
+        if root in index:
+            continue
+
+        work = [(root, iter(graph.get(root, ())))]
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+
+        while work:
+            node, successors = work[-1]
+            advanced = False
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = lowlink[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph.get(successor, ()))))
+                    advanced = True
+                    break
+                if successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[successor])
+            if advanced:
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+
+    return components
+
+
+def backfill_email_domains(db_path=None) -> int:
+    """Fill email_domain for rows written by raw inserts; returns the rows updated.
+
+    Migration 3 backfills existing rows and the User model keeps the column
+    in step, so this is run by ``manage fraud`` rather than on every analysis.
+    """
+    with connection(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE user
+            SET email_domain = lower(substr(email, instr(email, '@') + 1))
+            WHERE email_domain IS NULL AND instr(email, '@') > 0
+        ''')
+        return cursor.rowcount
+
+
+def _load_referral_graph(cursor) -> Dict:
+    """Referrer -> referred edges from referral_tracking and user.referred_by_id"""
+    graph = {}
+    cursor.execute('''
+        SELECT referrer_id, referred_id FROM referral_tracking
+        UNION
+        SELECT referred_by_id, id FROM user WHERE referred_by_id IS NOT NULL
+    ''')
+    for referrer_id, referred_id in cursor.fetchall():
+        graph.setdefault(referrer_id, set()).add(referred_id)
+        graph.setdefault(referred_id, set())
+    return graph
+
+
+def analyze_multi_account_fraud(user_ids=None, now=None, db_path=None) -> List[Dict]:
+    """Score every user (or just ``user_ids``) for multi-account fraud in one pass.
+
+    Referral cycles of any length are found from the strongly connected
+    components of the referral graph. A user gets the circular referral
+    score once per user they referred who sits in the same component. Rapid
+    referral counts and shared email domains each come from one grouped
+    query. Returns the users with a non-zero score, highest first.
+    """
+    now = now or datetime.utcnow()
+
+    with connection(db_path) as conn:
+        cursor = conn.cursor()
+        graph = _load_referral_graph(cursor)
+
+        cursor.execute('''
+            SELECT referrer_id, COUNT(*) FROM referral_tracking
+            WHERE referred_at > ?
+            GROUP BY referrer_id
+        ''', ((now - RAPID_REFERRAL_WINDOW).strftime('%Y-%m-%d %H:%M:%S.%f'),))
+        recent_referrals = dict(cursor.fetchall())
+
+        cursor.execute('''
+            SELECT email_domain, COUNT(*) FROM user
+            WHERE email_domain IS NOT NULL
+            GROUP BY email_domain
+        ''')
+        domain_counts = dict(cursor.fetchall())
+
+        cursor.execute("SELECT id, email_domain FROM user")
+        users = cursor.fetchall()
+
+    component_of = {}
+    for number, component in enumerate(strongly_connected_components(graph)):
+        if len(component) > 1:
+            for member in component:
+                component_of[member] = number
+
+    wanted = set(user_ids) if user_ids is not None else None
+    results = []
+    for user_id, domain in users:
+        if wanted is not None and user_id not in wanted:
+            continue
+
+        patterns = []
+        risk_score = 0.0
+
+        component = component_of.get(user_id)
+        if component is not None:
+            for referred_id in graph.get(user_id, ()):
+                if component_of.get(referred_id) == component:
+                    patterns.append("circular_referrals")
+                    risk_score += CIRCULAR_REFERRAL_SCORE
+        elif user_id in graph.get(user_id, ()):
+            patterns.append("circular_referrals")
+            risk_score += CIRCULAR_REFERRAL_SCORE
+
+        if recent_referrals.get(user_id, 0) > RAPID_REFERRAL_LIMIT:
+            patterns.append("rapid_referral_creation")
+            risk_score += RAPID_REFERRAL_SCORE
+
+        if domain_counts.get(domain, 0) > SHARED_DOMAIN_LIMIT:
+            patterns.append("similar_email_domains")
+            risk_score += SHARED_DOMAIN_SCORE
+
+        if risk_score > 0:
+            results.append({
+                'user_id': user_id,
+                'risk_score': risk_score,
+                'suspicious_patterns': patterns,
+                'referral_ring': component,
+                'flagged': risk_score > FLAG_THRESHOLD,
+            })
+
+    results.sort(key=lambda r: r['risk_score'], reverse=True)
+    return results
+
+
+def record_fraud_alerts(results, db_path=None) -> int:
+    """Insert a pending multi_account FraudDetection row for each newly flagged user"""
+    flagged = [r for r in results if r['flagged']]
+    if not flagged:
+        return 0
+
+    detected_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+    with connection(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT user_id FROM fraud_detection
+            WHERE fraud_type = 'multi_account' AND status = 'pending'
+        ''')
+        already_pending = {row[0] for row in cursor.fetchall()}
+
+        # The action flags are given explicitly: their ORM default=False is
+        # applied in Python, not by the table
+        rows = [
+            (r['user_id'], 'multi_account', r['risk_score'], json.dumps(r['suspicious_patterns']),
+             'pending', 0, 0, 0, detected_at)
+            for r in flagged if r['user_id'] not in already_pending
+        ]
+        cursor.executemany('''
+            INSERT INTO fraud_detection (user_id, fraud_type, risk_score, suspicious_patterns, status,
+                                         account_suspended, payouts_frozen, referrals_invalidated, detected_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+    logger.info(f"Recorded {len(rows)} new multi-account fraud alerts")
+    return len(rows)
+
+
+def fraud_report(record=False, db_path=None) -> Dict:
+    """Analyse the whole user base; optionally persist alerts for flagged users"""
+    results = analyze_multi_account_fraud(db_path=db_path)
+    recorded = record_fraud_alerts(results, db_path) if record else 0
+    return {
+        'users_at_risk': len(results),
+        'flagged': sum(1 for r in results if r['flagged']),
+        'referral_rings': len({r['referral_ring'] for r in results if r['referral_ring'] is not None}),
+        'alerts_recorded': recorded,
+        'results': results,
+    }
+
+
+def _neighbours(cursor, nodes, forward) -> Dict:
+    """Referral edges out of (``forward``) or into ``nodes``: node -> set of neighbours"""
+    nodes = list(nodes)
+    marks = ", ".join("?" * len(nodes))
+    if forward:
+        sql = f'''
+            SELECT referrer_id, referred_id FROM referral_tracking WHERE referrer_id IN ({marks})
+            UNION
+            SELECT referred_by_id, id FROM user WHERE referred_by_id IN ({marks})
+        '''
+    else:
+        sql = f'''
+            SELECT referred_id, referrer_id FROM referral_tracking WHERE referred_id IN ({marks})
+            UNION
+            SELECT id, referred_by_id FROM user WHERE id IN ({marks}) AND referred_by_id IS NOT NULL
+        '''
+    cursor.execute(sql, nodes + nodes)
+    edges = {}
+    for node, neighbour in cursor.fetchall():
+        edges.setdefault(node, set()).add(neighbour)
+    return edges
+
+
+def _reachable(cursor, start, forward, batch=500) -> Dict:
+    """Breadth-first search from ``start``; returns every reached node -> its neighbours that way"""
+    edges = {}
+    frontier = [start]
+    while frontier:
+        found = {}
+        for i in range(0, len(frontier), batch):
+            found.update(_neighbours(cursor, frontier[i:i + batch], forward))
+        for node in frontier:
+            edges[node] = found.get(node, set())
+        frontier = list({n for neighbours in found.values() for n in neighbours} - edges.keys())
+    return edges
+
+
+def user_fraud_result(user_id, now=None, db_path=None) -> Optional[Dict]:
+    """Score one user, reading only the part of the referral graph that can form a ring with them.
+
+    The user's ring is the strongly connected component containing them:
+    the users they reach through referrals who also reach back to them.
+    That is the intersection of a forward and a backward breadth-first
+    search from the user, so the cost follows the user's neighbourhood,
+    not the size of the user base. The rapid-referral and shared-domain
+    checks are single indexed counts. Scores match
+    ``analyze_multi_account_fraud``; ``referral_ring`` is the lowest user id
+    in the ring rather than a component number.
+    """
+    now = now or datetime.utcnow()
+
+    with connection(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT email_domain FROM user WHERE id = ?", (user_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        domain = row[0]
+
+        downstream = _reachable(cursor, user_id, forward=True)
+        upstream = _reachable(cursor, user_id, forward=False)
+        ring = downstream.keys() & upstream.keys()
+
+        cursor.execute('''
+            SELECT COUNT(*) FROM referral_tracking
+            WHERE referrer_id = ? AND referred_at > ?
+        ''', (user_id, (now - RAPID_REFERRAL_WINDOW).strftime('%Y-%m-%d %H:%M:%S.%f')))
+        recent_referrals = cursor.fetchone()[0]
+
+        domain_count = 0
+        if domain is not None:
+            # Only whether the limit is exceeded matters, so stop counting there
+            cursor.execute(
+                "SELECT COUNT(*) FROM (SELECT 1 FROM user WHERE email_domain = ? LIMIT ?)",
+                (domain, SHARED_DOMAIN_LIMIT + 1)
+            )
+            domain_count = cursor.fetchone()[0]
+
+    patterns = []
+    risk_score = 0.0
+    referral_ring = None
+    if len(ring) > 1:
+        referral_ring = min(ring)
+        for referred_id in downstream[user_id]:
+            if referred_id in ring:
+                patterns.append("circular_referrals")
+                risk_score += CIRCULAR_REFERRAL_SCORE
+    elif user_id in downstream[user_id]:
+        patterns.append("circular_referrals")
+        risk_score += CIRCULAR_REFERRAL_SCORE
+
+    if recent_referrals > RAPID_REFERRAL_LIMIT:
+        patterns.append("rapid_referral_creation")
+        risk_score += RAPID_REFERRAL_SCORE
+
+    if domain_count > SHARED_DOMAIN_LIMIT:
+        patterns.append("similar_email_domains")
+        risk_score += SHARED_DOMAIN_SCORE
+
+    if risk_score <= 0:
+        return None
+    return {
+        'user_id': user_id,
+        'risk_score': risk_score,
+        'suspicious_patterns': patterns,
+        'referral_ring': referral_ring,
+        'flagged': risk_score > FLAG_THRESHOLD,
+    }
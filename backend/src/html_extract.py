@@ -0,0 +1,332 @@
+"""
+Inner Bloom HTML Extraction
+Title, main content and keyword extraction for scraped pages with pluggable parser backends
+"""
+
+import os
+import re
+import codecs
+import logging
+from collections import namedtuple
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+logger = logging.getLogger(__name__)
+
+HTML_EXTRACTOR = os.getenv('HTML_EXTRACTOR', 'auto')
+MAX_CONTENT_LENGTH = 2000
+CHUNK_SIZE = 8192
+
+# Removed before looking for content
+SKIP_TAGS = frozenset(['script', 'style', 'nav', 'footer', 'header'])
+VOID_TAGS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+                       'meta', 'param', 'source', 'track', 'wbr'])
+# Main content containers, highest priority first; the first that matches wins
+CONTENT_SELECTORS = ('article', 'main', '.content', '.post-content',
+                     '.entry-content', '.article-body', '.story-body')
+EMPOWERMENT_KEYWORDS = (
+    'empowerment', 'women', 'spiritual', 'growth', 'success',
+    'entrepreneur', 'leadership', 'confidence', 'purpose', 'faith',
+    'business', 'money', 'financial', 'freedom', 'independence'
+)
+
+Extraction = namedtuple('Extraction', ['title', 'content', 'keywords'])
+
+_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+def normalize_content(text, limit=MAX_CONTENT_LENGTH):
+    return " ".join(text.split())[:limit]
+
+
+def build_keywords(meta_keywords, meta_description, content):
+    """Keywords from meta tags plus the empowerment terms found in the content"""
+    keywords = []
+    if meta_keywords is not None:
+        keywords.extend([k.strip() for k in meta_keywords.split(',')])
+    if meta_description is not None:
+        keywords.extend([w.strip('.,!?') for w in meta_description.split() if len(w) > 4])
+
+    content_lower = content.lower()
+    for keyword in EMPOWERMENT_KEYWORDS:
+        if keyword in content_lower:
+            keywords.append(keyword)
+
+    return list(set(keywords[:10]))  # Return unique keywords, max 10
+
+
+def sniff_encoding(body, content_type=None):
+    """Charset from the Content-Type header, else a <meta charset>, else UTF-8"""
+    encoding = None
+    if content_type and 'charset=' in content_type:
+        encoding = content_type.split('charset=')[-1].split(';')[0].strip().strip('"\'')
+    else:
+        match = _CHARSET_RE.search(body[:2048])
+        encoding = match.group(1).decode('ascii') if match else None
+    try:
+        return codecs.lookup(encoding).name if encoding else 'utf-8'
+    except LookupError:
+        return 'utf-8'
+
+
+class ContentCollector:
+    """Parser target that gathers title, meta tags and main content as the document streams past.
+
+    Mirrors the BeautifulSoup path: text under SKIP_TAGS is ignored, the
+    first selector in CONTENT_SELECTORS with any matching element supplies
+    the content, and the whole body is the fallback. ``done`` turns true once
+    an ``article`` (the top selector) has supplied ``limit`` characters, at
+    which point nothing later in the document can change the result.
+    """
+
+    def __init__(self, limit=MAX_CONTENT_LENGTH):
+        self.limit = limit
+        self.meta = {}
+        self._title = None
+        self._in_title = False
+        self._in_body = False
+        self._skip = 0
+        self._stack = []  # (tag, matched selector indexes, starts a skipped region)
+        self._open = [0] * len(CONTENT_SELECTORS)
+        self._buckets = [[] for _ in CONTENT_SELECTORS]  # one list of text parts per matched element
+        self._body = []
+        self._body_length = 0
+        self._top_length = 0
+
+    @property
+    def done(self):
+        return self._top_length >= self.limit
+
+    def _matches(self, tag, attrs):
+        classes = (attrs.get('class') or '').split()
+        return tuple(
+            i for i, selector in enumerate(CONTENT_SELECTORS)
+            if (selector[1:] in classes if selector[0] == '.' else selector == tag)
+        )
+
+    def start(self, tag, attrs):
+        tag = tag.lower()
+        if tag == 'meta':
+            name = attrs.get('name')
+            if name in ('keywords', 'description') and name not in self.meta:
+                self.meta[name] = attrs.get('content') or ''
+        if tag in VOID_TAGS:
+            return
+
+        if tag == 'title' and self._title is None:
+            self._title = []
+            self._in_title = True
+        elif tag == 'body':
+            self._in_body = True
+
+        skips = tag in SKIP_TAGS
+        matched = () if self._skip or skips else self._matches(tag, attrs)
+        for i in matched:
+            if not self._open[i]:
+                self._buckets[i].append([])
+            self._open[i] += 1
+        if skips:
+            self._skip += 1
+        self._stack.append((tag, matched, skips))
+
+    def end(self, tag):
+        tag = tag.lower()
+        if tag in VOID_TAGS or not any(entry[0] == tag for entry in self._stack):
+            return
+        while self._stack:
+            open_tag, matched, skips = self._stack.pop()
+            for i in matched:
+                self._open[i] -= 1
+            if skips:
+                self._skip -= 1
+            if open_tag == 'title':
+                self._in_title = False
+            if open_tag == tag:
+                break
+
+    def data(self, text):
+        if self._in_title:
+            self._title.append(text)
+        if self._skip:
+            return
+
+        # Lengths count non-whitespace characters, a lower bound on the normalized length
+        for i, depth in enumerate(self._open):
+            if depth:
+                self._buckets[i][-1].append(text)
+        if self._open[0]:
+            self._top_length += len("".join(text.split()))
+
+        # Body text is only the fallback, so stop keeping it once it is long enough
+        if self._in_body and self._body_length <= self.limit:
+            self._body.append(text)
+            self._body_length += len("".join(text.split()))
+
+    def close(self):
+        return self.extraction()
+
+    def extraction(self) -> Extraction:
+        content = ""
+        for bucket in self._buckets:
+            if bucket:
+                content = " ".join("".join(parts).strip() for parts in bucket)
+                break
+        if not content:
+            content = "".join(self._body)
+        content = normalize_content(content, self.limit)
+
+        title = "".join(self._title).strip() if self._title is not None else "No Title"
+        keywords = build_keywords(self.meta.get('keywords'), self.meta.get('description'), content)
+        return Extraction(title, content, keywords)
+
+
+class _StreamParser(HTMLParser):
+    def __init__(self, collector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag, dict(attrs))
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+
+class StreamingExtractor:
+    """Incremental standard-library parser; stops reading once the content is complete"""
+
+    name = 'stream'
+
+    @staticmethod
+    def available():
+        return True
+
+    def extract(self, body, content_type=None) -> Extraction:
+        text = body.decode(sniff_encoding(body, content_type), errors='replace')
+        collector = ContentCollector()
+        parser = _StreamParser(collector)
+        for start in range(0, len(text), CHUNK_SIZE):
+            parser.feed(text[start:start + CHUNK_SIZE])
+            if collector.done:
+                break
+        parser.close()
+        return collector.extraction()
+
+
+class LxmlExtractor:
+    """libxml2 HTML parser feeding the same collector through lxml's target interface"""
+
+    name = 'lxml'
+
+    @staticmethod
+    def available():
+        return etree is not None
+
+    def extract(self, body, content_type=None) -> Extraction:
+        collector = ContentCollector()
+        parser = etree.HTMLParser(target=collector, encoding=sniff_encoding(body, content_type))
+        for start in range(0, len(body), CHUNK_SIZE):
+            parser.feed(body[start:start + CHUNK_SIZE])
+            if collector.done:
+                break
+        return parser.close()
+
+
+class SoupExtractor:
+    """The original full-tree BeautifulSoup path"""
+
+    name = 'soup'
+
+    @staticmethod
+    def available():
+        return BeautifulSoup is not None
+
+    def extract(self, body, content_type=None) -> Extraction:
+        soup = BeautifulSoup(body, 'html.parser')
+
+        title = soup.find('title')
+        title = title.get_text().strip() if title else "No Title"
+
+        content = self.extract_main_content(soup)
+
+        meta_keywords = soup.find('meta', attrs={'name': 'keywords'})
+        meta_desc = soup.find('meta', attrs={'name': 'description'})
+        keywords = build_keywords(
+            meta_keywords.get('content', '') if meta_keywords else None,
+            meta_desc.get('content', '') if meta_desc else None,
+            content
+        )
+        return Extraction(title, content, keywords)
+
+    def extract_main_content(self, soup):
+        """Extract main content from HTML"""
+        # Remove script and style elements
+        for script in soup(list(SKIP_TAGS)):
+            script.decompose()
+
+        content = ""
+        for selector in CONTENT_SELECTORS:
+            elements = soup.select(selector)
+            if elements:
+                content = " ".join([elem.get_text().strip() for elem in elements])
+                break
+
+        # Fallback to body content
+        if not content:
+            body = soup.find('body')
+            if body:
+                content = body.get_text()
+
+        return normalize_content(content)
+
+
+BACKENDS = {
+    'lxml': LxmlExtractor,
+    'stream': StreamingExtractor,
+    'soup': SoupExtractor,
+}
+
+
+class HTMLExtractor:
+    """Extracts with the configured backend, retrying a page with BeautifulSoup if it fails.
+
+    ``auto`` picks lxml when it is installed and the streaming parser
+    otherwise.
+    """
+
+    def __init__(self, backend=HTML_EXTRACTOR):
+        if backend == 'auto':
+            backend = 'lxml' if LxmlExtractor.available() else 'stream'
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown HTML extractor: {backend}")
+        if not BACKENDS[backend].available():
+            logger.warning(f"HTML extractor '{backend}' is not installed; using 'stream'")
+            backend = 'stream'
+
+        self.backend = BACKENDS[backend]()
+        self.fallback = SoupExtractor() if backend != 'soup' and SoupExtractor.available() else None
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    def extract(self, body, content_type=None) -> Extraction:
+        try:
+            return self.backend.extract(body, content_type)
+        except Exception as e:
+            if not self.fallback:
+                raise
+            logger.warning(f"{self.backend.name} extraction failed ({e}); falling back to BeautifulSoup")
+            return self.fallback.extract(body, content_type)
@@ -0,0 +1,52 @@
+"""
+Inner Bloom Lazy Singletons
+Module-level service instances that are only built on first use
+"""
+
+import threading
+
+
+class LazySingleton:
+    """Stand-in for a module singleton that constructs it on first attribute access.
+
+    Importing a module that declares ``real_db = LazySingleton(RealDatabase)``
+    costs nothing; the database work in ``RealDatabase.__init__`` runs the
+    first time a request actually touches ``real_db``.
+    """
+
+    def __init__(self, factory, *args, **kwargs):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_args', args)
+        object.__setattr__(self, '_kwargs', kwargs)
+        object.__setattr__(self, '_instance', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def get(self):
+        """Return the underlying instance, constructing it if needed"""
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._factory(*self._args, **self._kwargs)
+                    object.__setattr__(self, '_instance', instance)
+        return instance
+
+    @property
+    def initialized(self):
+        return self._instance is not None
+
+    def reset(self):
+        """Drop the instance so the next access builds a fresh one"""
+        with self._lock:
+            object.__setattr__(self, '_instance', None)
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.get(), name, value)
+
+    def __repr__(self):
+        state = 'initialized' if self.initialized else 'pending'
+        return f"<LazySingleton {getattr(self._factory, '__name__', self._factory)} ({state})>"
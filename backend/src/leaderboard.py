@@ -0,0 +1,352 @@
+"""
+Inner Bloom Leaderboards
+In-memory ranked boards kept current by the write paths and snapshotted to disk
+"""
+
+import os
+import json
+import time
+import atexit
+import hashlib
+import logging
+import tempfile
+import threading
+from bisect import bisect_left, insort
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+from src.db_pool import connection
+from src.storage import database_path
+from src.lazy import LazySingleton
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_INTERVAL = float(os.getenv('LEADERBOARD_SNAPSHOT_INTERVAL', 300))
+RECONCILE_INTERVAL = float(os.getenv('LEADERBOARD_RECONCILE_INTERVAL', 30))
+SNAPSHOT_FILENAME = 'leaderboards.json'
+
+# Where a board is rebuilt from. load_sql returns (member, score, *payload);
+# fingerprint_sql returns (row count, board_checksum) and is compared with the
+# board in memory to detect writes it has not seen (another worker, seed).
+BoardSource = namedtuple('BoardSource', ['table', 'load_sql', 'fingerprint_sql'])
+
+SOURCES = {
+    'points': BoardSource(
+        'users',
+        "SELECT id, points, name, level, total_earnings, subscription_tier FROM users",
+        "SELECT COUNT(*), board_checksum(id, points) FROM users",
+    ),
+    'engagement_points': BoardSource(
+        'user_engagement',
+        "SELECT user_id, total_points, level FROM user_engagement",
+        "SELECT COUNT(*), board_checksum(user_id, total_points) FROM user_engagement",
+    ),
+    'hugs': BoardSource(
+        'user_engagement',
+        "SELECT user_id, total_hugs_sent FROM user_engagement",
+        "SELECT COUNT(*), board_checksum(user_id, total_hugs_sent) FROM user_engagement",
+    ),
+}
+
+
+def entry_hash(member, score) -> int:
+    """63-bit hash of one (member, score) pair; 5 and 5.0 hash alike"""
+    score = score or 0
+    if isinstance(score, float) and score.is_integer():
+        score = int(score)
+    digest = hashlib.blake2b(f"{member}\x1f{score}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') >> 1
+
+
+class BoardChecksum:
+    """SQLite aggregate: XOR of entry_hash over every row.
+
+    Unlike a score total, it changes when any member's score changes, even
+    if other changes offset it, and when two members swap scores.
+    """
+
+    def __init__(self):
+        self.value = 0
+
+    def step(self, member, score):
+        self.value ^= entry_hash(member, score)
+
+    def finalize(self):
+        return self.value
+
+
+class RankedBoard:
+    """Members ordered by score, highest first.
+
+    Entries live in a list sorted on ``(-score, member)`` next to a
+    member -> score dict, so rank lookups are a binary search and an update
+    is two binary searches plus a list shift, never a full re-sort. Ranks
+    are positions on the board, so tied scores are ranked by member.
+    ``checksum`` is the XOR of ``entry_hash`` over all entries, kept up to
+    date on every change.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.dirty = False
+        self._keys = []
+        self._scores = {}
+        self._payload = {}
+        self._checksum = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._scores)
+
+    def update(self, member, score, **payload):
+        """Set a member's score (and display fields) and move it into place"""
+        score = score or 0
+        with self._lock:
+            old = self._scores.get(member)
+            if old != score:
+                if old is not None:
+                    self._discard_key(old, member)
+                    self._checksum ^= entry_hash(member, old)
+                insort(self._keys, (-score, member))
+                self._scores[member] = score
+                self._checksum ^= entry_hash(member, score)
+            if payload:
+                self._payload.setdefault(member, {}).update(payload)
+            self.dirty = True
+
+    def remove(self, member):
+        with self._lock:
+            old = self._scores.pop(member, None)
+            if old is not None:
+                self._discard_key(old, member)
+                self._checksum ^= entry_hash(member, old)
+                self._payload.pop(member, None)
+                self.dirty = True
+
+    def _discard_key(self, score, member):
+        index = bisect_left(self._keys, (-score, member))
+        if index < len(self._keys) and self._keys[index] == (-score, member):
+            del self._keys[index]
+
+    def score(self, member):
+        return self._scores.get(member)
+
+    def rank(self, member) -> Optional[int]:
+        """1-based rank of a member, or None if it is not on the board"""
+        with self._lock:
+            score = self._scores.get(member)
+            if score is None:
+                return None
+            return bisect_left(self._keys, (-score, member)) + 1
+
+    def top(self, limit=10) -> List[Dict]:
+        """The first ``limit`` entries as dicts with rank, member, score and payload"""
+        with self._lock:
+            entries = []
+            for position, (negated, member) in enumerate(self._keys[:max(limit, 0)]):
+                entry = {'rank': position + 1, 'member': member, 'score': -negated}
+                entry.update(self._payload.get(member, {}))
+                entries.append(entry)
+            return entries
+
+    def fingerprint(self):
+        with self._lock:
+            return len(self._scores), self._checksum
+
+    def load(self, rows, columns):
+        """Replace the board with ``rows`` of (member, score, *payload)"""
+        keys = []
+        scores = {}
+        payload = {}
+        checksum = 0
+        for row in rows:
+            member, score = row[0], row[1] or 0
+            scores[member] = score
+            keys.append((-score, member))
+            checksum ^= entry_hash(member, score)
+            if columns:
+                payload[member] = dict(zip(columns, row[2:]))
+        keys.sort()
+
+        with self._lock:
+            self._keys = keys
+            self._scores = scores
+            self._payload = payload
+            self._checksum = checksum
+            self.dirty = True
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': [[member, self._scores[member], self._payload.get(member, {})]
+                            for _, member in self._keys],
+            }
+
+    def restore(self, data):
+        rows = [(member, score) for member, score, _ in data['entries']]
+        self.load(rows, None)
+        with self._lock:
+            self._payload = {member: payload for member, _, payload in data['entries'] if payload}
+            self.dirty = False
+
+
+class LeaderboardService:
+    """Named ranked boards for the shared store.
+
+    Boards are restored from the last snapshot when it still matches the
+    database, otherwise rebuilt with one scan per board. After that the write
+    paths (``RealDatabase.add_points``, the community engagement routes) push
+    each change in with ``record_*``. A background thread reconciles every
+    board against the database each ``reconcile_interval`` seconds, which
+    bounds how stale a board can get when another worker process did the
+    write, and snapshots boards that changed every ``interval`` seconds.
+    """
+
+    def __init__(self, db_path=None, snapshot_path=None, interval=SNAPSHOT_INTERVAL,
+                 reconcile_interval=RECONCILE_INTERVAL):
+        self.db_path = db_path or database_path()
+        self.snapshot_path = snapshot_path or os.path.join(os.path.dirname(self.db_path), SNAPSHOT_FILENAME)
+        self.interval = interval
+        self.reconcile_interval = reconcile_interval
+        self.boards = {name: RankedBoard(name) for name in SOURCES}
+        self._snapshot_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self._load()
+        atexit.register(self.snapshot)
+        if self.interval > 0 or self.reconcile_interval > 0:
+            thread = threading.Thread(target=self._run_maintenance, name='leaderboard-snapshots', daemon=True)
+            thread.start()
+
+    def board(self, name) -> RankedBoard:
+        if name not in self.boards:
+            raise KeyError(f"Unknown leaderboard: {name}")
+        return self.boards[name]
+
+    # Write-path hooks -------------------------------------------------------
+
+    def record_user(self, user_id, points, name=None, level=None, earnings=None, tier=None):
+        """Push a users row into the points board"""
+        self.boards['points'].update(user_id, points, name=name, level=level,
+                                     total_earnings=earnings, subscription_tier=tier)
+
+    def record_engagement(self, engagement):
+        """Push a UserEngagement row into the engagement boards"""
+        self.boards['engagement_points'].update(engagement.user_id, engagement.total_points,
+                                                level=engagement.level)
+        self.boards['hugs'].update(engagement.user_id, engagement.total_hugs_sent)
+
+    # Loading, reconciliation and snapshots ----------------------------------
+
+    def _source_state(self, cursor, source):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (source.table,))
+        if cursor.fetchone() is None:
+            return None
+        cursor.connection.create_aggregate('board_checksum', 2, BoardChecksum)
+        cursor.execute(source.fingerprint_sql)
+        return tuple(cursor.fetchone())
+
+    def _load(self):
+        snapshot = self._read_snapshot()
+
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            for name, source in SOURCES.items():
+                fingerprint = self._source_state(cursor, source) or (0, 0)
+                saved = snapshot.get(name)
+                if saved and tuple(saved.get('fingerprint', ())) == fingerprint:
+                    self.boards[name].restore(saved)
+                    logger.info(f"Leaderboard {name} restored from snapshot ({len(self.boards[name])} members)")
+                else:
+                    self._rebuild(cursor, name)
+
+    def _rebuild(self, cursor, name):
+        source = SOURCES[name]
+        if self._source_state(cursor, source) is None:
+            self.boards[name].load([], None)
+            return
+        cursor.execute(source.load_sql)
+        columns = [description[0] for description in cursor.description[2:]]
+        self.boards[name].load(cursor.fetchall(), columns)
+        logger.info(f"Leaderboard {name} rebuilt from {source.table} ({len(self.boards[name])} members)")
+
+    def rebuild(self, name=None):
+        """Rebuild one board, or every board, from the database"""
+        names = [name] if name else list(SOURCES)
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            for board_name in names:
+                self._rebuild(cursor, board_name)
+
+    def reconcile(self) -> List[str]:
+        """Rebuild boards whose row count or checksum no longer match the database"""
+        rebuilt = []
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            for name, source in SOURCES.items():
+                fingerprint = self._source_state(cursor, source) or (0, 0)
+                if fingerprint != self.boards[name].fingerprint():
+                    self._rebuild(cursor, name)
+                    rebuilt.append(name)
+        return rebuilt
+
+    def _read_snapshot(self) -> Dict:
+        try:
+            with open(self.snapshot_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable leaderboard snapshot {self.snapshot_path}: {e}")
+            return {}
+
+    def snapshot(self, force=False) -> bool:
+        """Write every board to disk if any changed; returns whether a file was written"""
+        with self._snapshot_lock:
+            if not force and not any(board.dirty for board in self.boards.values()):
+                return False
+
+            data = {}
+            for name, board in self.boards.items():
+                board.dirty = False
+                data[name] = board.to_dict()
+                data[name]['fingerprint'] = list(board.fingerprint())
+
+            # A temp file of its own per writer, so workers snapshotting at
+            # once never interleave; the rename is atomic
+            directory, base = os.path.split(os.path.abspath(self.snapshot_path))
+            tmp = tempfile.NamedTemporaryFile('w', dir=directory, prefix=f"{base}.", suffix='.tmp',
+                                              delete=False)
+            try:
+                with tmp:
+                    json.dump(data, tmp)
+                os.replace(tmp.name, self.snapshot_path)
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+            return True
+
+    def _run_maintenance(self):
+        intervals = [i for i in (self.interval, self.reconcile_interval) if i > 0]
+        next_snapshot = time.monotonic() + self.interval
+        while not self._stop.wait(min(intervals)):
+            try:
+                if self.reconcile_interval > 0:
+                    rebuilt = self.reconcile()
+                    if rebuilt:
+                        logger.info(f"Leaderboards rebuilt after external writes: {', '.join(rebuilt)}")
+                if self.interval > 0 and time.monotonic() >= next_snapshot:
+                    next_snapshot = time.monotonic() + self.interval
+                    self.snapshot()
+            except Exception as e:
+                logger.error(f"Leaderboard maintenance failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> Dict:
+        return {name: len(board) for name, board in self.boards.items()}
+
+
+# Shared instance, built (and restored from its snapshot) on first use
+leaderboards = LazySingleton(LeaderboardService)
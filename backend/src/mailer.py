@@ -0,0 +1,340 @@
+"""
+Inner Bloom Mailer
+Pooled, authenticated SMTP sessions and a rate-limited bulk sender with retries
+"""
+
+import os
+import time
+import queue
+import random
+import smtplib
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', '1') not in ('0', 'false', 'no')
+SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', 30))
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', 4))
+SMTP_MESSAGES_PER_CONNECTION = int(os.getenv('SMTP_MESSAGES_PER_CONNECTION', 100))
+SMTP_RATE_LIMIT = float(os.getenv('SMTP_RATE_LIMIT', 20))  # messages per second, 0 = unlimited
+SMTP_MAX_RETRIES = int(os.getenv('SMTP_MAX_RETRIES', 3))
+SMTP_RETRY_BACKOFF = float(os.getenv('SMTP_RETRY_BACKOFF', 1.0))
+IDLE_CHECK_SECONDS = 60
+MAX_FAILURES_REPORTED = 50
+
+# Errors worth another attempt: the connection dropped, or the server
+# answered 4xx (greylisting, rate limiting, mailbox busy)
+_DISCONNECTS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, socket.error)
+# A refused message leaves the connection usable (smtplib sends RSET)
+_MESSAGE_REFUSED = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class SMTPUnavailable(Exception):
+    """The pool could not connect or log in, so no message can be sent until that is fixed"""
+
+
+def is_transient(error) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return bool(codes) and all(400 <= code < 500 for code in codes)
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, _DISCONNECTS)
+
+
+class RateLimiter:
+    """Token bucket shared by every sending thread; ``rate`` tokens per second"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class _Session:
+    """One authenticated SMTP connection and how much it has been used"""
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """Up to ``size`` logged-in SMTP connections, reused across messages.
+
+    STARTTLS and LOGIN run once per connection instead of once per message.
+    A connection is closed after ``messages_per_connection`` messages (many
+    providers cap this) or when it breaks; an idle one is checked with NOOP
+    before reuse.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, username=None, password=None,
+                 size=SMTP_POOL_SIZE, starttls=SMTP_STARTTLS, timeout=SMTP_TIMEOUT,
+                 messages_per_connection=SMTP_MESSAGES_PER_CONNECTION):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self.starttls = starttls
+        self.timeout = timeout
+        self.messages_per_connection = messages_per_connection
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def _open(self) -> _Session:
+        """A new logged-in session; raises SMTPUnavailable if connecting or LOGIN fails"""
+        try:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        except Exception as e:
+            raise SMTPUnavailable(f"cannot connect to {self.host}:{self.port}: {e}") from e
+        try:
+            smtp.ehlo()
+            if self.starttls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.username and self.password:
+                smtp.login(self.username, self.password)
+        except Exception as e:
+            self._close(smtp)
+            raise SMTPUnavailable(f"cannot log in to {self.host}:{self.port}: {e}") from e
+        with self._lock:
+            self.opened += 1
+        logger.debug(f"Opened SMTP connection to {self.host}:{self.port}")
+        return _Session(smtp)
+
+    @staticmethod
+    def _close(smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def _healthy(self, session) -> bool:
+        if time.monotonic() - session.last_used < IDLE_CHECK_SECONDS:
+            return True
+        try:
+            return session.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    @contextmanager
+    def connection(self):
+        """Check out a session; it goes back to the pool unless it broke"""
+        self._slots.acquire()
+        session = None
+        try:
+            while session is None:
+                try:
+                    session = self._idle.get_nowait()
+                except queue.Empty:
+                    session = self._open()
+                    break
+                if not self._healthy(session):
+                    self._close(session.smtp)
+                    session = None
+
+            yield session
+
+            session.last_used = time.monotonic()
+            if session.sent >= self.messages_per_connection:
+                self._close(session.smtp)
+            else:
+                self._idle.put(session)
+        except BaseException as e:
+            if session is not None:
+                if isinstance(e, _MESSAGE_REFUSED):
+                    self._idle.put(session)
+                else:
+                    self._close(session.smtp)
+            raise
+        finally:
+            self._slots.release()
+
+    def send(self, message):
+        """Send one email.message.Message on a pooled connection"""
+        with self.connection() as session:
+            session.smtp.send_message(message)
+            session.sent += 1
+
+    def close(self):
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(session.smtp)
+
+
+class DeliveryReport:
+    """Counts for one bulk send; failures keep the first few addresses and errors"""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.failures = []
+        self.started = time.monotonic()
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, sent=0, failed=0, retried=0, failure=None):
+        with self._lock:
+            self.sent += sent
+            self.failed += failed
+            self.retried += retried
+            if failure and len(self.failures) < MAX_FAILURES_REPORTED:
+                self.failures.append(failure)
+
+    def to_dict(self) -> Dict:
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'seconds': round(self.seconds, 2),
+            'messages_per_second': round(self.sent / self.seconds, 1) if self.seconds else 0,
+            'failures': self.failures
+        }
+
+
+class BulkSender:
+    """Delivers many messages over an SMTPPool from ``workers`` threads.
+
+    Messages are built inside the workers from a bounded queue of
+    recipients, so a 50k-subscriber send never holds 50k rendered emails in
+    memory. Transient failures are retried up to ``max_retries`` times with
+    exponential backoff and jitter; permanent ones (5xx) are reported once.
+    A failed connect or LOGIN is not a per-message failure: ``send`` stops
+    and raises SMTPUnavailable instead of re-authenticating for every
+    remaining recipient.
+    """
+
+    def __init__(self, pool, workers=None, rate=SMTP_RATE_LIMIT,
+                 max_retries=SMTP_MAX_RETRIES, backoff=SMTP_RETRY_BACKOFF):
+        self.pool = pool
+        self.workers = workers or pool.size
+        self.limiter = RateLimiter(rate)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def _deliver(self, message, report=None):
+        """Send one message with retries; returns None once accepted, else the final error.
+
+        Raises SMTPUnavailable when no connection can be opened.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                self.pool.send(message)
+                if report:
+                    report.record(sent=1)
+                return None
+            except SMTPUnavailable:
+                raise
+            except Exception as e:
+                if not is_transient(e) or attempt == self.max_retries:
+                    logger.error(f"Error sending email to {message['To']}: {e}")
+                    if report:
+                        report.record(failed=1, failure={'email': message['To'], 'error': str(e)})
+                    return e
+                if report:
+                    report.record(retried=1)
+                delay = self.backoff * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay / 2))
+
+    def deliver(self, message, report=None) -> bool:
+        """Send one message with retries; returns whether it was accepted"""
+        try:
+            return self._deliver(message, report) is None
+        except SMTPUnavailable as e:
+            logger.error(f"Error sending email to {message['To']}: {e}")
+            if report:
+                report.record(failed=1, failure={'email': message['To'], 'error': str(e)})
+            return False
+
+    def send(self, recipients: Iterable, build: Callable, report: Optional[DeliveryReport] = None,
+             on_result: Optional[Callable] = None) -> DeliveryReport:
+        """Send ``build(recipient)`` to every recipient; blocks until all are done.
+
+        ``build`` returns an email Message, or None to skip the recipient.
+        ``on_result(recipient, error)`` is called from the worker once a
+        recipient is finished, with ``error`` None if it was sent or skipped.
+
+        If the pool cannot connect or log in, the remaining recipients are
+        not attempted and SMTPUnavailable is raised once the workers stop;
+        ``on_result`` is never called for the unfinished recipients.
+        """
+        report = report or DeliveryReport()
+        work = queue.Queue(maxsize=self.workers * 4)
+        done = object()
+        unavailable = []
+
+        def worker():
+            while True:
+                recipient = work.get()
+                if recipient is done:
+                    return
+                if unavailable:
+                    continue  # drain the queue; the caller keeps these for a later run
+                try:
+                    message = build(recipient)
+                except Exception as e:
+                    logger.error(f"Error building email for {recipient}: {e}")
+                    report.record(failed=1, failure={'email': str(recipient), 'error': str(e)})
+                    error = e
+                else:
+                    try:
+                        error = self._deliver(message, report) if message is not None else None
+                    except SMTPUnavailable as e:
+                        unavailable.append(e)
+                        continue
+                if on_result:
+                    on_result(recipient, error)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for recipient in recipients:
+            if unavailable:
+                break
+            work.put(recipient)
+        for _ in threads:
+            work.put(done)
+        for thread in threads:
+            thread.join()
+
+        report.seconds = time.monotonic() - report.started
+        logger.debug(f"Bulk send finished: {report.sent} sent, {report.failed} failed, "
+                     f"{report.retried} retries in {report.seconds:.1f}s")
+        if unavailable:
+            logger.error(f"Bulk send stopped after {report.sent} messages: {unavailable[0]}")
+            raise unavailable[0]
+        return report
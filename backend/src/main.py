@@ -6,6 +6,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
+from src.storage import configure_app
 from src.routes.user import user_bp
 
 from src.routes.real_api import real_api_bp
@@ -14,6 +15,7 @@ from src.routes.marketplace_api import marketplace_bp
 from src.routes.addiction_api import addiction_bp
 from src.routes.identity_api import identity_bp
 from src.routes.social_proof_api import social_proof_bp
+from src.routes.search_api import search_bp
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -27,16 +29,12 @@ app.register_blueprint(marketplace_bp, url_prefix='/api/real/marketplace')
 app.register_blueprint(addiction_bp, url_prefix='/api/real/addiction')
 app.register_blueprint(identity_bp, url_prefix='/api/real/identity')
 app.register_blueprint(social_proof_bp, url_prefix='/api/real/social')
+app.register_blueprint(search_bp, url_prefix='/api')
 
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_app(app)
 db.init_app(app)
 
-
-from src.models.user import User
-
-with app.app_context():
-    db.create_all()
+# Tables are created by `python -m src.manage migrate`, not at import time
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -56,6 +54,8 @@ def serve(path):
 
 
 if __name__ == '__main__':
+    from src.manage import migrate
+    migrate(app)
     app.run(host='0.0.0.0', port=5000, debug=True)
 
 
@@ -0,0 +1,206 @@
+"""
+Inner Bloom Management Commands
+Schema setup and seed data, run once per deploy instead of in every worker
+
+Usage (from backend/):
+    python -m src.manage migrate
+    python -m src.manage seed
+    python -m src.manage explain
+    python -m src.manage recount
+    python -m src.manage fraud
+    python -m src.manage trends
+    python -m src.manage rebuild-trends
+    python -m src.manage rebuild-search
+    python -m src.manage affirmations [--day YYYY-MM-DD]
+    python -m src.manage compact-conversations
+"""
+
+import os
+import sys
+import argparse
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logger = logging.getLogger(__name__)
+
+
+def migrate(app=None):
+    """Create every table, apply versioned migrations and sync declared indexes"""
+    from src.migrations import run_migrations, sync_indexes
+    from src import search
+    from src.real_database import real_db
+    from src.models.community_posts import community_db
+    from src.models.marketplace import marketplace_db
+    from src.newsletter_system import newsletter
+    from src.web_scraper import scraper
+    from src.ai_companion import bloom_ai
+
+    # Building each singleton runs its CREATE TABLE IF NOT EXISTS pass
+    for service in (real_db, community_db, marketplace_db, newsletter, scraper, bloom_ai):
+        service.get()
+
+    newsletter.setup_email_templates()
+    newsletter.setup_automated_sequences()
+
+    if app is None:
+        from src.main import app
+    from src.models.user import db
+    with app.app_context():
+        db.create_all()
+
+    applied = run_migrations()
+    created, skipped = sync_indexes()
+    searchable = search.install()
+    logger.info(f"Migration complete: {len(applied)} migrations applied, "
+                f"{len(created)} indexes created, {len(skipped)} skipped (table missing), "
+                f"search triggers on {len(searchable)} sources")
+
+
+def seed():
+    """Load demo users, posts, products and scraping targets into an empty store"""
+    from src.real_database import real_db
+    from src.models.community_posts import seed_community
+    from src.models.marketplace import seed_marketplace
+    from src.web_scraper import setup_default_targets
+
+    real_db.seed_initial_data()
+    seed_community()
+    seed_marketplace()
+    setup_default_targets()
+
+    logger.info("Seed data loaded")
+
+
+def explain():
+    """Print the query plan of every registered hot query and flag full scans"""
+    from src.migrations import explain_hot_queries
+
+    report = explain_hot_queries()
+    for entry in report:
+        if entry.get('error'):
+            status = 'ERROR'
+        elif entry['full_scan']:
+            status = 'FULL SCAN'
+        elif entry['temp_sort']:
+            status = 'TEMP SORT'
+        else:
+            status = 'ok'
+        print(f"[{status}] {entry['query']}")
+        for line in entry['plan']:
+            print(f"    {line}")
+        if entry.get('error'):
+            print(f"    {entry['error']}")
+
+    full_scans = sum(1 for entry in report if entry['full_scan'])
+    print(f"\n{full_scans} of {len(report)} hot queries fall back to a full table scan")
+    return report
+
+
+def recount():
+    """Rebuild post like/comment counters from post_likes and post_comments"""
+    from src.models.community_posts import community_db
+
+    mismatches = community_db.check_counters(repair=True)
+    for entry in mismatches:
+        print(f"{entry['post_id']}: likes {entry['likes']} -> {entry['actual_likes']}, "
+              f"comments {entry['comments_count']} -> {entry['actual_comments']}")
+    print(f"{len(mismatches)} posts repaired")
+    return mismatches
+
+
+def fraud():
+    """Score every user for multi-account fraud and record alerts for flagged users"""
+    from src.fraud_analysis import backfill_email_domains, fraud_report
+
+    backfilled = backfill_email_domains()
+    if backfilled:
+        print(f"{backfilled} users given an email_domain")
+    report = fraud_report(record=True)
+    for result in report['results']:
+        if result['flagged']:
+            print(f"user {result['user_id']}: risk {result['risk_score']:.0f} "
+                  f"({', '.join(result['suspicious_patterns'])})")
+    print(f"{report['users_at_risk']} users at risk, {report['flagged']} flagged, "
+          f"{report['referral_rings']} referral rings, {report['alerts_recorded']} new alerts")
+    return report
+
+
+def trends():
+    """Fold newly scraped content into trending_topics"""
+    from src.web_scraper import scraper
+
+    result = scraper.update_trends()
+    print(f"{result['documents']} new documents in {len(result['categories'])} categories")
+    return result
+
+
+def rebuild_trends():
+    """Recount trending topics from every scraped document"""
+    from src.web_scraper import scraper
+
+    result = scraper.trends.rebuild()
+    print(f"Rebuilt trends from {result['documents']} documents in {len(result['categories'])} categories")
+    return result
+
+
+def rebuild_search():
+    """Re-index every searchable table and report throughput"""
+    from src.search import rebuild
+
+    metrics = rebuild()
+    for source, entry in metrics.items():
+        print(f"{source:<14}{entry['rows']:>8} rows {entry['seconds']:>8.3f}s "
+              f"{entry['rows_per_second']:>10} rows/s")
+    return metrics
+
+
+def affirmations(day=None):
+    """Pre-generate the day's affirmation for every recently active user"""
+    from src.ai_companion import bloom_ai
+
+    result = bloom_ai.pregenerate_affirmations(day)
+    print(f"{result['generated']} of {result['users']} affirmations generated for {result['day']} "
+          f"with {result['model_calls']} model calls "
+          f"in {result['seconds']}s ({result['failed']} failed, {result['deleted']} old rows deleted)")
+    return result
+
+
+def compact_conversations():
+    """Fold older chat turns into each user's summary and archive them"""
+    from src.ai_companion import bloom_ai
+
+    result = bloom_ai.conversations.compact_all()
+    print(f"Archived {result['archived']} turns for {result['users']} users in {result['seconds']}s")
+    return result
+
+
+COMMANDS = {
+    'migrate': migrate,
+    'seed': seed,
+    'explain': explain,
+    'recount': recount,
+    'fraud': fraud,
+    'trends': trends,
+    'rebuild-trends': rebuild_trends,
+    'rebuild-search': rebuild_search,
+    'affirmations': affirmations,
+    'compact-conversations': compact_conversations,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inner Bloom management commands")
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    parser.add_argument('--day', help="affirmations: day to generate for (default today)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'affirmations':
+        affirmations(args.day)
+    else:
+        COMMANDS[args.command]()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,417 @@
+"""
+Inner Bloom Schema Migrations
+Versioned schema changes, declared indexes and query-plan checks for the shared store
+"""
+
+import logging
+from collections import namedtuple
+
+from src.db_pool import connection
+
+logger = logging.getLogger(__name__)
+
+Migration = namedtuple('Migration', ['version', 'name', 'apply'])
+Index = namedtuple('Index', ['name', 'table', 'columns'])
+HotQuery = namedtuple('HotQuery', ['name', 'sql', 'params'])
+
+
+def table_exists(cursor, table):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cursor.fetchone() is not None
+
+
+def column_names(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def add_column(cursor, table, column, ddl):
+    """ALTER TABLE ... ADD COLUMN, skipped when the column is already there"""
+    if table_exists(cursor, table) and column not in column_names(cursor, table):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
+# Versioned migrations -------------------------------------------------------
+# Each step runs once, in order, inside its own transaction. Base tables are
+# created by the data classes and db.create_all(); steps here change them.
+
+def _add_user_identity_columns(cursor):
+    # initiation_api writes these and CommunityDB.get_posts joins on them
+    add_column(cursor, 'users', 'bloom_name', 'TEXT')
+    add_column(cursor, 'users', 'bloom_backstory', 'TEXT')
+
+
+def _drop_superseded_feed_indexes(cursor):
+    # Replaced by (created_at, id) indexes that serve keyset pagination
+    cursor.execute("DROP INDEX IF EXISTS idx_community_posts_created")
+    cursor.execute("DROP INDEX IF EXISTS idx_community_post_circle_created")
+
+
+def _add_user_email_domain(cursor):
+    # Indexed domain column for the fraud analysis; LIKE '%@domain' cannot use an index
+    add_column(cursor, 'user', 'email_domain', 'VARCHAR(120)')
+    if table_exists(cursor, 'user'):
+        cursor.execute('''
+            UPDATE user
+            SET email_domain = lower(substr(email, instr(email, '@') + 1))
+            WHERE email_domain IS NULL AND instr(email, '@') > 0
+        ''')
+
+
+def _add_scraped_content_validators(cursor):
+    # Conditional requests and change detection in InnerBloomScraper.scrape_url
+    add_column(cursor, 'scraped_content', 'etag', 'TEXT')
+    add_column(cursor, 'scraped_content', 'last_modified', 'TEXT')
+    add_column(cursor, 'scraped_content', 'content_hash', 'TEXT')
+
+
+def _add_email_template_versions(cursor):
+    # TemplateRegistry drops a compiled template when its (id, version) changes
+    add_column(cursor, 'email_templates', 'version', 'INTEGER DEFAULT 1')
+    if table_exists(cursor, 'email_templates'):
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS email_templates_version_au
+            AFTER UPDATE OF subject_template, html_template, text_template ON email_templates
+            WHEN OLD.subject_template IS NOT NEW.subject_template
+              OR OLD.html_template IS NOT NEW.html_template
+              OR OLD.text_template IS NOT NEW.text_template
+            BEGIN
+                UPDATE email_templates SET version = version + 1 WHERE id = NEW.id;
+            END
+        ''')
+
+
+def _add_campaign_template_data(cursor):
+    # Queued campaigns keep their template data so run_campaign can resume them after a restart
+    add_column(cursor, 'newsletter_campaigns', 'template_data', 'TEXT')
+
+
+# Rows written by the old send_template_email: one per email, with its own
+# copy of the rendered HTML and no template or recipient recorded
+_LEGACY_CAMPAIGN_ROW = ("{t}status = 'sent' AND {t}recipient_count = 1 "
+                        "AND {t}template_name IS NULL AND {t}template_data IS NULL")
+
+
+def _compact_campaign_history(cursor):
+    add_column(cursor, 'newsletter_campaigns', 'kind', "TEXT DEFAULT 'bulk'")
+    add_column(cursor, 'email_outbox', 'opened_at', 'TIMESTAMP')
+    add_column(cursor, 'email_outbox', 'clicked_at', 'TIMESTAMP')
+    if not table_exists(cursor, 'newsletter_campaigns'):
+        return
+
+    # Fold each campaign name's legacy rows for a day into its earliest row
+    cursor.execute(f'''
+        CREATE TEMP TABLE campaign_compaction AS
+        SELECT c.id AS id, g.keep_id AS keep_id
+        FROM newsletter_campaigns c
+        JOIN (
+            SELECT name, date(coalesce(sent_date, created_at)) AS day, MIN(id) AS keep_id
+            FROM newsletter_campaigns WHERE {_LEGACY_CAMPAIGN_ROW.format(t='')}
+            GROUP BY name, day
+        ) g ON g.name = c.name AND g.day = date(coalesce(c.sent_date, c.created_at))
+        WHERE {_LEGACY_CAMPAIGN_ROW.format(t='c.')}
+    ''')
+    cursor.execute("CREATE INDEX temp.idx_campaign_compaction_keep ON campaign_compaction (keep_id)")
+    cursor.execute('''
+        UPDATE newsletter_campaigns
+        SET kind = 'transactional',
+            recipient_count = (SELECT COUNT(*) FROM campaign_compaction k
+                               WHERE k.keep_id = newsletter_campaigns.id),
+            open_count = (SELECT SUM(c.open_count) FROM newsletter_campaigns c
+                          JOIN campaign_compaction k ON k.id = c.id
+                          WHERE k.keep_id = newsletter_campaigns.id),
+            click_count = (SELECT SUM(c.click_count) FROM newsletter_campaigns c
+                           JOIN campaign_compaction k ON k.id = c.id
+                           WHERE k.keep_id = newsletter_campaigns.id),
+            sent_date = (SELECT MAX(c.sent_date) FROM newsletter_campaigns c
+                         JOIN campaign_compaction k ON k.id = c.id
+                         WHERE k.keep_id = newsletter_campaigns.id)
+        WHERE id IN (SELECT keep_id FROM campaign_compaction)
+    ''')
+    if table_exists(cursor, 'email_analytics'):
+        cursor.execute('''
+            UPDATE email_analytics
+            SET campaign_id = (SELECT keep_id FROM campaign_compaction WHERE id = email_analytics.campaign_id)
+            WHERE campaign_id IN (SELECT id FROM campaign_compaction WHERE id != keep_id)
+        ''')
+    cursor.execute('''
+        DELETE FROM newsletter_campaigns
+        WHERE id IN (SELECT id FROM campaign_compaction WHERE id != keep_id)
+    ''')
+    removed = cursor.rowcount
+    cursor.execute("DROP TABLE temp.campaign_compaction")
+    if removed:
+        logger.info(f"Compacted {removed} per-recipient campaign rows; run VACUUM to return the space")
+
+
+def _seed_risk_counters(cursor):
+    # RiskRuleEngine reads velocity windows from this shared table instead of
+    # per-worker memory; seed it with the history still inside the retention
+    from src.risk_engine import (PAYOUT_STREAM, RISK_BUCKET_SECONDS,
+                                 RISK_COUNTER_RETENTION_SECONDS, VELOCITY_ACTIONS)
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS risk_counter_buckets (
+            user_id INTEGER NOT NULL,
+            stream VARCHAR(50) NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            value FLOAT NOT NULL,
+            PRIMARY KEY (user_id, stream, bucket_start)
+        )
+    ''')
+    since = f"-{RISK_COUNTER_RETENTION_SECONDS} seconds"
+    bucket = f"CAST(strftime('%s', {{column}}) AS INTEGER) / {RISK_BUCKET_SECONDS} * {RISK_BUCKET_SECONDS}"
+    if table_exists(cursor, 'security_events'):
+        streams = sorted(set(VELOCITY_ACTIONS.values()))
+        marks = ", ".join("?" * len(streams))
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO risk_counter_buckets (user_id, stream, bucket_start, value)
+            SELECT user_id, event_type, {bucket.format(column='occurred_at')}, COUNT(*)
+            FROM security_events
+            WHERE user_id IS NOT NULL AND event_type IN ({marks})
+              AND occurred_at >= datetime('now', ?)
+            GROUP BY 1, 2, 3
+        ''', (*streams, since))
+    if table_exists(cursor, 'payout_transactions'):
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO risk_counter_buckets (user_id, stream, bucket_start, value)
+            SELECT user_id, ?, {bucket.format(column='created_at')}, SUM(amount)
+            FROM payout_transactions
+            WHERE user_id IS NOT NULL AND created_at >= datetime('now', ?)
+            GROUP BY 1, 2, 3
+        ''', (PAYOUT_STREAM, since))
+
+
+MIGRATIONS = [
+    Migration(1, 'add_user_identity_columns', _add_user_identity_columns),
+    Migration(2, 'drop_superseded_feed_indexes', _drop_superseded_feed_indexes),
+    Migration(3, 'add_user_email_domain', _add_user_email_domain),
+    Migration(4, 'add_scraped_content_validators', _add_scraped_content_validators),
+    Migration(5, 'add_email_template_versions', _add_email_template_versions),
+    Migration(6, 'add_campaign_template_data', _add_campaign_template_data),
+    Migration(7, 'compact_campaign_history', _compact_campaign_history),
+    Migration(8, 'seed_risk_counters', _seed_risk_counters),
+]
+
+
+# Declared indexes -----------------------------------------------------------
+# Synced on every migrate run with CREATE INDEX IF NOT EXISTS, so adding an
+# entry here is all it takes to ship a new index.
+
+INDEXES = [
+    # RealDatabase
+    Index('idx_user_activities_user_ts', 'user_activities', ('user_id', 'timestamp')),
+    Index('idx_users_points', 'users', ('points',)),
+    Index('idx_earnings_user', 'earnings', ('user_id',)),
+
+    # CommunityDB
+    Index('idx_community_posts_created_id', 'community_posts', ('created_at', 'id')),
+    Index('idx_post_comments_post_created', 'post_comments', ('post_id', 'created_at')),
+    Index('idx_community_posts_user', 'community_posts', ('user_id',)),
+
+    # MarketplaceDB
+    Index('idx_products_status_created', 'products', ('status', 'created_at')),
+    Index('idx_products_status_category_created', 'products', ('status', 'category', 'created_at')),
+    Index('idx_products_seller_created', 'products', ('seller_id', 'created_at')),
+    Index('idx_sales_seller', 'sales', ('seller_id',)),
+
+    # BloomAICompanion
+    Index('idx_conversations_user_ts', 'conversations', ('user_id', 'timestamp')),
+    Index('idx_user_profiles_last_interaction', 'user_profiles', ('last_interaction',)),
+
+    # InnerBloomScraper
+    Index('idx_scraped_content_scraped', 'scraped_content', ('scraped_at',)),
+    Index('idx_scraped_content_category_scraped', 'scraped_content', ('category', 'scraped_at')),
+    Index('idx_scraping_targets_active', 'scraping_targets', ('active',)),
+    Index('idx_trending_topics_category_mentions', 'trending_topics', ('category', 'mentions', 'last_updated')),
+    Index('idx_trending_topics_mentions', 'trending_topics', ('mentions', 'last_updated')),
+
+    # NewsletterSystem
+    Index('idx_newsletter_subscribers_status_date', 'newsletter_subscribers', ('status', 'subscription_date')),
+    Index('idx_newsletter_campaigns_created', 'newsletter_campaigns', ('created_at',)),
+    Index('idx_email_analytics_campaign', 'email_analytics', ('campaign_id',)),
+    Index('idx_newsletter_campaigns_status', 'newsletter_campaigns', ('status',)),
+    Index('idx_newsletter_campaigns_kind_name_created', 'newsletter_campaigns', ('kind', 'name', 'created_at')),
+    Index('idx_email_outbox_campaign_status', 'email_outbox', ('campaign_id', 'status', 'id')),
+
+    # SQLAlchemy models
+    Index('ix_user_email_domain', 'user', ('email_domain',)),
+    Index('idx_user_referred_by', 'user', ('referred_by_id',)),
+    Index('idx_community_post_circle_created_id', 'community_post', ('circle_id', 'created_at', 'id')),
+    Index('idx_post_comment_post_created', 'post_comment', ('post_id', 'created_at')),
+    Index('idx_user_engagement_user', 'user_engagement', ('user_id',)),
+    Index('idx_user_engagement_points', 'user_engagement', ('total_points',)),
+    Index('idx_user_engagement_hugs_sent', 'user_engagement', ('total_hugs_sent',)),
+    Index('idx_referral_tracking_referrer_referred', 'referral_tracking', ('referrer_id', 'referred_at')),
+    Index('idx_referral_tracking_referred', 'referral_tracking', ('referred_id',)),
+    Index('idx_security_events_user_type_created', 'security_events', ('user_id', 'event_type', 'occurred_at')),
+    Index('idx_risk_counter_buckets_start', 'risk_counter_buckets', ('bucket_start',)),
+]
+
+
+# Hot queries ----------------------------------------------------------------
+# Checked with EXPLAIN QUERY PLAN by `python -m src.manage explain`.
+
+HOT_QUERIES = [
+    HotQuery('RealDatabase.get_user activities',
+             "SELECT activity_type, points_earned, description, timestamp FROM user_activities "
+             "WHERE user_id = ? ORDER BY timestamp DESC LIMIT 10", ('user_001',)),
+    HotQuery('CommunityDB.get_posts',
+             "SELECT p.*, u.name, u.bloom_name FROM community_posts p JOIN users u ON p.user_id = u.id "
+             "ORDER BY p.created_at DESC, p.id DESC LIMIT ? OFFSET ?", (20, 0)),
+    HotQuery('CommunityDB.get_posts after cursor',
+             "SELECT p.*, u.name, u.bloom_name FROM community_posts p JOIN users u ON p.user_id = u.id "
+             "WHERE (p.created_at, p.id) < (?, ?) ORDER BY p.created_at DESC, p.id DESC LIMIT ?",
+             ('2025-01-01 00:00:00', 'post', 20)),
+    HotQuery('CommunityDB.get_post_comments',
+             "SELECT c.*, u.name, u.bloom_name FROM post_comments c JOIN users u ON c.user_id = u.id "
+             "WHERE c.post_id = ? ORDER BY c.created_at ASC", ('post',)),
+    HotQuery('MarketplaceDB.get_products',
+             "SELECT p.*, u.name as seller_name FROM products p JOIN users u ON p.seller_id = u.id "
+             "WHERE p.status = 'active' ORDER BY p.created_at DESC LIMIT ? OFFSET ?", (20, 0)),
+    HotQuery('MarketplaceDB.get_products by category',
+             "SELECT p.*, u.name as seller_name FROM products p JOIN users u ON p.seller_id = u.id "
+             "WHERE p.status = 'active' AND p.category = ? ORDER BY p.created_at DESC LIMIT ? OFFSET ?",
+             ('Courses', 20, 0)),
+    HotQuery('MarketplaceDB.get_user_products',
+             "SELECT * FROM products WHERE seller_id = ? ORDER BY created_at DESC", ('demo_user',)),
+    HotQuery('ConversationStore.context',
+             "SELECT substr(message, 1, ?), substr(response, 1, ?), mood_score, timestamp "
+             "FROM conversations WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+             (500, 500, 'demo_user', 3)),
+    HotQuery('ConversationStore.compact',
+             "SELECT id, message, response, mood_score FROM conversations "
+             "WHERE user_id = ? AND (timestamp, id) < (?, ?) ORDER BY timestamp, id LIMIT ?",
+             ('demo_user', '2025-01-01 00:00:00', 1, 20)),
+    HotQuery('RiskRuleEngine.evaluate windows',
+             "SELECT stream, bucket_start, value FROM risk_counter_buckets "
+             "WHERE user_id = ? AND stream IN (?, ?) AND bucket_start >= ?",
+             (1, 'payout_amount', 'failed_login', 0)),
+    HotQuery('BloomAICompanion.pregenerate_affirmations',
+             "SELECT user_id FROM user_profiles WHERE last_interaction >= ? "
+             "AND user_id NOT IN (SELECT user_id FROM daily_affirmations WHERE day = ?)",
+             ('2025-01-01 00:00:00', '2025-01-08')),
+    HotQuery('InnerBloomScraper.get_content_for_ai',
+             "SELECT title, content, keywords FROM scraped_content WHERE category = ? "
+             "ORDER BY scraped_at DESC LIMIT ?", ('empowerment', 5)),
+    HotQuery('InnerBloomScraper.get_trending_topics',
+             "SELECT topic, mentions, sentiment FROM trending_topics WHERE category = ? "
+             "ORDER BY mentions DESC, last_updated DESC LIMIT ?", ('empowerment', 10)),
+    HotQuery('TrendEngine.update',
+             "SELECT title, content, category, scraped_at FROM scraped_content "
+             "WHERE scraped_at > ? AND scraped_at <= ? ORDER BY scraped_at",
+             ('2025-01-01 00:00:00', '2025-01-02 00:00:00')),
+    HotQuery('NewsletterSystem active subscribers',
+             "SELECT email, name FROM newsletter_subscribers WHERE status = 'active'", ()),
+    HotQuery('EmailQueue.claim',
+             "SELECT id, email, name FROM email_outbox WHERE campaign_id = ? AND status = 'pending' "
+             "ORDER BY id LIMIT ?", (1, 200)),
+    HotQuery('EmailQueue.claim expired leases',
+             "SELECT id, email, name FROM email_outbox WHERE campaign_id = ? AND status = 'sending' "
+             "AND claimed_at < datetime('now', ?) ORDER BY id LIMIT ?", (1, '-600 seconds', 200)),
+]
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def current_version(db_path=None):
+    with connection(db_path) as conn:
+        cursor = conn.cursor()
+        _ensure_migrations_table(cursor)
+        cursor.execute("SELECT MAX(version) FROM schema_migrations")
+        return cursor.fetchone()[0] or 0
+
+
+def run_migrations(db_path=None):
+    """Apply pending versioned migrations; returns the versions applied"""
+    applied = []
+    version = current_version(db_path)
+
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version <= version:
+            continue
+
+        with connection(db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            migration.apply(cursor)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (?, ?)",
+                (migration.version, migration.name)
+            )
+
+        logger.info(f"Applied migration {migration.version}: {migration.name}")
+        applied.append(migration.version)
+
+    return applied
+
+
+def sync_indexes(db_path=None):
+    """Create every declared index whose table exists; returns (created, skipped)"""
+    created = []
+    skipped = []
+
+    with connection(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        existing = {row[0] for row in cursor.fetchall()}
+
+        for index in INDEXES:
+            if not table_exists(cursor, index.table):
+                skipped.append(index.name)
+                continue
+            if not set(index.columns) <= column_names(cursor, index.table):
+                logger.warning(f"Index {index.name} skipped: {index.table} lacks {index.columns}")
+                skipped.append(index.name)
+                continue
+            if index.name not in existing:
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {index.name} ON {index.table} ({', '.join(index.columns)})"
+                )
+                created.append(index.name)
+
+        cursor.execute("ANALYZE")
+
+    for name in created:
+        logger.info(f"Created index {name}")
+    return created, skipped
+
+
+def explain_hot_queries(db_path=None):
+    """EXPLAIN QUERY PLAN for every registered hot query.
+
+    Returns one dict per query with the plan lines and flags for full table
+    scans and temporary sort b-trees.
+    """
+    report = []
+
+    with connection(db_path) as conn:
+        cursor = conn.cursor()
+        for query in HOT_QUERIES:
+            try:
+                cursor.execute(f"EXPLAIN QUERY PLAN {query.sql}", query.params)
+                plan = [row[3] for row in cursor.fetchall()]
+            except Exception as e:
+                report.append({'query': query.name, 'error': str(e), 'plan': [],
+                               'full_scan': False, 'temp_sort': False})
+                continue
+
+            # "SCAN t" without an index is a full table scan; "SCAN t USING INDEX"
+            # walks an index in order and stops at the LIMIT.
+            full_scans = [line for line in plan if line.startswith('SCAN ') and ' USING ' not in line]
+            report.append({
+                'query': query.name,
+                'plan': plan,
+                'full_scan': bool(full_scans),
+                'temp_sort': any('USE TEMP B-TREE' in line for line in plan),
+            })
+
+    return report
@@ -216,67 +216,21 @@ def calculate_total_referral_debt():
 def detect_multi_account_fraud(user_id):
     """Detect potential multi-account fraud"""
     from src.models.user import User
-    from src.models.affiliate_tracking import ReferralTracking
+    from src.fraud_analysis import record_fraud_alerts, user_fraud_result
     
     user = User.query.get(user_id)
     if not user:
         return None
     
-    # Check for suspicious patterns
-    suspicious_patterns = []
-    risk_score = 0.0
-    
-    # Pattern 1: Multiple accounts from same IP (simplified)
-    # In production, this would use actual IP tracking
-    
-    # Pattern 2: Circular referrals
-    user_referrals = ReferralTracking.query.filter_by(referrer_id=user_id).all()
-    referred_users = [r.referred_id for r in user_referrals]
-    
-    for referred_id in referred_users:
-        # Check if any referred user also referred the original user
-        circular_referral = ReferralTracking.query.filter_by(
-            referrer_id=referred_id,
-            referred_id=user_id
-        ).first()
-        
-        if circular_referral:
-            suspicious_patterns.append("circular_referrals")
-            risk_score += 30.0
-    
-    # Pattern 3: Rapid referral creation
-    recent_referrals = ReferralTracking.query.filter(
-        ReferralTracking.referrer_id == user_id,
-        ReferralTracking.referred_at > datetime.utcnow() - timedelta(hours=24)
-    ).count()
-    
-    if recent_referrals > 10:
-        suspicious_patterns.append("rapid_referral_creation")
-        risk_score += 25.0
-    
-    # Pattern 4: Similar email patterns
-    user_email_domain = user.email.split('@')[1]
-    similar_emails = User.query.filter(
-        User.email.like(f'%@{user_email_domain}')
-    ).count()
+    # Scored over the user's part of the referral graph, so rings of any length count
+    result = user_fraud_result(user_id)
     
-    if similar_emails > 5:
-        suspicious_patterns.append("similar_email_domains")
-        risk_score += 15.0
-    
-    if risk_score > 50.0:
-        # Create fraud detection record
-        fraud_record = FraudDetection(
-            user_id=user_id,
-            fraud_type='multi_account',
-            risk_score=risk_score,
-            suspicious_patterns=suspicious_patterns,
-            status='pending'
-        )
-        db.session.add(fraud_record)
-        db.session.commit()
-        
-        return fraud_record
+    if result and result['flagged']:
+        # Same path as the bulk scan: no second pending alert for a user
+        record_fraud_alerts([result])
+        return FraudDetection.query.filter_by(
+            user_id=user_id, fraud_type='multi_account', status='pending'
+        ).order_by(FraudDetection.id.desc()).first()
     
     return None
 
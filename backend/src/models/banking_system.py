@@ -601,6 +601,10 @@ def create_payout_transaction(user_id, amount, payment_method, schedule_id=None)
     )
     
     db.session.commit()
+    
+    # Feed the shared payout velocity window used by fraud detection rules
+    from src.risk_engine import risk_engine
+    risk_engine.observe_payout(user_id, amount, payout.created_at)
     return payout
 
 def calculate_payout_fee(processor, amount):
@@ -3,156 +3,178 @@ Inner Bloom Community Posts Model
 Handles real community posts, comments, and interactions
 """
 
-import sqlite3
 import json
 from datetime import datetime
 import uuid
 
+from src.db_pool import connection
+from src.storage import database_path
+from src.lazy import LazySingleton
+from src.counters import PostCounters
+from src.pagination import decode_cursor, encode_cursor, MAX_STREAM_ITEMS, STREAM_BATCH_SIZE
+
 class CommunityDB:
-    def __init__(self, db_path="inner_bloom.db"):
-        self.db_path = db_path
+    def __init__(self, db_path=None):
+        self.db_path = db_path or database_path()
         self.init_tables()
+        self.counters = PostCounters(self.db_path)
     
     def init_tables(self):
         """Initialize community tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Posts table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS community_posts (
-                id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                content TEXT NOT NULL,
-                image_url TEXT,
-                likes INTEGER DEFAULT 0,
-                comments_count INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        """)
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
         
-        # Comments table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS post_comments (
-                id TEXT PRIMARY KEY,
-                post_id TEXT NOT NULL,
-                user_id TEXT NOT NULL,
-                content TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (post_id) REFERENCES community_posts (id),
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        """)
+            # Posts table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS community_posts (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    image_url TEXT,
+                    likes INTEGER DEFAULT 0,
+                    comments_count INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            """)
         
-        # Likes table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS post_likes (
-                id TEXT PRIMARY KEY,
-                post_id TEXT NOT NULL,
-                user_id TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(post_id, user_id),
-                FOREIGN KEY (post_id) REFERENCES community_posts (id),
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        """)
+            # Comments table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS post_comments (
+                    id TEXT PRIMARY KEY,
+                    post_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (post_id) REFERENCES community_posts (id),
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            """)
         
-        conn.commit()
-        conn.close()
+            # Likes table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS post_likes (
+                    id TEXT PRIMARY KEY,
+                    post_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(post_id, user_id),
+                    FOREIGN KEY (post_id) REFERENCES community_posts (id),
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            """)
     
     def create_post(self, user_id, content, image_url=None):
         """Create a new community post"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
         
-        post_id = str(uuid.uuid4())
+            post_id = str(uuid.uuid4())
         
-        cursor.execute("""
-            INSERT INTO community_posts (id, user_id, content, image_url)
-            VALUES (?, ?, ?, ?)
-        """, (post_id, user_id, content, image_url))
-        
-        conn.commit()
-        conn.close()
+            cursor.execute("""
+                INSERT INTO community_posts (id, user_id, content, image_url)
+                VALUES (?, ?, ?, ?)
+            """, (post_id, user_id, content, image_url))
         
         return post_id
     
-    def get_posts(self, limit=20, offset=0):
-        """Get community posts with user information"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_posts(self, limit=20, offset=0, cursor=None):
+        """Get community posts with user information.
+
+        Pass ``cursor`` (from ``get_posts_page``) for keyset pagination;
+        ``offset`` is kept for older clients and gets slower with depth.
+        """
+        with connection(self.db_path) as conn:
+            db_cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT p.*, u.name, u.bloom_name
-            FROM community_posts p
-            JOIN users u ON p.user_id = u.id
-            ORDER BY p.created_at DESC
-            LIMIT ? OFFSET ?
-        """, (limit, offset))
+            if cursor:
+                created_at, post_id = decode_cursor(cursor)
+                db_cursor.execute("""
+                    SELECT p.*, u.name, u.bloom_name
+                    FROM community_posts p
+                    JOIN users u ON p.user_id = u.id
+                    WHERE (p.created_at, p.id) < (?, ?)
+                    ORDER BY p.created_at DESC, p.id DESC
+                    LIMIT ?
+                """, (created_at, post_id, limit))
+            else:
+                db_cursor.execute("""
+                    SELECT p.*, u.name, u.bloom_name
+                    FROM community_posts p
+                    JOIN users u ON p.user_id = u.id
+                    ORDER BY p.created_at DESC, p.id DESC
+                    LIMIT ? OFFSET ?
+                """, (limit, offset))
         
-        posts = []
-        for row in cursor.fetchall():
-            posts.append({
-                'id': row[0],
-                'user_id': row[1],
-                'content': row[2],
-                'image_url': row[3],
-                'likes': row[4],
-                'comments_count': row[5],
-                'created_at': row[6],
-                'updated_at': row[7],
-                'user_name': row[8],
-                'bloom_name': row[9] or row[8]
-            })
+            posts = []
+            for row in db_cursor.fetchall():
+                posts.append({
+                    'id': row[0],
+                    'user_id': row[1],
+                    'content': row[2],
+                    'image_url': row[3],
+                    'likes': row[4] + self.counters.pending(row[0], 'likes'),
+                    'comments_count': row[5] + self.counters.pending(row[0], 'comments_count'),
+                    'created_at': row[6],
+                    'updated_at': row[7],
+                    'user_name': row[8],
+                    'bloom_name': row[9] or row[8]
+                })
         
-        conn.close()
         return posts
     
+    def get_posts_page(self, limit=20, cursor=None):
+        """Get one keyset page of posts and the cursor for the next one"""
+        posts = self.get_posts(limit, cursor=cursor)
+        next_cursor = None
+        if len(posts) == limit:
+            next_cursor = encode_cursor(posts[-1]['created_at'], posts[-1]['id'])
+        return {'posts': posts, 'next_cursor': next_cursor}
+    
+    def iter_posts(self, cursor=None, max_posts=MAX_STREAM_ITEMS, batch_size=STREAM_BATCH_SIZE):
+        """Yield posts newest first, each tagged with its resume cursor.
+
+        Reads in keyset batches with a fresh pooled connection per batch, so
+        a slow consumer never holds a connection between batches.
+        """
+        sent = 0
+        while sent < max_posts:
+            posts = self.get_posts(min(batch_size, max_posts - sent), cursor=cursor)
+            if not posts:
+                return
+            for post in posts:
+                cursor = encode_cursor(post['created_at'], post['id'])
+                post['cursor'] = cursor
+                yield post
+            sent += len(posts)
+            if len(posts) < batch_size:
+                return
+    
     def like_post(self, post_id, user_id):
         """Like or unlike a post"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Check if already liked
-        cursor.execute("""
-            SELECT id FROM post_likes WHERE post_id = ? AND user_id = ?
-        """, (post_id, user_id))
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
         
-        existing_like = cursor.fetchone()
-        
-        if existing_like:
-            # Unlike the post
-            cursor.execute("""
-                DELETE FROM post_likes WHERE post_id = ? AND user_id = ?
-            """, (post_id, user_id))
-            
-            cursor.execute("""
-                UPDATE community_posts SET likes = likes - 1 WHERE id = ?
-            """, (post_id,))
-            
-            liked = False
-        else:
-            # Like the post
-            like_id = str(uuid.uuid4())
+            # The UNIQUE(post_id, user_id) constraint decides the toggle, so
+            # concurrent likes from the same user cannot double count
             cursor.execute("""
                 INSERT INTO post_likes (id, post_id, user_id)
                 VALUES (?, ?, ?)
-            """, (like_id, post_id, user_id))
-            
-            cursor.execute("""
-                UPDATE community_posts SET likes = likes + 1 WHERE id = ?
-            """, (post_id,))
-            
-            liked = True
+                ON CONFLICT(post_id, user_id) DO NOTHING
+            """, (str(uuid.uuid4()), post_id, user_id))
+            liked = cursor.rowcount == 1
         
-        # Get updated like count
-        cursor.execute("SELECT likes FROM community_posts WHERE id = ?", (post_id,))
-        like_count = cursor.fetchone()[0]
+            if not liked:
+                # Already liked: unlike the post
+                cursor.execute("""
+                    DELETE FROM post_likes WHERE post_id = ? AND user_id = ?
+                """, (post_id, user_id))
         
-        conn.commit()
-        conn.close()
+            delta = 1 if liked else -cursor.rowcount
+            like_count = self.counters.increment(cursor, post_id, 'likes', delta)
+            if like_count is None:
+                raise ValueError(f"Post not found: {post_id}")
         
         return {
             'liked': liked,
@@ -161,73 +183,64 @@ class CommunityDB:
     
     def add_comment(self, post_id, user_id, content):
         """Add a comment to a post"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
         
-        comment_id = str(uuid.uuid4())
+            comment_id = str(uuid.uuid4())
         
-        cursor.execute("""
-            INSERT INTO post_comments (id, post_id, user_id, content)
-            VALUES (?, ?, ?, ?)
-        """, (comment_id, post_id, user_id, content))
-        
-        # Update comment count
-        cursor.execute("""
-            UPDATE community_posts SET comments_count = comments_count + 1
-            WHERE id = ?
-        """, (post_id,))
+            cursor.execute("""
+                INSERT INTO post_comments (id, post_id, user_id, content)
+                VALUES (?, ?, ?, ?)
+            """, (comment_id, post_id, user_id, content))
         
-        conn.commit()
-        conn.close()
+            # Update comment count
+            self.counters.increment(cursor, post_id, 'comments_count')
         
         return comment_id
     
     def get_post_comments(self, post_id):
         """Get comments for a specific post"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT c.*, u.name, u.bloom_name
-            FROM post_comments c
-            JOIN users u ON c.user_id = u.id
-            WHERE c.post_id = ?
-            ORDER BY c.created_at ASC
-        """, (post_id,))
+            cursor.execute("""
+                SELECT c.*, u.name, u.bloom_name
+                FROM post_comments c
+                JOIN users u ON c.user_id = u.id
+                WHERE c.post_id = ?
+                ORDER BY c.created_at ASC
+            """, (post_id,))
         
-        comments = []
-        for row in cursor.fetchall():
-            comments.append({
-                'id': row[0],
-                'post_id': row[1],
-                'user_id': row[2],
-                'content': row[3],
-                'created_at': row[4],
-                'user_name': row[5],
-                'bloom_name': row[6] or row[5]
-            })
+            comments = []
+            for row in cursor.fetchall():
+                comments.append({
+                    'id': row[0],
+                    'post_id': row[1],
+                    'user_id': row[2],
+                    'content': row[3],
+                    'created_at': row[4],
+                    'user_name': row[5],
+                    'bloom_name': row[6] or row[5]
+                })
         
-        conn.close()
         return comments
     
     def get_community_stats(self):
         """Get community statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM community_posts")
-        total_posts = cursor.fetchone()[0]
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("SELECT COUNT(*) FROM post_comments")
-        total_comments = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM community_posts")
+            total_posts = cursor.fetchone()[0]
         
-        cursor.execute("SELECT COUNT(*) FROM post_likes")
-        total_likes = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM post_comments")
+            total_comments = cursor.fetchone()[0]
         
-        cursor.execute("SELECT COUNT(DISTINCT user_id) FROM community_posts")
-        active_members = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM post_likes")
+            total_likes = cursor.fetchone()[0]
         
-        conn.close()
+            cursor.execute("SELECT COUNT(DISTINCT user_id) FROM community_posts")
+            active_members = cursor.fetchone()[0]
         
         return {
             'total_posts': total_posts,
@@ -235,9 +248,13 @@ class CommunityDB:
             'total_likes': total_likes,
             'active_members': active_members
         }
+    
+    def check_counters(self, repair=True):
+        """Recount likes and comments and fix posts whose stored counters drifted"""
+        return self.counters.check_consistency(repair=repair)
 
-# Initialize community database
-community_db = CommunityDB()
+# Shared instance, created on first use
+community_db = LazySingleton(CommunityDB)
 
 # Seed some sample posts
 def seed_community():
@@ -266,16 +283,12 @@ def seed_community():
     ]
     
     # Check if posts already exist
-    conn = sqlite3.connect("inner_bloom.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM community_posts")
-    count = cursor.fetchone()[0]
-    conn.close()
+    with connection(community_db.db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM community_posts")
+        count = cursor.fetchone()[0]
     
     if count == 0:
         for post in sample_posts:
             community_db.create_post(**post)
 
-# Seed the community
-seed_community()
-
@@ -68,6 +68,16 @@ class FraudDetectionRule(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class RiskCounterBucket(db.Model):
+    __tablename__ = 'risk_counter_buckets'
+
+    # Event count or payout total per user, stream and fixed-width time bucket,
+    # shared by every worker so velocity rules see all of a user's events
+    user_id = db.Column(db.Integer, primary_key=True)
+    stream = db.Column(db.String(50), primary_key=True)  # SecurityEvent.event_type or payout_amount
+    bucket_start = db.Column(db.Integer, primary_key=True)  # Unix seconds
+    value = db.Column(db.Float, nullable=False, default=0.0)
+
 class UserRiskProfile(db.Model):
     __tablename__ = 'user_risk_profiles'
     
@@ -526,24 +536,29 @@ def initialize_ui_themes():
     db.session.commit()
 
 def calculate_risk_score(user_id, event_type, event_data):
-    """Calculate risk score for a user event"""
+    """Calculate risk score for a user event.
+
+    Rules are evaluated by the risk engine, which keeps compiled rules in
+    memory and reads the user's shared window counters in one query, so
+    this does no rule or event-history queries of its own.
+    """
+    from src.risk_engine import risk_engine
+
     user_profile = UserRiskProfile.query.filter_by(user_id=user_id).first()
     if not user_profile:
         user_profile = create_user_risk_profile(user_id)
     
-    total_risk_score = 0
-    triggered_rules = []
+    total_risk_score, triggered = risk_engine.evaluate(user_id, event_type, event_data, user_profile)
+    triggered_rules = [rule.name for rule in triggered]
     
-    # Get active fraud detection rules
-    active_rules = FraudDetectionRule.query.filter_by(is_active=True).all()
-    
-    for rule in active_rules:
-        if evaluate_fraud_rule(rule, user_id, event_type, event_data):
-            total_risk_score += rule.risk_score
-            triggered_rules.append(rule.rule_name)
-            
-            # Update rule statistics
-            rule.total_triggers += 1
+    # Update rule statistics without touching updated_at, which versions the rule cache
+    for rule in triggered:
+        db.session.execute(
+            FraudDetectionRule.__table__.update()
+            .where(FraudDetectionRule.id == rule.id)
+            .values(total_triggers=FraudDetectionRule.total_triggers + 1,
+                    updated_at=FraudDetectionRule.updated_at)
+        )
     
     # Update user risk profile
     user_profile.current_risk_score = min(100, user_profile.current_risk_score + total_risk_score)
@@ -567,131 +582,6 @@ def calculate_risk_score(user_id, event_type, event_data):
         'triggered_rules': triggered_rules
     }
 
-def evaluate_fraud_rule(rule, user_id, event_type, event_data):
-    """Evaluate if a fraud detection rule is triggered"""
-    rule_config = rule.rule_config
-    
-    if rule.rule_type == 'velocity':
-        return evaluate_velocity_rule(rule, user_id, event_type, event_data)
-    elif rule.rule_type == 'anomaly':
-        return evaluate_anomaly_rule(rule, user_id, event_type, event_data)
-    elif rule.rule_type == 'pattern':
-        return evaluate_pattern_rule(rule, user_id, event_type, event_data)
-    elif rule.rule_type == 'blacklist':
-        return evaluate_blacklist_rule(rule, user_id, event_type, event_data)
-    
-    return False
-
-def evaluate_velocity_rule(rule, user_id, event_type, event_data):
-    """Evaluate velocity-based fraud rule"""
-    rule_config = rule.rule_config
-    action = rule_config.get('action')
-    
-    if action != event_type:
-        return False
-    
-    # Count events in time window
-    time_window = datetime.utcnow() - timedelta(minutes=rule.time_window_minutes)
-    
-    if action == 'failed_login':
-        count = SecurityEvent.query.filter(
-            SecurityEvent.user_id == user_id,
-            SecurityEvent.event_type == 'failed_login',
-            SecurityEvent.occurred_at >= time_window
-        ).count()
-    elif action == 'create_referral':
-        # This would check referral creation events
-        count = SecurityEvent.query.filter(
-            SecurityEvent.user_id == user_id,
-            SecurityEvent.event_type == 'referral_created',
-            SecurityEvent.occurred_at >= time_window
-        ).count()
-    else:
-        return False
-    
-    return count >= rule.threshold_value
-
-def evaluate_anomaly_rule(rule, user_id, event_type, event_data):
-    """Evaluate anomaly-based fraud rule"""
-    rule_config = rule.rule_config
-    check_type = rule_config.get('check_type')
-    
-    user_profile = UserRiskProfile.query.filter_by(user_id=user_id).first()
-    if not user_profile:
-        return False
-    
-    if check_type == 'geolocation':
-        # Check if login location is unusual
-        current_location = event_data.get('geolocation', {})
-        typical_locations = user_profile.typical_locations or []
-        
-        if not typical_locations:
-            return False  # No baseline to compare
-        
-        # Simple distance check (in production, use proper geolocation library)
-        for location in typical_locations:
-            if location.get('country') == current_location.get('country'):
-                return False
-        
-        return True  # Different country than usual
-    
-    elif check_type == 'device_fingerprint':
-        # Check if device is significantly different
-        current_fingerprint = event_data.get('device_fingerprint')
-        typical_devices = user_profile.typical_devices or []
-        
-        if not typical_devices or not current_fingerprint:
-            return False
-        
-        # Simple similarity check
-        for device in typical_devices:
-            if device == current_fingerprint:
-                return False
-        
-        return True  # Completely new device
-    
-    return False
-
-def evaluate_pattern_rule(rule, user_id, event_type, event_data):
-    """Evaluate pattern-based fraud rule"""
-    rule_config = rule.rule_config
-    check_type = rule_config.get('check_type')
-    
-    if check_type == 'payout_velocity':
-        # Check for suspicious payout patterns
-        time_window = datetime.utcnow() - timedelta(minutes=rule.time_window_minutes)
-        
-        from src.models.banking_system import PayoutTransaction
-        recent_payouts = PayoutTransaction.query.filter(
-            PayoutTransaction.user_id == user_id,
-            PayoutTransaction.created_at >= time_window
-        ).all()
-        
-        total_amount = sum(payout.amount for payout in recent_payouts)
-        return total_amount >= rule.threshold_value
-    
-    return False
-
-def evaluate_blacklist_rule(rule, user_id, event_type, event_data):
-    """Evaluate blacklist-based fraud rule"""
-    rule_config = rule.rule_config
-    blacklist_type = rule_config.get('blacklist_type')
-    
-    if blacklist_type == 'ip_address':
-        ip_address = event_data.get('ip_address')
-        blacklisted_ips = rule_config.get('blacklisted_ips', [])
-        return ip_address in blacklisted_ips
-    
-    elif blacklist_type == 'email_domain':
-        from src.models.user import User
-        user = User.query.get(user_id)
-        if user:
-            email_domain = user.email.split('@')[1].lower()
-            blacklisted_domains = rule_config.get('blacklisted_domains', [])
-            return email_domain in blacklisted_domains
-    
-    return False
-
 def create_user_risk_profile(user_id):
     """Create initial risk profile for user"""
     risk_profile = UserRiskProfile(user_id=user_id)
@@ -713,8 +603,12 @@ def log_security_event(user_id, event_type, event_category, severity='low', desc
     )
     
     db.session.add(security_event)
+
+    # Counted in the same transaction as the event itself
+    from src.risk_engine import risk_engine
+    risk_engine.observe_event(user_id, event_type)
     db.session.commit()
-    
+
     # Calculate risk score for this event
     risk_result = calculate_risk_score(user_id, event_type, event_data or {})
     
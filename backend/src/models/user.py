@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -7,14 +8,20 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
+    email_domain = db.Column(db.String(120), index=True, nullable=True) # Lower-cased part after '@', kept in step with email
     bloom_name = db.Column(db.String(100), nullable=True)
     bloom_backstory = db.Column(db.Text, nullable=True)
     title = db.Column(db.String(100), nullable=True) # New field for identity marker/title    
     # Referral tracking fields
-    referred_by_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True) # ID of the user who referred this user
+    referred_by_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True) # ID of the user who referred this user
     referral_code_used = db.Column(db.String(50), nullable=True) # The specific referral code used by this user
     join_date = db.Column(db.DateTime, default=datetime.utcnow)
 
+    @validates('email')
+    def _set_email_domain(self, key, email):
+        self.email_domain = email.split('@', 1)[1].lower() if email and '@' in email else None
+        return email
+
     def __repr__(self):
         return f'<User {self.username}>'
 
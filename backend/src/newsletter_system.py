@@ -3,8 +3,6 @@ Inner Bloom Newsletter System
 Comprehensive email marketing and newsletter management
 """
 
-import smtplib
-import sqlite3
 import json
 import logging
 from email.mime.text import MIMEText
@@ -15,101 +13,113 @@ from datetime import datetime, timedelta
 import schedule
 import time
 import threading
-from jinja2 import Template
 import os
 
+from src.db_pool import connection
+from src.storage import database_path
+from src.lazy import LazySingleton
+from src.mailer import SMTPPool, BulkSender, DeliveryReport, SMTP_HOST, SMTP_PORT
+from src.email_templates import TemplateRegistry
+from src.email_queue import EmailQueue
+
 logger = logging.getLogger(__name__)
 
 class NewsletterSystem:
-    def __init__(self, db_path="inner_bloom.db"):
-        self.db_path = db_path
-        self.smtp_server = "smtp.gmail.com"
-        self.smtp_port = 587
+    def __init__(self, db_path=None):
+        self.db_path = db_path or database_path()
+        self.smtp_server = SMTP_HOST
+        self.smtp_port = SMTP_PORT
         self.email = os.getenv('NEWSLETTER_EMAIL', 'innerbloom@example.com')
         self.password = os.getenv('NEWSLETTER_PASSWORD', 'your_app_password')
+        # Connections are opened on first send, not here
+        self.smtp_pool = SMTPPool(self.smtp_server, self.smtp_port, self.email, self.password)
+        self.sender = BulkSender(self.smtp_pool)
+        self.templates = TemplateRegistry(self.db_path)
+        self._campaign_threads = {}
+        self._campaign_lock = threading.Lock()
         self.init_database()
-        self.setup_email_templates()
+        self.queue = EmailQueue(self.db_path)
     
     def init_database(self):
         """Initialize newsletter database tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Newsletter subscribers table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS newsletter_subscribers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                name TEXT,
-                status TEXT DEFAULT 'active',
-                subscription_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                interests TEXT,
-                source TEXT,
-                engagement_score INTEGER DEFAULT 0,
-                last_opened TIMESTAMP,
-                unsubscribe_token TEXT UNIQUE
-            )
-        ''')
-        
-        # Newsletter campaigns table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS newsletter_campaigns (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                subject TEXT NOT NULL,
-                content TEXT NOT NULL,
-                template_name TEXT,
-                status TEXT DEFAULT 'draft',
-                scheduled_date TIMESTAMP,
-                sent_date TIMESTAMP,
-                recipient_count INTEGER DEFAULT 0,
-                open_count INTEGER DEFAULT 0,
-                click_count INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Email templates table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS email_templates (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                subject_template TEXT,
-                html_template TEXT NOT NULL,
-                text_template TEXT,
-                category TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Email analytics table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS email_analytics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                campaign_id INTEGER,
-                subscriber_email TEXT,
-                action TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                ip_address TEXT,
-                user_agent TEXT,
-                FOREIGN KEY (campaign_id) REFERENCES newsletter_campaigns (id)
-            )
-        ''')
-        
-        # Automated sequences table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS email_sequences (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                trigger_event TEXT,
-                sequence_data TEXT,
-                active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+        
+            # Newsletter subscribers table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS newsletter_subscribers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    email TEXT UNIQUE NOT NULL,
+                    name TEXT,
+                    status TEXT DEFAULT 'active',
+                    subscription_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    interests TEXT,
+                    source TEXT,
+                    engagement_score INTEGER DEFAULT 0,
+                    last_opened TIMESTAMP,
+                    unsubscribe_token TEXT UNIQUE
+                )
+            ''')
+        
+            # Newsletter campaigns table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS newsletter_campaigns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    template_name TEXT,
+                    template_data TEXT,
+                    kind TEXT DEFAULT 'bulk',
+                    status TEXT DEFAULT 'draft',
+                    scheduled_date TIMESTAMP,
+                    sent_date TIMESTAMP,
+                    recipient_count INTEGER DEFAULT 0,
+                    open_count INTEGER DEFAULT 0,
+                    click_count INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+        
+            # Email templates table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS email_templates (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT UNIQUE NOT NULL,
+                    subject_template TEXT,
+                    html_template TEXT NOT NULL,
+                    text_template TEXT,
+                    category TEXT,
+                    version INTEGER DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+        
+            # Email analytics table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS email_analytics (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    campaign_id INTEGER,
+                    subscriber_email TEXT,
+                    action TEXT,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    ip_address TEXT,
+                    user_agent TEXT,
+                    FOREIGN KEY (campaign_id) REFERENCES newsletter_campaigns (id)
+                )
+            ''')
         
-        conn.commit()
-        conn.close()
+            # Automated sequences table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS email_sequences (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    trigger_event TEXT,
+                    sequence_data TEXT,
+                    active BOOLEAN DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
     
     def setup_email_templates(self):
         """Set up default email templates"""
@@ -291,36 +301,36 @@ class NewsletterSystem:
             }
         ]
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
         
-        for template in templates:
-            cursor.execute('''
-                INSERT OR REPLACE INTO email_templates 
-                (name, subject_template, html_template, category)
-                VALUES (?, ?, ?, ?)
-            ''', (template['name'], template['subject'], template['html'], template['category']))
+            for template in templates:
+                # Upsert keeps the row id, so compiled copies are only dropped if the text changed
+                cursor.execute('''
+                    INSERT INTO email_templates 
+                    (name, subject_template, html_template, category)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(name) DO UPDATE SET
+                        subject_template = excluded.subject_template,
+                        html_template = excluded.html_template,
+                        category = excluded.category
+                ''', (template['name'], template['subject'], template['html'], template['category']))
         
-        conn.commit()
-        conn.close()
+        self.templates.invalidate()
         logger.info("Email templates set up successfully")
     
     def subscribe_user(self, email, name=None, interests=None, source="website"):
         """Subscribe a user to the newsletter"""
         import uuid
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
             unsubscribe_token = str(uuid.uuid4())
-            cursor.execute('''
-                INSERT OR REPLACE INTO newsletter_subscribers 
-                (email, name, interests, source, unsubscribe_token)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (email, name, json.dumps(interests) if interests else None, source, unsubscribe_token))
-            
-            conn.commit()
+            with connection(self.db_path) as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO newsletter_subscribers 
+                    (email, name, interests, source, unsubscribe_token)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (email, name, json.dumps(interests) if interests else None, source, unsubscribe_token))
             
             # Send welcome email
             self.send_welcome_email(email, name or "Sister")
@@ -331,8 +341,6 @@ class NewsletterSystem:
         except Exception as e:
             logger.error(f"Error subscribing user: {e}")
             return False
-        finally:
-            conn.close()
     
     def send_welcome_email(self, email, name):
         """Send welcome email to new subscriber"""
@@ -354,114 +362,309 @@ class NewsletterSystem:
     
     def send_template_email(self, email, template_name, template_data, campaign_name=None):
         """Send email using a template"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            # Get template
-            cursor.execute('SELECT subject_template, html_template FROM email_templates WHERE name = ?', (template_name,))
-            template_row = cursor.fetchone()
+            # Get the compiled template
+            template = self.templates.get(template_name)
             
-            if not template_row:
+            if not template:
                 logger.error(f"Template not found: {template_name}")
                 return False
             
-            subject_template, html_template = template_row
-            
             # Render templates
-            subject = Template(subject_template).render(**template_data)
-            html_content = Template(html_template).render(**template_data)
+            subject, html_content, text_content = template.render(**template_data)
             
             # Send email
-            success = self.send_email(email, subject, html_content)
+            success = self.send_email(email, subject, html_content, text_content)
             
             if success and campaign_name:
-                # Log campaign
-                cursor.execute('''
-                    INSERT INTO newsletter_campaigns 
-                    (name, subject, content, status, sent_date, recipient_count)
-                    VALUES (?, ?, ?, 'sent', CURRENT_TIMESTAMP, 1)
-                ''', (campaign_name, subject, html_content))
-                conn.commit()
+                self.log_delivery(campaign_name, template, template_data, email)
             
             return success
             
         except Exception as e:
             logger.error(f"Error sending template email: {e}")
             return False
-        finally:
-            conn.close()
     
-    def send_email(self, to_email, subject, html_content, text_content=None):
-        """Send individual email"""
-        try:
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.email
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            # Add HTML content
-            html_part = MIMEText(html_content, 'html')
-            msg.attach(html_part)
+    def log_delivery(self, campaign_name, template, template_data, email):
+        """Count one transactional email against today's campaign row for its name.
+        
+        The first send of the day creates the row, with the content rendered
+        once for a generic recipient; later sends only add a delivery row
+        and bump recipient_count. Returns the campaign id.
+        """
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute('''
+                SELECT id FROM newsletter_campaigns
+                WHERE kind = 'transactional' AND name = ? AND template_name = ? AND created_at >= date('now')
+                ORDER BY id DESC LIMIT 1
+            ''', (campaign_name, template.name))
+            row = cursor.fetchone()
+            if row:
+                campaign_id = row[0]
+            else:
+                subject, html_content, _ = template.campaign(template_data).render({'name': 'Sister'})
+                cursor.execute('''
+                    INSERT INTO newsletter_campaigns 
+                    (name, subject, content, template_name, kind, status, sent_date, recipient_count)
+                    VALUES (?, ?, ?, ?, 'transactional', 'sent', CURRENT_TIMESTAMP, 0)
+                ''', (campaign_name, subject, html_content, template.name))
+                campaign_id = cursor.lastrowid
             
-            # Add text content if provided
-            if text_content:
-                text_part = MIMEText(text_content, 'plain')
-                msg.attach(text_part)
+            new_recipient = self.queue.record_delivery(campaign_id, email, template_data.get('name'))
+            cursor.execute('''
+                UPDATE newsletter_campaigns
+                SET recipient_count = recipient_count + ?, sent_date = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (1 if new_recipient else 0, campaign_id))
+        return campaign_id
+    
+    def record_engagement(self, email, campaign_id, action, ip_address=None, user_agent=None):
+        """Log an open or click; campaign counters count each delivered recipient once.
+
+        Events with no delivery row (history from before the outbox) are
+        kept in email_analytics only.
+        """
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
             
-            # Send email
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.email, self.password)
-            server.send_message(msg)
-            server.quit()
+            # Raw event log
+            cursor.execute('''
+                INSERT INTO email_analytics 
+                (campaign_id, subscriber_email, action, ip_address, user_agent)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (campaign_id, email, action, ip_address, user_agent))
             
+            # Update subscriber engagement score
+            cursor.execute('''
+                UPDATE newsletter_subscribers 
+                SET engagement_score = engagement_score + 1,
+                    last_opened = CURRENT_TIMESTAMP
+                WHERE email = ?
+            ''', (email,))
+            
+            if action not in ('open', 'click') or campaign_id is None:
+                return
+            
+            # Only a recipient's first open/click of a delivered message counts
+            if self.queue.record_engagement(campaign_id, email, action) is not True:
+                return
+            counter = 'open_count' if action == 'open' else 'click_count'
+            cursor.execute(f'''
+                UPDATE newsletter_campaigns SET {counter} = {counter} + 1 WHERE id = ?
+            ''', (campaign_id,))
+    
+    def build_message(self, to_email, subject, html_content, text_content=None):
+        """MIME message ready to send"""
+        msg = MIMEMultipart('alternative')
+        msg['From'] = self.email
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        
+        # Add HTML content
+        html_part = MIMEText(html_content, 'html')
+        msg.attach(html_part)
+        
+        # Add text content if provided
+        if text_content:
+            text_part = MIMEText(text_content, 'plain')
+            msg.attach(text_part)
+        
+        return msg
+    
+    def send_email(self, to_email, subject, html_content, text_content=None):
+        """Send individual email over a pooled SMTP connection, retrying transient failures"""
+        try:
+            msg = self.build_message(to_email, subject, html_content, text_content)
+        except Exception as e:
+            logger.error(f"Error sending email to {to_email}: {e}")
+            return False
+        
+        if self.sender.deliver(msg):
             logger.info(f"Email sent successfully to {to_email}")
             return True
+        return False
+    
+    def queue_campaign(self, template_name, template_data, campaign_name=None, recipients=None):
+        """Record a campaign and its recipients in the outbox; returns the campaign id.
+        
+        ``recipients`` is an iterable of (email, name); by default every
+        active subscriber. Nothing is sent until run_campaign or
+        start_campaign picks the campaign up.
+        """
+        template = self.templates.get(template_name)
+        if not template:
+            raise ValueError(f"Template not found: {template_name}")
+        
+        subject, html_content, _ = template.campaign(template_data).render({'name': 'Sister'})
+        
+        # Campaign row and outbox rows commit together, so a crash never leaves half a fan-out
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute('''
+                INSERT INTO newsletter_campaigns 
+                (name, subject, content, template_name, template_data, status)
+                VALUES (?, ?, ?, ?, ?, 'queued')
+            ''', (campaign_name or template_name, subject, html_content, template_name, json.dumps(template_data)))
+            campaign_id = cursor.lastrowid
             
-        except Exception as e:
-            logger.error(f"Error sending email to {to_email}: {e}")
+            if recipients is None:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO email_outbox (campaign_id, email, name)
+                    SELECT ?, email, name FROM newsletter_subscribers WHERE status = 'active'
+                ''', (campaign_id,))
+                queued = cursor.rowcount
+            else:
+                queued = self.queue.enqueue(campaign_id, recipients)
+        
+        logger.info(f"Campaign {campaign_id} ({template_name}) queued for {queued} recipients")
+        return campaign_id
+    
+    def run_campaign(self, campaign_id):
+        """Send a queued campaign's unsent messages batch by batch; returns the DeliveryReport.
+        
+        Safe to run from several workers at once, and to re-run after a
+        crash: only rows claimed by this call are sent, and each batch's
+        outcome is written before the next batch is claimed. If the SMTP
+        server cannot be reached or rejects the login, SMTPUnavailable is
+        raised and the unsent rows stay pending for the next run.
+        """
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT template_name, template_data FROM newsletter_campaigns WHERE id = ?
+            ''', (campaign_id,))
+            row = cursor.fetchone()
+            if not row:
+                raise ValueError(f"Campaign not found: {campaign_id}")
+            cursor.execute('''
+                UPDATE newsletter_campaigns SET status = 'sending' WHERE id = ? AND status = 'queued'
+            ''', (campaign_id,))
+        
+        template = self.templates.get(row[0])
+        if not template:
+            raise ValueError(f"Template not found: {row[0]}")
+        renderer = template.campaign(json.loads(row[1] or '{}'))
+        
+        def build(item):
+            _, email, name = item
+            subject, html_content, text_content = renderer.render({'email': email, 'name': name or 'Sister'})
+            return self.build_message(email, subject, html_content, text_content)
+        
+        report = DeliveryReport()
+        while True:
+            batch = self.queue.claim(campaign_id)
+            if not batch:
+                break
+            outcomes = []
+            try:
+                self.sender.send(batch, build, report,
+                                 on_result=lambda item, error: outcomes.append((item[0], error)))
+            finally:
+                # If the SMTP server is unreachable or rejects the login, the
+                # run stops here with the unattempted rows back to pending
+                self.queue.record(outcomes)
+                finished = {outbox_id for outbox_id, _ in outcomes}
+                self.queue.release([row[0] for row in batch if row[0] not in finished])
+        
+        self.finish_campaign(campaign_id)
+        logger.info(f"Campaign {campaign_id}: {report.sent} sent, {report.failed} failed "
+                    f"in {report.seconds:.1f}s")
+        return report
+    
+    def finish_campaign(self, campaign_id):
+        """Mark a campaign sent once no recipient is pending or in flight"""
+        progress = self.queue.progress(campaign_id)
+        if progress['pending'] or progress['in_flight']:
             return False
+        with connection(self.db_path) as conn:
+            conn.execute('''
+                UPDATE newsletter_campaigns
+                SET status = 'sent', sent_date = CURRENT_TIMESTAMP, recipient_count = ?
+                WHERE id = ? AND status != 'sent'
+            ''', (progress['sent'], campaign_id))
+        return True
+    
+    def start_campaign(self, campaign_id):
+        """Run a campaign on a background thread, unless this process is already running it"""
+        with self._campaign_lock:
+            thread = self._campaign_threads.get(campaign_id)
+            if thread and thread.is_alive():
+                return False
+            thread = threading.Thread(target=self._run_campaign_safely, args=(campaign_id,), daemon=True)
+            self._campaign_threads[campaign_id] = thread
+        thread.start()
+        return True
+    
+    def _run_campaign_safely(self, campaign_id):
+        try:
+            self.run_campaign(campaign_id)
+        except Exception as e:
+            logger.error(f"Error running campaign {campaign_id}: {e}")
+    
+    def resume_campaigns(self):
+        """Start every campaign left queued or half-sent, e.g. by a restart; returns their ids"""
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM newsletter_campaigns WHERE status IN ('queued', 'sending')")
+            campaign_ids = [row[0] for row in cursor.fetchall()]
+        
+        for campaign_id in campaign_ids:
+            self.start_campaign(campaign_id)
+        return campaign_ids
+    
+    def campaign_progress(self, campaign_id):
+        """Campaign status with outbox counts, throughput and ETA, or None if unknown"""
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT name, template_name, status, created_at, sent_date
+                FROM newsletter_campaigns WHERE id = ?
+            ''', (campaign_id,))
+            row = cursor.fetchone()
+        if not row:
+            return None
+        
+        return dict({
+            'campaign_id': campaign_id,
+            'name': row[0],
+            'template': row[1],
+            'status': row[2],
+            'created_at': row[3],
+            'sent_date': row[4],
+            'failures': self.queue.failures(campaign_id, limit=20)
+        }, **self.queue.progress(campaign_id))
+    
+    def send_bulk(self, template_name, recipients, template_data, campaign_name=None):
+        """Queue a template for many (email, name) recipients and send it now; returns the DeliveryReport"""
+        return self.run_campaign(self.queue_campaign(template_name, template_data, campaign_name, recipients))
+    
+    def queue_daily_inspiration(self):
+        """Queue today's daily inspiration for every active subscriber; returns the campaign id"""
+        template_data = {
+            'date': datetime.now().strftime('%B %d, %Y'),
+            'affirmation_title': 'Divine Empowerment Affirmation',
+            'daily_affirmation': 'I am divinely guided, abundantly blessed, and powerfully equipped for my purpose.',
+            'daily_message': 'Today, remember that you are not here by accident. Every challenge you face is preparing you for the breakthrough that\'s coming. Your current situation is not your final destination.',
+            'action_step': 'Write down three things you\'re grateful for and share one victory (no matter how small) in our community.',
+            'platform_url': 'https://innerbloom.com'
+        }
+        
+        return self.queue_campaign('daily_inspiration', template_data, 'Daily Inspiration')
     
     def send_daily_inspiration(self):
         """Send daily inspiration email to all active subscribers"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            # Get active subscribers
-            cursor.execute('SELECT email, name FROM newsletter_subscribers WHERE status = "active"')
-            subscribers = cursor.fetchall()
+            report = self.run_campaign(self.queue_daily_inspiration())
             
-            # Prepare template data
-            from datetime import datetime
-            template_data = {
-                'date': datetime.now().strftime('%B %d, %Y'),
-                'affirmation_title': 'Divine Empowerment Affirmation',
-                'daily_affirmation': 'I am divinely guided, abundantly blessed, and powerfully equipped for my purpose.',
-                'daily_message': 'Today, remember that you are not here by accident. Every challenge you face is preparing you for the breakthrough that\'s coming. Your current situation is not your final destination.',
-                'action_step': 'Write down three things you\'re grateful for and share one victory (no matter how small) in our community.',
-                'platform_url': 'https://innerbloom.com'
-            }
-            
-            sent_count = 0
-            for email, name in subscribers:
-                template_data['name'] = name or 'Sister'
-                
-                if self.send_template_email(email, 'daily_inspiration', template_data, 'Daily Inspiration'):
-                    sent_count += 1
-                
-                # Small delay to avoid overwhelming email servers
-                time.sleep(0.1)
-            
-            logger.info(f"Daily inspiration sent to {sent_count} subscribers")
-            return sent_count
+            logger.info(f"Daily inspiration sent to {report.sent} subscribers")
+            return report.sent
             
         except Exception as e:
             logger.error(f"Error sending daily inspiration: {e}")
             return 0
-        finally:
-            conn.close()
     
     def send_earnings_update(self, email, earnings_data):
         """Send earnings update to specific user"""
@@ -476,75 +679,57 @@ class NewsletterSystem:
         
         return self.send_template_email(email, 'earnings_update', template_data, 'Earnings Update')
     
+    def queue_community_highlight(self):
+        """Queue the weekly community highlight for every active subscriber; returns the campaign id"""
+        template_data = {
+            'new_members': 247,  # This would be calculated from actual data
+            'community_earnings': '47,382',
+            'countries': 89,
+            'community_url': 'https://innerbloom.com/community'
+        }
+        
+        return self.queue_campaign('community_highlight', template_data, 'Community Highlight')
+    
     def send_community_highlight(self):
         """Send weekly community highlight email"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            # Get community stats
-            cursor.execute('SELECT COUNT(*) FROM newsletter_subscribers WHERE status = "active"')
-            total_members = cursor.fetchone()[0]
-            
-            # Get subscribers for sending
-            cursor.execute('SELECT email, name FROM newsletter_subscribers WHERE status = "active"')
-            subscribers = cursor.fetchall()
-            
-            template_data = {
-                'new_members': 247,  # This would be calculated from actual data
-                'community_earnings': '47,382',
-                'countries': 89,
-                'community_url': 'https://innerbloom.com/community'
-            }
-            
-            sent_count = 0
-            for email, name in subscribers:
-                template_data['name'] = name or 'Sister'
-                
-                if self.send_template_email(email, 'community_highlight', template_data, 'Community Highlight'):
-                    sent_count += 1
-                
-                time.sleep(0.1)
+            report = self.run_campaign(self.queue_community_highlight())
             
-            logger.info(f"Community highlight sent to {sent_count} subscribers")
-            return sent_count
+            logger.info(f"Community highlight sent to {report.sent} subscribers")
+            return report.sent
             
         except Exception as e:
             logger.error(f"Error sending community highlight: {e}")
             return 0
-        finally:
-            conn.close()
     
     def get_subscriber_stats(self):
         """Get newsletter subscriber statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
         
-        try:
-            cursor.execute('SELECT COUNT(*) FROM newsletter_subscribers WHERE status = "active"')
-            active_subscribers = cursor.fetchone()[0]
+            try:
+                cursor.execute('SELECT COUNT(*) FROM newsletter_subscribers WHERE status = "active"')
+                active_subscribers = cursor.fetchone()[0]
             
-            cursor.execute('SELECT COUNT(*) FROM newsletter_subscribers')
-            total_subscribers = cursor.fetchone()[0]
+                cursor.execute('SELECT COUNT(*) FROM newsletter_subscribers')
+                total_subscribers = cursor.fetchone()[0]
             
-            cursor.execute('SELECT COUNT(*) FROM newsletter_campaigns WHERE status = "sent"')
-            campaigns_sent = cursor.fetchone()[0]
+                cursor.execute('SELECT COUNT(*) FROM newsletter_campaigns WHERE status = "sent"')
+                campaigns_sent = cursor.fetchone()[0]
             
-            cursor.execute('SELECT AVG(open_count * 100.0 / recipient_count) FROM newsletter_campaigns WHERE recipient_count > 0')
-            avg_open_rate = cursor.fetchone()[0] or 0
+                cursor.execute('SELECT AVG(open_count * 100.0 / recipient_count) FROM newsletter_campaigns WHERE recipient_count > 0')
+                avg_open_rate = cursor.fetchone()[0] or 0
             
-            return {
-                'active_subscribers': active_subscribers,
-                'total_subscribers': total_subscribers,
-                'campaigns_sent': campaigns_sent,
-                'average_open_rate': round(avg_open_rate, 2)
-            }
+                return {
+                    'active_subscribers': active_subscribers,
+                    'total_subscribers': total_subscribers,
+                    'campaigns_sent': campaigns_sent,
+                    'average_open_rate': round(avg_open_rate, 2)
+                }
             
-        except Exception as e:
-            logger.error(f"Error getting subscriber stats: {e}")
-            return {}
-        finally:
-            conn.close()
+            except Exception as e:
+                logger.error(f"Error getting subscriber stats: {e}")
+                return {}
     
     def setup_automated_sequences(self):
         """Set up automated email sequences"""
@@ -569,22 +754,20 @@ class NewsletterSystem:
             }
         ]
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
         
-        for sequence in sequences:
-            cursor.execute('''
-                INSERT OR REPLACE INTO email_sequences 
-                (name, trigger_event, sequence_data)
-                VALUES (?, ?, ?)
-            ''', (sequence['name'], sequence['trigger_event'], sequence['sequence_data']))
+            for sequence in sequences:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO email_sequences 
+                    (name, trigger_event, sequence_data)
+                    VALUES (?, ?, ?)
+                ''', (sequence['name'], sequence['trigger_event'], sequence['sequence_data']))
         
-        conn.commit()
-        conn.close()
         logger.info("Automated email sequences set up successfully")
 
-# Initialize newsletter system
-newsletter = NewsletterSystem()
+# Shared instance, created on first use (templates via `python -m src.manage migrate`)
+newsletter = LazySingleton(NewsletterSystem)
 
 def start_newsletter_scheduler():
     """Start the newsletter scheduler in a separate thread"""
@@ -595,6 +778,10 @@ def start_newsletter_scheduler():
         # Schedule weekly community highlight on Sundays at 10 AM
         schedule.every().sunday.at("10:00").do(newsletter.send_community_highlight)
         
+        # Finish campaigns interrupted by a restart, and pick up expired claims
+        newsletter.resume_campaigns()
+        schedule.every(10).minutes.do(newsletter.resume_campaigns)
+        
         while True:
             schedule.run_pending()
             time.sleep(60)  # Check every minute
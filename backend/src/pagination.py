@@ -0,0 +1,45 @@
+"""
+Inner Bloom Pagination
+Opaque keyset cursors and NDJSON encoding for feed endpoints
+"""
+
+import json
+import base64
+from datetime import datetime
+
+STREAM_BATCH_SIZE = 50
+MAX_STREAM_ITEMS = 1000
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue"""
+
+
+def clamp_limit(limit, maximum=MAX_PAGE_SIZE):
+    """Page or stream size from a query argument, kept within 1..maximum"""
+    return max(1, min(limit, maximum))
+
+
+def encode_cursor(created_at, item_id):
+    """Opaque cursor for the keyset position just after (created_at, id)"""
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    payload = json.dumps([created_at, item_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (created_at, id) pair a cursor was built from"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+    return created_at, item_id
+
+
+def ndjson_lines(items):
+    """Encode an iterable of dicts as newline-delimited JSON, one chunk per item"""
+    for item in items:
+        yield json.dumps(item, default=str) + '\n'
@@ -0,0 +1,308 @@
+"""
+Inner Bloom Points Writer
+Buffered, journaled point awards flushed to the users table in batches
+"""
+
+import os
+import json
+import uuid
+import fcntl
+import atexit
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List
+
+from src.db_pool import connection
+from src.leaderboard import leaderboards
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv('POINTS_BATCH_SIZE', 200))
+FLUSH_INTERVAL = float(os.getenv('POINTS_FLUSH_INTERVAL', 1.0))
+FSYNC_AWARDS = os.getenv('POINTS_JOURNAL_FSYNC', '0') == '1'
+JOURNAL_DIRNAME = 'points_journal'
+JOURNAL_SUFFIX = '.jnl'
+UNREPLAYABLE_SUFFIX = '.bad'
+
+
+def as_points(value) -> int:
+    """``value`` as a whole number of points.
+
+    Accepts ints, integral floats (``5.0``) and integer strings (``"5"``).
+    Raises TypeError for booleans and other types, and ValueError for
+    fractional amounts such as ``3.7``.
+    """
+    if isinstance(value, bool):
+        raise TypeError("points must be an integer, not a boolean")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"points must be a whole number, got {value}")
+        return int(value)
+    if isinstance(value, str):
+        return int(value.strip())
+    raise TypeError(f"points must be an integer, got {type(value).__name__}")
+
+
+class PointsWriter:
+    """Coalesces point awards in memory and writes them in one transaction.
+
+    Every award is appended to a journal file before ``award`` returns, then
+    buffered. A flush (every ``batch_size`` awards or ``flush_interval``
+    seconds, whichever comes first) applies the batch with ``executemany``:
+    one points UPDATE per user, one activity row per award and the level-up
+    check, all in a single transaction.
+
+    Each batch has its own journal file, named by batch id. The id is
+    recorded in ``points_journal_batches`` in the same transaction that
+    applies the batch, and the file is deleted after the commit. On startup,
+    journal files nobody holds a lock on are replayed unless their batch id is
+    already recorded. An award is therefore applied at least once, and a
+    crash between commit and delete does not apply it twice. Journal writes
+    are flushed to the OS per award, which survives a process crash; set
+    POINTS_JOURNAL_FSYNC=1 to also fsync each award against power loss.
+    """
+
+    def __init__(self, db_path, journal_dir=None, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.journal_dir = journal_dir or os.path.join(os.path.dirname(db_path), JOURNAL_DIRNAME)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._awards = []
+        self._journal = None
+        self._batch_id = None
+        self._failed = []
+        self._stats = {'awards': 0, 'flushes': 0, 'rows_flushed': 0, 'replayed': 0, 'errors': 0}
+
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self.init_database()
+        self.recover()
+        self._open_journal()
+
+        atexit.register(self.close)
+        self._thread = threading.Thread(target=self._run, name='points-writer', daemon=True)
+        self._thread.start()
+
+    def init_database(self):
+        with connection(self.db_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS points_journal_batches (
+                    batch_id TEXT PRIMARY KEY,
+                    awards INTEGER NOT NULL,
+                    applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+    # Journal ------------------------------------------------------------------
+
+    def _journal_path(self, batch_id):
+        return os.path.join(self.journal_dir, f"{batch_id}{JOURNAL_SUFFIX}")
+
+    def _open_journal(self):
+        # An exclusive lock marks the file as live, so recovery in another
+        # process leaves it alone
+        self._batch_id = uuid.uuid4().hex
+        self._journal = open(self._journal_path(self._batch_id), 'a')
+        fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    @staticmethod
+    def _validate(awards) -> List[Dict]:
+        """Awards with integer points; raises KeyError/TypeError/ValueError for a malformed entry"""
+        return [dict(entry, user_id=entry['user_id'], points=as_points(entry['points'])) for entry in awards]
+
+    def _set_aside(self, path, error):
+        """Rename a journal that can never be applied so it no longer blocks startup"""
+        aside = path + UNREPLAYABLE_SUFFIX
+        os.replace(path, aside)
+        self._stats['errors'] += 1
+        logger.error(f"Point journal {path} cannot be replayed ({error}); moved to {aside}")
+
+    @staticmethod
+    def _read_journal(f) -> List[Dict]:
+        awards = []
+        f.seek(0)
+        for line in f:
+            try:
+                awards.append(json.loads(line))
+            except ValueError:
+                # Torn final line from a crash mid-write; the award was never acknowledged
+                continue
+        return awards
+
+    def recover(self) -> int:
+        """Replay journals left behind by a process that exited without flushing"""
+        replayed = 0
+        for filename in sorted(os.listdir(self.journal_dir)):
+            if not filename.endswith(JOURNAL_SUFFIX):
+                continue
+            path = os.path.join(self.journal_dir, filename)
+            batch_id = filename[:-len(JOURNAL_SUFFIX)]
+            try:
+                f = open(path, 'r')
+            except FileNotFoundError:
+                continue
+            with f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # live journal of another writer
+                try:
+                    awards = self._validate(self._read_journal(f))
+                except (KeyError, TypeError, ValueError) as e:
+                    self._set_aside(path, e)
+                    continue
+                if awards and not self._apply(batch_id, awards):
+                    continue  # left on disk for the next start
+                replayed += len(awards)
+                os.remove(path)
+
+        if replayed:
+            self._stats['replayed'] += replayed
+            logger.info(f"Replayed {replayed} journaled point awards")
+        return replayed
+
+    # Public API -------------------------------------------------------------
+
+    def award(self, user_id: str, points: int, activity_type: str, description: str):
+        """Journal and buffer a point award; it reaches the database on the next flush.
+
+        Raises ValueError or TypeError if ``points`` is not an integer.
+        """
+        entry = {
+            'user_id': user_id,
+            'points': as_points(points),
+            'activity_type': activity_type,
+            'description': description,
+            'timestamp': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        line = json.dumps(entry) + '\n'
+
+        with self._lock:
+            self._journal.write(line)
+            self._journal.flush()
+            if FSYNC_AWARDS:
+                os.fsync(self._journal.fileno())
+            self._awards.append(entry)
+            self._stats['awards'] += 1
+            full = len(self._awards) >= self.batch_size
+
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Apply every buffered award now; returns the number of awards written"""
+        with self._flush_lock:
+            with self._lock:
+                awards, self._awards = self._awards, []
+                journal, batch_id = self._journal, self._batch_id
+                if awards:
+                    self._open_journal()
+
+            written = 0
+            remaining = self._failed + ([(batch_id, journal, awards)] if awards else [])
+            self._failed = []
+            try:
+                while remaining:
+                    pending_id, pending_journal, pending_awards = remaining[0]
+                    if self._apply(pending_id, pending_awards):
+                        pending_journal.close()
+                        os.remove(self._journal_path(pending_id))
+                        written += len(pending_awards)
+                    else:
+                        self._failed.append(remaining[0])
+                    remaining.pop(0)
+            finally:
+                # Batches not reached (or mid-cleanup) when something raised; a
+                # re-apply is a no-op because the batch id is recorded
+                self._failed.extend(remaining)
+            return written
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._awards) + sum(len(batch[2]) for batch in self._failed)
+
+    def stats(self) -> Dict:
+        stats = dict(self._stats)
+        stats['pending'] = self.pending()
+        return stats
+
+    def close(self):
+        """Stop the flush thread and write out anything still buffered"""
+        self._stop.set()
+        self._wakeup.set()
+        self.flush()
+
+    # Flushing ---------------------------------------------------------------
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Points flush failed: {e}")
+
+    def _apply(self, batch_id, awards) -> bool:
+        """Write one batch in a single transaction; False leaves it for a retry"""
+        try:
+            totals = {}
+            for entry in awards:
+                totals[entry['user_id']] = totals.get(entry['user_id'], 0) + entry['points']
+
+            with connection(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+
+                cursor.execute("SELECT 1 FROM points_journal_batches WHERE batch_id = ?", (batch_id,))
+                if cursor.fetchone():
+                    return True  # already applied before a crash
+
+                cursor.executemany('''
+                    UPDATE users
+                    SET points = points + ?, last_active = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', [(points, user_id) for user_id, points in totals.items()])
+
+                cursor.executemany('''
+                    INSERT INTO user_activities (user_id, activity_type, points_earned, description, timestamp)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [(e['user_id'], e['activity_type'], e['points'], e['description'], e['timestamp'])
+                      for e in awards])
+
+                # Level up every 100 points
+                cursor.executemany('''
+                    UPDATE users SET level = MIN(100, points / 100 + 1)
+                    WHERE id = ? AND level < MIN(100, points / 100 + 1)
+                ''', [(user_id,) for user_id in totals])
+
+                cursor.execute(
+                    "INSERT INTO points_journal_batches (batch_id, awards) VALUES (?, ?)",
+                    (batch_id, len(awards))
+                )
+
+                user_ids = list(totals)
+                placeholders = ','.join('?' * len(user_ids))
+                cursor.execute(f'''
+                    SELECT id, points, level, name, total_earnings, subscription_tier
+                    FROM users WHERE id IN ({placeholders})
+                ''', user_ids)
+                rows = cursor.fetchall()
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.error(f"Points batch {batch_id} not applied, will retry: {e}")
+            return False
+
+        for user_id, points, level, name, earnings, tier in rows:
+            leaderboards.record_user(user_id, points, name=name, level=level, earnings=earnings, tier=tier)
+
+        self._stats['flushes'] += 1
+        self._stats['rows_flushed'] += len(awards)
+        return True
@@ -0,0 +1,85 @@
+"""
+Inner Bloom Response Cache
+In-memory TTL + LRU cache for model outputs, keyed by user and day or by a normalized prompt fingerprint
+"""
+
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, punctuation dropped and whitespace collapsed: "Hi  there!" == "hi there" """
+    return _WHITESPACE_RE.sub(' ', _PUNCTUATION_RE.sub(' ', (text or '').lower())).strip()
+
+
+def fingerprint(*parts) -> str:
+    """Stable key for prompts that differ only in case, punctuation or spacing"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(normalize(str(part)).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Bounded map of key -> value; entries expire after ``ttl`` seconds.
+
+    When full, the least recently used entry is evicted. Safe to share
+    between threads. Hit, miss, expiry and eviction counts are kept for
+    ``stats()``.
+    """
+
+    def __init__(self, max_entries=5000, ttl=3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+
+    def get(self, key):
+        """Cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key=None):
+        """Drop one entry, or all of them"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
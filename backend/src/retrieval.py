@@ -0,0 +1,260 @@
+"""
+Inner Bloom Content Retrieval
+Hashed TF-IDF vectors over scraped content with sparse vectorized cosine top-k search
+"""
+
+import os
+import json
+import math
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.db_pool import connection
+from src.trends import tokenize, STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_DIM = int(os.getenv('RETRIEVAL_DIM', 4096))
+REFRESH_INTERVAL = float(os.getenv('RETRIEVAL_REFRESH_SECONDS', 30))
+TITLE_BOOST = 2
+
+
+def term_counts(title, content) -> Counter:
+    """Word and adjacent-word-pair counts; title terms count TITLE_BOOST times"""
+    counts = Counter()
+    for text, weight in ((title, TITLE_BOOST), (content, 1)):
+        previous = None
+        for word in tokenize(text or ''):
+            if len(word) < 3 or word in STOPWORDS:
+                previous = None
+                continue
+            counts[word] += weight
+            if previous:
+                counts[f"{previous} {word}"] += weight
+            previous = word
+    return counts
+
+
+def hashed_vector(counts, dim=RETRIEVAL_DIM):
+    """Sparse (indexes, values) of sublinear term frequencies, signed-hashed into ``dim`` buckets.
+
+    The sign bit keeps colliding terms from only ever adding up, so
+    collisions cancel out on average instead of inflating similarity.
+    """
+    buckets = {}
+    for term, count in counts.items():
+        h = int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), 'little')
+        index = h % dim
+        sign = 1.0 if h >> 63 else -1.0
+        buckets[index] = buckets.get(index, 0.0) + sign * (1.0 + math.log(count))
+    indexes = np.fromiter(buckets.keys(), dtype=np.int64, count=len(buckets))
+    values = np.fromiter(buckets.values(), dtype=np.float32, count=len(buckets))
+    return indexes, values
+
+
+class ContentIndex:
+    """Unit-normalized TF-IDF rows for every ``scraped_content`` row, stored sparse.
+
+    Each document keeps only its non-zero hashed terms, in parallel arrays
+    of row ids, columns and float32 weights, plus its id, url, title and
+    category. Article text is not held in memory: a search fetches the
+    content and keywords of its top k rows after scoring.
+
+    The table's row count and latest ``scraped_at`` are checked at most
+    every ``refresh_interval`` seconds. When they change, only rows scraped
+    since the last build are read and tokenized. The arrays are rebuilt in
+    a background thread and swapped in under the lock, so ``search()``
+    never waits for a rebuild; it answers from the previous build, or
+    returns nothing before the first one finishes.
+    """
+
+    def __init__(self, db_path, dim=RETRIEVAL_DIM, refresh_interval=REFRESH_INTERVAL):
+        self.db_path = db_path
+        self.dim = dim
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._vectors = {}  # id -> (scraped_at, url, title, category, indexes, values)
+        self._fingerprint = None
+        self._scraped_since = None
+        self._next_check = 0.0
+        self._rows = np.zeros(0, dtype=np.int32)
+        self._columns = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._idf = np.ones(dim, dtype=np.float32)
+        self._documents = []
+        self._categories = np.array([], dtype=object)
+
+    def _current_fingerprint(self, cursor):
+        cursor.execute("SELECT COUNT(*), MAX(scraped_at) FROM scraped_content")
+        return cursor.fetchone()
+
+    def refresh(self, force=False, wait=False):
+        """Rebuild the index if scraped_content has changed.
+
+        Runs in a background thread unless ``wait`` is set; a rebuild
+        already in progress is not started twice.
+        """
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        with self._lock:
+            if not force and now < self._next_check:
+                return
+            self._next_check = now + self.refresh_interval
+        if wait:
+            self._update(force, blocking=True)
+        else:
+            threading.Thread(target=self._run_update, args=(force,), name='content-index', daemon=True).start()
+
+    def _run_update(self, force):
+        try:
+            self._update(force, blocking=False)
+        except Exception as e:
+            logger.error(f"Content index refresh failed: {e}")
+
+    def _update(self, force=False, blocking=True):
+        if not self._build_lock.acquire(blocking=blocking):
+            return  # Another thread is already rebuilding
+        try:
+            with connection(self.db_path) as conn:
+                cursor = conn.cursor()
+                fingerprint = self._current_fingerprint(cursor)
+                if not force and fingerprint == self._fingerprint:
+                    return
+                since = None if force else self._scraped_since
+                # Re-scrapes bump scraped_at, so new and changed rows are the
+                # ones at or after the newest timestamp already indexed
+                cursor.execute(f'''
+                    SELECT id, url, title, content, category, scraped_at FROM scraped_content
+                    {"WHERE scraped_at >= ?" if since else ""}
+                ''', (since,) if since else ())
+                changed = cursor.fetchall()
+
+                vectors = {} if force else dict(self._vectors)
+                self._vectorize(vectors, changed)
+
+                if len(vectors) != fingerprint[0]:
+                    # Rows were deleted, or written with an older scraped_at:
+                    # reconcile by id, reading only the rows not indexed yet
+                    cursor.execute("SELECT id FROM scraped_content")
+                    live = {row[0] for row in cursor.fetchall()}
+                    vectors = {doc_id: vector for doc_id, vector in vectors.items() if doc_id in live}
+                    missing = list(live - vectors.keys())
+                    for start in range(0, len(missing), 500):
+                        batch = missing[start:start + 500]
+                        cursor.execute(f'''
+                            SELECT id, url, title, content, category, scraped_at FROM scraped_content
+                            WHERE id IN ({", ".join("?" * len(batch))})
+                        ''', batch)
+                        rows = cursor.fetchall()
+                        self._vectorize(vectors, rows)
+                        changed += rows
+
+            self._build(vectors)
+            self._fingerprint = fingerprint
+            self._scraped_since = fingerprint[1]
+            logger.info(f"Content index rebuilt: {len(vectors)} documents, {len(changed)} read, "
+                        f"{len(self._weights)} non-zero weights")
+        finally:
+            self._build_lock.release()
+
+    def _vectorize(self, vectors, rows):
+        for doc_id, url, title, content, category, scraped_at in rows:
+            cached = vectors.get(doc_id)
+            if cached and cached[0] == scraped_at:
+                continue
+            vectors[doc_id] = (scraped_at, url, title, category) + \
+                hashed_vector(term_counts(title, content), self.dim)
+
+    def _build(self, vectors):
+        """Arrays for ``vectors``, swapped in under the lock when complete"""
+        parts = list(vectors.items())
+        documents = [
+            {'id': doc_id, 'url': url, 'title': title, 'category': category}
+            for doc_id, (_, url, title, category, _, _) in parts
+        ]
+        lengths = np.fromiter((len(part[1][4]) for part in parts), dtype=np.int64, count=len(parts))
+        row_ids = np.repeat(np.arange(len(parts), dtype=np.int32), lengths)
+        columns = np.concatenate([part[1][4] for part in parts]).astype(np.int32) if parts else self._columns[:0]
+        weights = np.concatenate([part[1][5] for part in parts]) if parts else self._weights[:0]
+
+        document_frequency = np.bincount(columns[weights != 0], minlength=self.dim)
+        idf = (np.log((1 + len(parts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        weights = weights * idf[columns]
+        norms = np.sqrt(np.bincount(row_ids, weights=weights.astype(np.float64) ** 2, minlength=len(parts)))
+        weights /= np.maximum(norms[row_ids], 1e-12).astype(np.float32)
+        categories = np.array([doc['category'] for doc in documents], dtype=object)
+
+        with self._lock:
+            self._vectors = vectors
+            self._idf = idf
+            self._rows, self._columns, self._weights = row_ids, columns, weights
+            self._documents = documents
+            self._categories = categories
+
+    def _fetch_text(self, ids) -> Dict:
+        """id -> (content, keywords) for the given rows"""
+        if not ids:
+            return {}
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT id, content, keywords FROM scraped_content WHERE id IN ({', '.join('?' * len(ids))})",
+                ids
+            )
+            return {
+                doc_id: (content, json.loads(keywords) if keywords else [])
+                for doc_id, content, keywords in cursor.fetchall()
+            }
+
+    def search(self, text, limit=5, category=None) -> List[Dict]:
+        """Documents most similar to ``text`` by cosine similarity, best first"""
+        self.refresh()
+        indexes, values = hashed_vector(term_counts(None, text), self.dim)
+        if not len(indexes):
+            return []
+
+        with self._lock:
+            row_ids, columns, weights = self._rows, self._columns, self._weights
+            idf, documents, categories = self._idf, self._documents, self._categories
+        if not len(documents):
+            return []
+
+        query = np.zeros(self.dim, dtype=np.float32)
+        query[indexes] = values
+        query *= idf
+        norm = np.linalg.norm(query)
+        if not norm:
+            return []
+
+        query /= norm
+        scores = np.bincount(row_ids, weights=weights * query[columns], minlength=len(documents))
+        if category:
+            scores = np.where(categories == category, scores, -np.inf)
+
+        k = min(max(1, limit), len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = [i for i in top[np.argsort(-scores[top])] if scores[i] > 0]
+
+        # Rows deleted since the last build are dropped here
+        text = self._fetch_text([documents[i]['id'] for i in top])
+        return [
+            dict(documents[i], content=text[documents[i]['id']][0], keywords=text[documents[i]['id']][1],
+                 score=round(float(scores[i]), 4))
+            for i in top if documents[i]['id'] in text
+        ]
+
+    def stats(self) -> Dict:
+        return {
+            'documents': len(self._documents),
+            'dimensions': self.dim,
+            'nonzero_weights': int(len(self._weights)),
+            'matrix_bytes': int(self._rows.nbytes + self._columns.nbytes + self._weights.nbytes)
+        }
@@ -0,0 +1,371 @@
+"""
+Inner Bloom Risk Rule Engine
+Compiled fraud detection rules evaluated against shared bucketed window counters
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import defaultdict, namedtuple
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from src.lazy import LazySingleton
+from src.response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+RULE_REFRESH_SECONDS = float(os.getenv('RISK_RULE_REFRESH_SECONDS', 30))
+RISK_BUCKET_SECONDS = int(os.getenv('RISK_BUCKET_SECONDS', 10))
+RISK_COUNTER_RETENTION_SECONDS = int(os.getenv('RISK_COUNTER_RETENTION_SECONDS', 86400))
+RISK_EMAIL_DOMAIN_CACHE = int(os.getenv('RISK_EMAIL_DOMAIN_CACHE', 10000))
+EMAIL_DOMAIN_TTL = 3600.0
+SWEEP_EVERY = 4096
+
+# Velocity rule action -> the SecurityEvent.event_type it counts
+VELOCITY_ACTIONS = {
+    'failed_login': 'failed_login',
+    'create_referral': 'referral_created',
+}
+PAYOUT_STREAM = 'payout_amount'
+
+CompiledRule = namedtuple('CompiledRule', ['id', 'name', 'risk_score', 'evaluate'])
+RuleInputs = namedtuple('RuleInputs', ['windows', 'email_domain'])
+
+
+def bucket_start(at, bucket_seconds=RISK_BUCKET_SECONDS):
+    at = int(at)
+    return at - (at % bucket_seconds)
+
+
+class WindowTotals:
+    """One user's counter buckets per stream, read once for an evaluation.
+
+    ``total(stream, window)`` sums the buckets that end inside the window,
+    so the answer is exact to within one bucket width at the old edge.
+    """
+
+    __slots__ = ('bucket_seconds', 'now', 'buckets')
+
+    def __init__(self, rows, now, bucket_seconds=RISK_BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        self.now = now
+        self.buckets = defaultdict(list)  # stream -> [(bucket_start, value)]
+        for stream, start, value in rows:
+            self.buckets[stream].append((start, value))
+
+    def total(self, stream, window_seconds):
+        cutoff = self.now - window_seconds
+        return sum(value for start, value in self.buckets.get(stream, ())
+                   if start + self.bucket_seconds > cutoff)
+
+
+class RuleMetrics:
+    __slots__ = ('evaluations', 'triggers', 'total_ns', 'max_ns')
+
+    def __init__(self):
+        self.evaluations = 0
+        self.triggers = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def to_dict(self):
+        return {
+            'evaluations': self.evaluations,
+            'triggers': self.triggers,
+            'avg_us': round(self.total_ns / self.evaluations / 1000, 3) if self.evaluations else 0.0,
+            'max_us': round(self.max_ns / 1000, 3),
+        }
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        # Model timestamps are naive UTC (datetime.utcnow)
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return value if value is not None else time.time()
+
+
+class RiskRuleEngine:
+    """Active FraudDetectionRules compiled to closures.
+
+    Rules are loaded once and reloaded when their version changes. The
+    version is the row count plus the latest ``updated_at``. Rule writes in
+    this process invalidate the cache immediately through mapper events.
+    Other processes' writes are picked up within ``refresh_interval``.
+
+    Velocity and payout rules read ``risk_counter_buckets``, which every
+    worker adds to through ``observe_event`` / ``observe_payout``. An
+    evaluation reads the user's buckets for the streams it needs in one
+    primary-key range query and sums each rule's window from those rows.
+    The blacklisted email domain rule reads a bounded per-process cache of
+    user email domains. Both lookups run before the engine lock is taken.
+    """
+
+    def __init__(self, refresh_interval=RULE_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._rules = []
+        self._version = None
+        self._next_check = 0.0
+        self._stale = True
+        self._horizons = {}  # stream -> longest window any rule reads from it
+        self._needs_email_domain = False
+        self._metrics = {}
+        self._email_domains = ResponseCache(max_entries=RISK_EMAIL_DOMAIN_CACHE, ttl=EMAIL_DOMAIN_TTL)
+        self._observations = 0
+
+    # Rule cache ---------------------------------------------------------------
+
+    def invalidate(self, *args):
+        """Force a reload on the next evaluation (mapper event hook)"""
+        self._stale = True
+
+    def _rules_version(self):
+        from src.models.security_system import FraudDetectionRule, db
+        return tuple(db.session.query(
+            db.func.count(FraudDetectionRule.id),
+            db.func.max(FraudDetectionRule.updated_at)
+        ).one())
+
+    def _ensure_rules(self):
+        now = time.monotonic()
+        if not self._stale and now < self._next_check:
+            return
+        with self._lock:
+            if not self._stale and now < self._next_check:
+                return
+            version = self._rules_version()
+            if self._stale or version != self._version:
+                self._compile(version)
+            self._stale = False
+            self._next_check = now + self.refresh_interval
+
+    def _compile(self, version):
+        from src.models.security_system import FraudDetectionRule
+
+        rows = FraudDetectionRule.query.filter_by(is_active=True)\
+                                       .order_by(FraudDetectionRule.priority.desc()).all()
+        windows = {}
+        compiled = []
+        needs_email_domain = False
+        for row in rows:
+            rule = self._compile_rule(row, windows)
+            if rule:
+                compiled.append(rule)
+                self._metrics.setdefault(rule.id, RuleMetrics())
+                config = row.rule_config or {}
+                if row.rule_type == 'blacklist' and config.get('blacklist_type') == 'email_domain':
+                    needs_email_domain = True
+
+        self._rules = compiled
+        self._version = version
+        self._horizons = {key: max(values) for key, values in windows.items()}
+        self._needs_email_domain = needs_email_domain
+        logger.info(f"Compiled {len(compiled)} fraud detection rules")
+
+    def _compile_rule(self, row, windows):
+        config = row.rule_config or {}
+        threshold = row.threshold_value or 0
+        window = (row.time_window_minutes or 0) * 60
+
+        if row.rule_type == 'velocity':
+            action = config.get('action')
+            counted = VELOCITY_ACTIONS.get(action)
+            if not counted or not window:
+                return None
+            windows.setdefault(counted, []).append(window)
+
+            def evaluate(user_id, event_type, event_data, profile, inputs):
+                if event_type != action:
+                    return False
+                return inputs.windows.total(counted, window) >= threshold
+
+        elif row.rule_type == 'pattern' and config.get('check_type') == 'payout_velocity':
+            if not window:
+                return None
+            windows.setdefault(PAYOUT_STREAM, []).append(window)
+
+            def evaluate(user_id, event_type, event_data, profile, inputs):
+                return inputs.windows.total(PAYOUT_STREAM, window) >= threshold
+
+        elif row.rule_type == 'anomaly' and config.get('check_type') == 'geolocation':
+            def evaluate(user_id, event_type, event_data, profile, inputs):
+                typical_locations = (profile.typical_locations if profile else None) or []
+                if not typical_locations:
+                    return False  # No baseline to compare
+                country = (event_data.get('geolocation') or {}).get('country')
+                return all(location.get('country') != country for location in typical_locations)
+
+        elif row.rule_type == 'anomaly' and config.get('check_type') == 'device_fingerprint':
+            def evaluate(user_id, event_type, event_data, profile, inputs):
+                typical_devices = (profile.typical_devices if profile else None) or []
+                fingerprint = event_data.get('device_fingerprint')
+                if not typical_devices or not fingerprint:
+                    return False
+                return fingerprint not in typical_devices
+
+        elif row.rule_type == 'blacklist' and config.get('blacklist_type') == 'ip_address':
+            blacklisted_ips = frozenset(config.get('blacklisted_ips', []))
+
+            def evaluate(user_id, event_type, event_data, profile, inputs):
+                return event_data.get('ip_address') in blacklisted_ips
+
+        elif row.rule_type == 'blacklist' and config.get('blacklist_type') == 'email_domain':
+            blacklisted_domains = frozenset(d.lower() for d in config.get('blacklisted_domains', []))
+
+            def evaluate(user_id, event_type, event_data, profile, inputs):
+                return inputs.email_domain in blacklisted_domains
+
+        else:
+            return None
+
+        return CompiledRule(row.id, row.rule_name, row.risk_score or 0, evaluate)
+
+    def _email_domain(self, user_id):
+        # Cached as '' for users without an email so a miss is not repeated
+        domain = self._email_domains.get(user_id)
+        if domain is None:
+            from src.models.user import User
+            user = User.query.get(user_id)
+            email = user.email if user else ''
+            domain = email.split('@')[1].lower() if '@' in email else ''
+            self._email_domains.set(user_id, domain)
+        return domain or None
+
+    # Counters -----------------------------------------------------------------
+
+    def _observe(self, key, user_id, value, at):
+        """Add ``value`` to the user's current bucket in the caller's session"""
+        from sqlalchemy.dialects.sqlite import insert
+        from src.models.security_system import RiskCounterBucket, db
+
+        if not value:
+            return
+        statement = insert(RiskCounterBucket).values(
+            user_id=user_id, stream=key, bucket_start=bucket_start(_timestamp(at)), value=value
+        )
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['user_id', 'stream', 'bucket_start'],
+            set_={'value': RiskCounterBucket.value + statement.excluded.value}
+        ))
+
+        with self._lock:
+            self._observations += 1
+            sweep = self._observations % SWEEP_EVERY == 0
+        if sweep:
+            self.sweep()
+
+    def sweep(self, now=None):
+        """Delete buckets older than every rule window and the retention period"""
+        from src.models.security_system import RiskCounterBucket, db
+
+        retention = max([RISK_COUNTER_RETENTION_SECONDS] + list(self._horizons.values()))
+        cutoff = (now or time.time()) - retention - RISK_BUCKET_SECONDS
+        return RiskCounterBucket.query.filter(RiskCounterBucket.bucket_start < cutoff)\
+                                      .delete(synchronize_session=False)
+
+    def observe_event(self, user_id, event_type, at=None):
+        """Count a SecurityEvent towards velocity windows; committed with the caller's session"""
+        if event_type in VELOCITY_ACTIONS.values():
+            self._observe(event_type, user_id, 1, at)
+
+    def observe_payout(self, user_id, amount, at=None):
+        """Add a committed payout's amount to the user's payout window"""
+        from src.models.security_system import db
+
+        self._observe(PAYOUT_STREAM, user_id, amount or 0, at)
+        db.session.commit()
+
+    def _window_totals(self, user_id, event_type, now):
+        """The user's buckets for the streams this event's rules read, in one query"""
+        from src.models.security_system import RiskCounterBucket
+
+        horizons = self._horizons
+        streams = [key for key in (PAYOUT_STREAM, VELOCITY_ACTIONS.get(event_type)) if key in horizons]
+        if not streams:
+            return WindowTotals((), now)
+        oldest = bucket_start(now - max(horizons[key] for key in streams)) - RISK_BUCKET_SECONDS
+        rows = RiskCounterBucket.query.with_entities(
+            RiskCounterBucket.stream, RiskCounterBucket.bucket_start, RiskCounterBucket.value
+        ).filter(
+            RiskCounterBucket.user_id == user_id,
+            RiskCounterBucket.stream.in_(streams),
+            RiskCounterBucket.bucket_start >= oldest
+        ).all()
+        return WindowTotals(rows, now)
+
+    # Evaluation ---------------------------------------------------------------
+
+    def evaluate(self, user_id, event_type, event_data, profile=None) -> Tuple[int, List[CompiledRule]]:
+        """Run every active rule; returns (total risk score, triggered rules)"""
+        self._ensure_rules()
+        event_data = event_data or {}
+        now = time.time()
+        total = 0
+        triggered = []
+
+        # Database reads happen here, without holding the lock
+        inputs = RuleInputs(
+            self._window_totals(user_id, event_type, now),
+            self._email_domain(user_id) if self._needs_email_domain else None
+        )
+
+        with self._lock:
+            rules = self._rules
+        for rule in rules:
+            started = time.perf_counter_ns()
+            fired = rule.evaluate(user_id, event_type, event_data, profile, inputs)
+            elapsed = time.perf_counter_ns() - started
+
+            with self._lock:
+                metrics = self._metrics[rule.id]
+                metrics.evaluations += 1
+                metrics.total_ns += elapsed
+                if elapsed > metrics.max_ns:
+                    metrics.max_ns = elapsed
+                if fired:
+                    metrics.triggers += 1
+            if fired:
+                total += rule.risk_score
+                triggered.append(rule)
+
+        return total, triggered
+
+    def metrics(self) -> Dict:
+        """Per-rule evaluation counts, triggers and latency"""
+        from src.models.security_system import RiskCounterBucket, db
+
+        tracked = dict(db.session.query(
+            RiskCounterBucket.stream, db.func.count(db.distinct(RiskCounterBucket.user_id))
+        ).group_by(RiskCounterBucket.stream).all())
+        with self._lock:
+            return {
+                'rules_version': [str(part) for part in self._version] if self._version else None,
+                'rules': [
+                    dict(self._metrics[rule.id].to_dict(), id=rule.id, name=rule.name)
+                    for rule in self._rules
+                ],
+                'windows': dict(self._horizons),
+                'tracked_users': {key: tracked.get(key, 0) for key in self._horizons},
+                'email_domain_cache': self._email_domains.stats(),
+            }
+
+
+def _register_invalidation(engine):
+    from sqlalchemy import event
+    from src.models.security_system import FraudDetectionRule
+
+    for name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(FraudDetectionRule, name, engine.invalidate)
+    return engine
+
+
+def _build_engine():
+    return _register_invalidation(RiskRuleEngine())
+
+
+# Shared instance, compiled on first evaluation
+risk_engine = LazySingleton(_build_engine)
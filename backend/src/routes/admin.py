@@ -11,6 +11,7 @@ from src.models.user import User
 from src.models.affiliate_tracking import (
     ReferralTracking, UserEarnings, PayoutRequest, ViralContentTracking
 )
+from src.fraud_analysis import fraud_report
 from datetime import datetime, timedelta
 import json
 
@@ -310,6 +311,31 @@ def get_fraud_detection():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/admin/fraud-detection/scan', methods=['POST'])
+@cross_origin()
+def run_fraud_scan():
+    """Score the whole user base for multi-account fraud"""
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        limit = data.get('limit')
+        if limit is not None:
+            try:
+                if isinstance(limit, bool):
+                    raise TypeError
+                limit = max(0, int(limit))
+            except (TypeError, ValueError):
+                return jsonify({'error': 'limit must be an integer'}), 400
+        
+        report = fraud_report(record=data.get('record', False))
+        if limit is not None:
+            report['results'] = report['results'][:limit]
+        
+        return jsonify(report), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @admin_bp.route('/admin/users/<int:user_id>/fraud-check', methods=['POST'])
 @cross_origin()
 def run_fraud_check(user_id):
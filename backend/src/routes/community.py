@@ -1,9 +1,14 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from flask_cors import cross_origin
 from src.models.community import (
     SisterhoodCircle, CircleMembership, CommunityPost, PostComment, 
     VirtualHug, UserAchievement, UserEngagement, ShareableContent, db
 )
+from src.leaderboard import leaderboards
+from src.pagination import (
+    InvalidCursor, encode_cursor, decode_cursor, ndjson_lines,
+    MAX_STREAM_ITEMS, STREAM_BATCH_SIZE, clamp_limit
+)
 import json
 from datetime import datetime
 
@@ -83,13 +88,8 @@ def join_circle(circle_id):
     
     return jsonify(membership.to_dict()), 201
 
-@community_bp.route('/posts', methods=['GET'])
-@cross_origin()
-def get_posts():
-    """Get community posts"""
-    circle_id = request.args.get('circle_id', type=int)
-    limit = request.args.get('limit', 20, type=int)
-    
+def _posts_page(circle_id, limit, cursor=None):
+    """One keyset page of posts for a circle (or public posts), newest first"""
     query = CommunityPost.query
     if circle_id:
         query = query.filter_by(circle_id=circle_id)
@@ -97,8 +97,62 @@ def get_posts():
         # Public posts only
         query = query.filter_by(circle_id=None)
     
-    posts = query.order_by(CommunityPost.created_at.desc()).limit(limit).all()
-    return jsonify([post.to_dict() for post in posts])
+    if cursor:
+        created_at, post_id = decode_cursor(cursor)
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except (TypeError, ValueError) as e:
+            raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+        query = query.filter(db.or_(
+            CommunityPost.created_at < created_at,
+            db.and_(CommunityPost.created_at == created_at, CommunityPost.id < post_id)
+        ))
+    
+    return query.order_by(CommunityPost.created_at.desc(), CommunityPost.id.desc()).limit(limit).all()
+
+@community_bp.route('/posts', methods=['GET'])
+@cross_origin()
+def get_posts():
+    """Get community posts (next page cursor in the X-Next-Cursor header)"""
+    circle_id = request.args.get('circle_id', type=int)
+    limit = clamp_limit(request.args.get('limit', 20, type=int))
+    
+    try:
+        posts = _posts_page(circle_id, limit, request.args.get('cursor'))
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = jsonify([post.to_dict() for post in posts])
+    if len(posts) == limit:
+        response.headers['X-Next-Cursor'] = encode_cursor(posts[-1].created_at, posts[-1].id)
+    return response
+
+@community_bp.route('/posts/stream', methods=['GET'])
+@cross_origin()
+def stream_posts():
+    """Stream community posts as NDJSON, one post per line with its resume cursor"""
+    circle_id = request.args.get('circle_id', type=int)
+    limit = clamp_limit(request.args.get('limit', MAX_STREAM_ITEMS, type=int), MAX_STREAM_ITEMS)
+    cursor = request.args.get('cursor')
+    
+    try:
+        first_batch = _posts_page(circle_id, min(STREAM_BATCH_SIZE, limit), cursor)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def generate(batch, cursor):
+        sent = 0
+        while batch:
+            for post in batch:
+                cursor = encode_cursor(post.created_at, post.id)
+                yield dict(post.to_dict(), cursor=cursor)
+            sent += len(batch)
+            if sent >= limit or len(batch) < STREAM_BATCH_SIZE:
+                return
+            batch = _posts_page(circle_id, min(STREAM_BATCH_SIZE, limit - sent), cursor)
+    
+    return Response(stream_with_context(ndjson_lines(generate(first_batch, cursor))),
+                    mimetype='application/x-ndjson')
 
 @community_bp.route('/posts', methods=['POST'])
 @cross_origin()
@@ -123,6 +177,7 @@ def create_post():
         engagement.posts_created += 1
         engagement.total_points += 10  # Points for creating a post
         db.session.commit()
+        leaderboards.record_engagement(engagement)
     
     return jsonify(post.to_dict()), 201
 
@@ -160,6 +215,8 @@ def create_comment(post_id):
         engagement.total_points += 5  # Points for commenting
     
     db.session.commit()
+    if engagement:
+        leaderboards.record_engagement(engagement)
     
     return jsonify(comment.to_dict()), 201
 
@@ -177,6 +234,7 @@ def send_virtual_hug():
     db.session.add(hug)
     
     # Update engagement metrics
+    sender_engagement = None
     if data.get('sender_id'):
         sender_engagement = UserEngagement.query.filter_by(user_id=data['sender_id']).first()
         if sender_engagement:
@@ -189,6 +247,8 @@ def send_virtual_hug():
             recipient_engagement.total_hugs_received += 1
     
     db.session.commit()
+    if sender_engagement:
+        leaderboards.record_engagement(sender_engagement)
     
     return jsonify(hug.to_dict()), 201
 
@@ -209,6 +269,7 @@ def get_user_engagement(user_id):
         engagement = UserEngagement(user_id=user_id)
         db.session.add(engagement)
         db.session.commit()
+        leaderboards.record_engagement(engagement)
     
     return jsonify(engagement.to_dict())
 
@@ -245,6 +306,8 @@ def award_achievement():
             engagement.level = new_level
     
     db.session.commit()
+    if engagement:
+        leaderboards.record_engagement(engagement)
     
     return jsonify(achievement.to_dict()), 201
 
@@ -299,19 +362,44 @@ def get_leaderboard():
     limit = request.args.get('limit', 10, type=int)
     
     if leaderboard_type == 'points':
-        top_users = UserEngagement.query.order_by(UserEngagement.total_points.desc()).limit(limit).all()
+        top_users = leaderboards.board('engagement_points').top(limit)
         return jsonify([{
-            'user_id': user.user_id,
-            'total_points': user.total_points,
-            'level': user.level
-        } for user in top_users])
+            'user_id': entry['member'],
+            'total_points': entry['score'],
+            'level': entry.get('level'),
+            'rank': entry['rank']
+        } for entry in top_users])
     
     elif leaderboard_type == 'hugs':
-        top_huggers = UserEngagement.query.order_by(UserEngagement.total_hugs_sent.desc()).limit(limit).all()
+        top_huggers = leaderboards.board('hugs').top(limit)
         return jsonify([{
-            'user_id': user.user_id,
-            'total_hugs_sent': user.total_hugs_sent
-        } for user in top_huggers])
+            'user_id': entry['member'],
+            'total_hugs_sent': entry['score'],
+            'rank': entry['rank']
+        } for entry in top_huggers])
     
     return jsonify({'error': 'Invalid leaderboard type'}), 400
 
+@community_bp.route('/leaderboard/<int:user_id>/rank', methods=['GET'])
+@cross_origin()
+def get_leaderboard_rank(user_id):
+    """Get a user's rank on the community leaderboard"""
+    leaderboard_type = request.args.get('type', 'points')
+    board_name = {'points': 'engagement_points', 'hugs': 'hugs'}.get(leaderboard_type)
+    if not board_name:
+        return jsonify({'error': 'Invalid leaderboard type'}), 400
+    
+    board = leaderboards.board(board_name)
+    if board.rank(user_id) is None:
+        engagement = UserEngagement.query.filter_by(user_id=user_id).first()
+        if not engagement:
+            return jsonify({'error': 'No engagement record for user'}), 404
+        leaderboards.record_engagement(engagement)
+    
+    return jsonify({
+        'user_id': user_id,
+        'type': leaderboard_type,
+        'rank': board.rank(user_id),
+        'score': board.score(user_id),
+        'total_ranked': len(board)
+    })
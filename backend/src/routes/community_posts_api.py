@@ -2,7 +2,7 @@
 Inner Bloom Community Posts API Routes
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 import sys
 import os
 
@@ -10,24 +10,58 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from src.models.community_posts import community_db
+from src.pagination import InvalidCursor, ndjson_lines, clamp_limit, MAX_STREAM_ITEMS
 
 community_posts_bp = Blueprint("community_posts", __name__)
 
 @community_posts_bp.route("/posts", methods=["GET"])
 def get_posts():
-    """Get community posts"""
+    """Get community posts (pass ?cursor= from next_cursor for the next page)"""
     try:
-        limit = request.args.get("limit", 20, type=int)
-        offset = request.args.get("offset", 0, type=int)
+        limit = clamp_limit(request.args.get("limit", 20, type=int))
+        offset = request.args.get("offset", type=int)
+        cursor = request.args.get("cursor")
         
-        posts = community_db.get_posts(limit, offset)
+        if offset is not None and not cursor:
+            # Legacy offset paging
+            posts = community_db.get_posts(limit, offset)
+            next_cursor = None
+        else:
+            page = community_db.get_posts_page(limit, cursor)
+            posts, next_cursor = page["posts"], page["next_cursor"]
         
         return jsonify({
             "success": True,
             "posts": posts,
-            "total": len(posts)
+            "total": len(posts),
+            "next_cursor": next_cursor
         })
     
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@community_posts_bp.route("/posts/stream", methods=["GET"])
+def stream_posts():
+    """Stream posts newest first as NDJSON, one post per line with its resume cursor"""
+    try:
+        limit = clamp_limit(request.args.get("limit", MAX_STREAM_ITEMS, type=int), MAX_STREAM_ITEMS)
+        cursor = request.args.get("cursor")
+        
+        posts = community_db.iter_posts(cursor, max_posts=limit)
+        first = next(posts, None)  # surfaces a bad cursor as a 400 before streaming starts
+        if first is None:
+            return Response("", mimetype="application/x-ndjson")
+        
+        def generate():
+            yield from ndjson_lines([first])
+            yield from ndjson_lines(posts)
+        
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1,10 +1,11 @@
 from flask import Blueprint, jsonify, request
 import os
-import sqlite3
 import logging
 import requests
 import json
 
+from src.db_pool import connection
+
 logger = logging.getLogger(__name__)
 
 initiation_bp = Blueprint("initiation", __name__)
@@ -15,19 +16,16 @@ OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
 
 def save_bloom_name(user_id, bloom_name, backstory):
     """Store Bloom Name and backstory in the user's record"""
-    conn = sqlite3.connect("inner_bloom.db")
-    cursor = conn.cursor()
-    try:
-        cursor.execute("UPDATE users SET bloom_name = ?, bloom_backstory = ? WHERE id = ?",
-                       (bloom_name, backstory, user_id))
-        conn.commit()
-        logger.info(f"Bloom name saved for user_id {user_id}")
-        return True
-    except Exception as e:
-        logger.error(f"Error saving bloom name for user_id {user_id}: {e}")
-        return False
-    finally:
-        conn.close()
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("UPDATE users SET bloom_name = ?, bloom_backstory = ? WHERE id = ?",
+                           (bloom_name, backstory, user_id))
+            logger.info(f"Bloom name saved for user_id {user_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error saving bloom name for user_id {user_id}: {e}")
+            return False
 
 @initiation_bp.route("/initiation", methods=["POST"])
 def handle_initiation():
@@ -5,6 +5,7 @@ Provides endpoints for newsletter management and subscriber interactions
 
 from flask import Blueprint, jsonify, request
 from ..newsletter_system import newsletter, start_newsletter_scheduler
+from ..db_pool import connection
 import logging
 
 logger = logging.getLogger(__name__)
@@ -57,30 +58,34 @@ def get_newsletter_stats():
 
 @newsletter_bp.route('/newsletter/send-daily', methods=['POST'])
 def send_daily_inspiration():
-    """Manually trigger daily inspiration email"""
+    """Manually trigger daily inspiration email; sends in the background"""
     try:
-        sent_count = newsletter.send_daily_inspiration()
+        campaign_id = newsletter.queue_daily_inspiration()
+        newsletter.start_campaign(campaign_id)
         
         return jsonify({
-            'message': 'Daily inspiration emails sent successfully',
-            'recipients': sent_count,
+            'message': 'Daily inspiration emails queued',
+            'campaign_id': campaign_id,
+            'progress': newsletter.campaign_progress(campaign_id),
             'type': 'daily_inspiration'
-        })
+        }), 202
     except Exception as e:
         logger.error(f"Error sending daily inspiration: {e}")
         return jsonify({'error': str(e)}), 500
 
 @newsletter_bp.route('/newsletter/send-community', methods=['POST'])
 def send_community_highlight():
-    """Manually trigger community highlight email"""
+    """Manually trigger community highlight email; sends in the background"""
     try:
-        sent_count = newsletter.send_community_highlight()
+        campaign_id = newsletter.queue_community_highlight()
+        newsletter.start_campaign(campaign_id)
         
         return jsonify({
-            'message': 'Community highlight emails sent successfully',
-            'recipients': sent_count,
+            'message': 'Community highlight emails queued',
+            'campaign_id': campaign_id,
+            'progress': newsletter.campaign_progress(campaign_id),
             'type': 'community_highlight'
-        })
+        }), 202
     except Exception as e:
         logger.error(f"Error sending community highlight: {e}")
         return jsonify({'error': str(e)}), 500
@@ -115,13 +120,11 @@ def send_earnings_update():
 def get_email_templates():
     """Get available email templates"""
     try:
-        import sqlite3
-        conn = sqlite3.connect(newsletter.db_path)
-        cursor = conn.cursor()
+        with connection(newsletter.db_path) as conn:
+            cursor = conn.cursor()
         
-        cursor.execute('SELECT name, subject_template, category FROM email_templates')
-        templates = cursor.fetchall()
-        conn.close()
+            cursor.execute('SELECT name, subject_template, category FROM email_templates')
+            templates = cursor.fetchall()
         
         template_list = [{
             'name': t[0],
@@ -141,20 +144,19 @@ def get_email_templates():
 def get_campaigns():
     """Get newsletter campaign history"""
     try:
-        import sqlite3
-        conn = sqlite3.connect(newsletter.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT name, subject, status, sent_date, recipient_count, open_count, click_count
-            FROM newsletter_campaigns 
-            ORDER BY created_at DESC 
-            LIMIT 20
-        ''')
-        campaigns = cursor.fetchall()
-        conn.close()
+        with connection(newsletter.db_path) as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute('''
+                SELECT name, subject, status, sent_date, recipient_count, open_count, click_count, id
+                FROM newsletter_campaigns 
+                ORDER BY created_at DESC 
+                LIMIT 20
+            ''')
+            campaigns = cursor.fetchall()
         
         campaign_list = [{
+            'id': c[7],
             'name': c[0],
             'subject': c[1],
             'status': c[2],
@@ -173,6 +175,19 @@ def get_campaigns():
         logger.error(f"Error getting campaigns: {e}")
         return jsonify({'error': str(e)}), 500
 
+@newsletter_bp.route('/newsletter/campaigns/<int:campaign_id>/progress', methods=['GET'])
+def get_campaign_progress(campaign_id):
+    """Sent/failed/pending counts, throughput and ETA for a queued campaign"""
+    try:
+        progress = newsletter.campaign_progress(campaign_id)
+        if progress is None:
+            return jsonify({'error': 'Campaign not found'}), 404
+        
+        return jsonify(progress)
+    except Exception as e:
+        logger.error(f"Error getting campaign progress: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @newsletter_bp.route('/newsletter/subscribers', methods=['GET'])
 def get_subscribers():
     """Get subscriber list with pagination"""
@@ -183,23 +198,20 @@ def get_subscribers():
         
         offset = (page - 1) * limit
         
-        import sqlite3
-        conn = sqlite3.connect(newsletter.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT email, name, subscription_date, engagement_score, last_opened
-            FROM newsletter_subscribers 
-            WHERE status = ?
-            ORDER BY subscription_date DESC 
-            LIMIT ? OFFSET ?
-        ''', (status, limit, offset))
-        subscribers = cursor.fetchall()
+        with connection(newsletter.db_path) as conn:
+            cursor = conn.cursor()
         
-        cursor.execute('SELECT COUNT(*) FROM newsletter_subscribers WHERE status = ?', (status,))
-        total_count = cursor.fetchone()[0]
+            cursor.execute('''
+                SELECT email, name, subscription_date, engagement_score, last_opened
+                FROM newsletter_subscribers 
+                WHERE status = ?
+                ORDER BY subscription_date DESC 
+                LIMIT ? OFFSET ?
+            ''', (status, limit, offset))
+            subscribers = cursor.fetchall()
         
-        conn.close()
+            cursor.execute('SELECT COUNT(*) FROM newsletter_subscribers WHERE status = ?', (status,))
+            total_count = cursor.fetchone()[0]
         
         subscriber_list = [{
             'email': s[0],
@@ -277,7 +289,8 @@ def start_scheduler():
             'message': 'Newsletter scheduler started successfully',
             'scheduled_tasks': [
                 'Daily inspiration at 8:00 AM',
-                'Weekly community highlight on Sundays at 10:00 AM'
+                'Weekly community highlight on Sundays at 10:00 AM',
+                'Resume interrupted campaigns every 10 minutes'
             ]
         })
     except Exception as e:
@@ -288,26 +301,22 @@ def start_scheduler():
 def unsubscribe(token):
     """Unsubscribe user using token"""
     try:
-        import sqlite3
-        conn = sqlite3.connect(newsletter.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE newsletter_subscribers 
-            SET status = 'unsubscribed' 
-            WHERE unsubscribe_token = ?
-        ''', (token,))
-        
-        if cursor.rowcount > 0:
-            conn.commit()
-            conn.close()
-            return jsonify({
-                'message': 'Successfully unsubscribed from Inner Bloom newsletter',
-                'status': 'unsubscribed'
-            })
-        else:
-            conn.close()
-            return jsonify({'error': 'Invalid unsubscribe token'}), 400
+        with connection(newsletter.db_path) as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute('''
+                UPDATE newsletter_subscribers 
+                SET status = 'unsubscribed' 
+                WHERE unsubscribe_token = ?
+            ''', (token,))
+        
+            if cursor.rowcount > 0:
+                return jsonify({
+                    'message': 'Successfully unsubscribed from Inner Bloom newsletter',
+                    'status': 'unsubscribed'
+                })
+            else:
+                return jsonify({'error': 'Invalid unsubscribe token'}), 400
             
     except Exception as e:
         logger.error(f"Error unsubscribing: {e}")
@@ -321,41 +330,8 @@ def track_engagement(email):
         action = data.get('action', 'open')  # 'open' or 'click'
         campaign_id = data.get('campaign_id')
         
-        import sqlite3
-        conn = sqlite3.connect(newsletter.db_path)
-        cursor = conn.cursor()
-        
-        # Log engagement
-        cursor.execute('''
-            INSERT INTO email_analytics 
-            (campaign_id, subscriber_email, action, ip_address, user_agent)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (campaign_id, email, action, request.remote_addr, request.headers.get('User-Agent')))
-        
-        # Update subscriber engagement score
-        cursor.execute('''
-            UPDATE newsletter_subscribers 
-            SET engagement_score = engagement_score + 1,
-                last_opened = CURRENT_TIMESTAMP
-            WHERE email = ?
-        ''', (email,))
-        
-        # Update campaign stats
-        if action == 'open':
-            cursor.execute('''
-                UPDATE newsletter_campaigns 
-                SET open_count = open_count + 1 
-                WHERE id = ?
-            ''', (campaign_id,))
-        elif action == 'click':
-            cursor.execute('''
-                UPDATE newsletter_campaigns 
-                SET click_count = click_count + 1 
-                WHERE id = ?
-            ''', (campaign_id,))
-        
-        conn.commit()
-        conn.close()
+        newsletter.record_engagement(email, campaign_id, action,
+                                     request.remote_addr, request.headers.get('User-Agent'))
         
         return jsonify({
             'message': 'Engagement tracked successfully',
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify, send_file, stream_with_context
 import os
 import sys
 import json
@@ -11,6 +11,8 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 # Import our real functionality
 from src.ai_companion import bloom_ai
 from src.real_database import real_db
+from src.db_pool import pool_stats
+from src.points_writer import as_points
 # from src.pdf_generator import PDFGenerator # Temporarily commented out
 
 real_api_bp = Blueprint("real_api", __name__)
@@ -23,7 +25,8 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "message": "Inner Bloom Real API is running"
+        "message": "Inner Bloom Real API is running",
+        "db_pool": pool_stats()
     })
 
 # Real AI Companion endpoint
@@ -50,6 +53,43 @@ def ai_chat():
         print(f"AI Chat Error: {e}")
         return jsonify({"error": str(e)}), 500
 
+# Streaming AI chat endpoint: server-sent "token" events, then "done" with the full reply
+@real_api_bp.route("/ai/chat/stream", methods=["POST"])
+def ai_chat_stream():
+    data = request.get_json() or {}
+    user_id = data.get("user_id", "demo_user")
+    message = data.get("message", "")
+    user_name = data.get("user_name", "Beautiful")
+    
+    if not message:
+        return jsonify({"error": "Message is required"}), 400
+    
+    def events():
+        try:
+            for event, payload in bloom_ai.stream_response(user_id, message, user_name):
+                if event == "done":
+                    real_db.add_points(user_id, 5, "ai_chat", "Chatted with Bloom AI")
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        except Exception as e:
+            print(f"AI Chat Stream Error: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+    
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # let nginx pass tokens through unbuffered
+    })
+
+# Time-to-first-token for recent streamed chats, AI API retry/circuit counters and cache hit rates
+@real_api_bp.route("/ai/chat/metrics", methods=["GET"])
+def ai_chat_metrics():
+    try:
+        metrics = bloom_ai.streaming_metrics()
+        metrics['client'] = bloom_ai.client.stats()
+        metrics['cache'] = bloom_ai.cache_stats()
+        return jsonify(metrics)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Daily affirmation endpoint
 @real_api_bp.route("/ai/affirmation", methods=["GET"])
 def daily_affirmation():
@@ -98,7 +138,10 @@ def platform_stats():
 def add_points(user_id):
     try:
         data = request.get_json()
-        points = data.get("points", 0)
+        try:
+            points = as_points(data.get("points", 0))
+        except (TypeError, ValueError):
+            return jsonify({"error": "points must be an integer"}), 400
         activity = data.get("activity", "unknown")
         description = data.get("description", "Points earned")
         
@@ -122,6 +165,19 @@ def leaderboard():
         print(f"Leaderboard Error: {e}")
         return jsonify({"error": str(e)}), 500
 
+# Leaderboard rank lookup
+@real_api_bp.route("/leaderboard/rank/<user_id>", methods=["GET"])
+def leaderboard_rank(user_id):
+    try:
+        rank = real_db.get_user_rank(user_id)
+        if not rank:
+            return jsonify({"error": "User not found"}), 404
+        return jsonify(rank)
+
+    except Exception as e:
+        print(f"Leaderboard Rank Error: {e}")
+        return jsonify({"error": str(e)}), 500
+
 # PDF Download endpoints (Temporarily commented out)
 # @real_api_bp.route("/download/parenting-guide", methods=["POST"])
 # def download_parenting_guide():
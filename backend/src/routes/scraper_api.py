@@ -5,6 +5,7 @@ Provides endpoints for managing and accessing scraped content
 
 from flask import Blueprint, jsonify, request
 from ..web_scraper import scraper, setup_default_targets
+from ..db_pool import connection
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,20 +17,17 @@ def scraper_status():
     """Get scraper status and statistics"""
     try:
         # Get content count by category
-        import sqlite3
-        conn = sqlite3.connect(scraper.db_path)
-        cursor = conn.cursor()
+        with connection(scraper.db_path) as conn:
+            cursor = conn.cursor()
         
-        cursor.execute('SELECT COUNT(*) FROM scraped_content')
-        total_content = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM scraped_content')
+            total_content = cursor.fetchone()[0]
         
-        cursor.execute('SELECT category, COUNT(*) FROM scraped_content GROUP BY category')
-        category_counts = dict(cursor.fetchall())
+            cursor.execute('SELECT category, COUNT(*) FROM scraped_content GROUP BY category')
+            category_counts = dict(cursor.fetchall())
         
-        cursor.execute('SELECT COUNT(*) FROM scraping_targets WHERE active = 1')
-        active_targets = cursor.fetchone()[0]
-        
-        conn.close()
+            cursor.execute('SELECT COUNT(*) FROM scraping_targets WHERE active = 1')
+            active_targets = cursor.fetchone()[0]
         
         return jsonify({
             'status': 'active',
@@ -66,8 +64,9 @@ def get_scraped_content():
     try:
         category = request.args.get('category')
         limit = int(request.args.get('limit', 5))
+        query = request.args.get('q')
         
-        content = scraper.get_content_for_ai(category, limit)
+        content = scraper.get_content_for_ai(category, limit, query)
         
         return jsonify({
             'content': content,
@@ -125,17 +124,40 @@ def add_scraping_target():
 
 @scraper_bp.route('/scraper/scrape-now', methods=['POST'])
 def scrape_now():
-    """Trigger immediate scraping of all targets"""
+    """Start scraping all targets in the background"""
     try:
-        results = scraper.scrape_all_targets()
+        job = scraper.start_scrape_job()
         
         return jsonify({
-            'message': 'Scraping completed',
-            'scraped_count': len(results),
-            'results': results[:5]  # Return first 5 results as preview
-        })
+            'message': 'Scraping started',
+            'job': job.to_dict()
+        }), 202
+    except Exception as e:
+        logger.error(f"Error starting scrape: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@scraper_bp.route('/scraper/jobs', methods=['GET'])
+def list_scrape_jobs():
+    """Recent scrape jobs, most recent first"""
+    try:
+        jobs = [job.to_dict() for job in scraper.crawler.jobs()]
+        
+        return jsonify({'jobs': jobs, 'count': len(jobs)})
+    except Exception as e:
+        logger.error(f"Error listing scrape jobs: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@scraper_bp.route('/scraper/jobs/<job_id>', methods=['GET'])
+def get_scrape_job(job_id):
+    """Progress of a scrape job"""
+    try:
+        job = scraper.crawler.job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify(job.to_dict())
     except Exception as e:
-        logger.error(f"Error during scraping: {e}")
+        logger.error(f"Error getting scrape job: {e}")
         return jsonify({'error': str(e)}), 500
 
 @scraper_bp.route('/scraper/setup-defaults', methods=['POST'])
@@ -179,8 +201,9 @@ def get_ai_content():
     try:
         category = request.args.get('category', 'empowerment')
         limit = int(request.args.get('limit', 3))
+        query = request.args.get('q')
         
-        content = scraper.get_content_for_ai(category, limit)
+        content = scraper.get_content_for_ai(category, limit, query)
         
         # Format for AI companion
         ai_formatted = []
@@ -0,0 +1,41 @@
+"""
+Inner Bloom Search API Routes
+Full-text search across scraped content, community posts and marketplace products
+"""
+
+from flask import Blueprint, jsonify, request
+from src.search import search, SOURCES, DEFAULT_LIMIT, MAX_LIMIT
+from src.pagination import clamp_limit
+import logging
+
+logger = logging.getLogger(__name__)
+
+search_bp = Blueprint('search', __name__)
+
+@search_bp.route('/search', methods=['GET'])
+def search_all():
+    """BM25-ranked search; ?q=<text>&source=<name>[,<name>]&category=&limit=&offset="""
+    try:
+        text = request.args.get('q', '').strip()
+        if not text:
+            return jsonify({'error': 'Query parameter q is required'}), 400
+        
+        sources = [name for value in request.args.getlist('source') for name in value.split(',') if name]
+        unknown = [name for name in sources if name not in SOURCES]
+        if unknown:
+            return jsonify({
+                'error': f"Unknown source: {', '.join(unknown)}",
+                'sources': sorted(SOURCES)
+            }), 400
+        
+        results = search(
+            text,
+            sources=sources or None,
+            category=request.args.get('category'),
+            limit=clamp_limit(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT),
+            offset=max(0, request.args.get('offset', 0, type=int))
+        )
+        return jsonify(results)
+    except Exception as e:
+        logger.error(f"Error searching: {e}")
+        return jsonify({'error': str(e)}), 500
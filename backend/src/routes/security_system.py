@@ -8,6 +8,7 @@ from src.models.security_system import (
     verify_digital_id, get_user_theme, set_user_theme, db
 )
 from src.models.user import User
+from src.risk_engine import risk_engine
 from datetime import datetime, timedelta
 import json
 import secrets
@@ -159,6 +160,16 @@ def assess_risk():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@security_system_bp.route('/security/rules/metrics', methods=['GET'])
+@cross_origin()
+def get_rule_metrics():
+    """Per-rule evaluation counts and latency from the in-memory risk engine"""
+    try:
+        return jsonify(risk_engine.metrics()), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Digital ID Verification Routes
 @security_system_bp.route('/security/id-verification', methods=['POST'])
 @cross_origin()
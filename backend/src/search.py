@@ -0,0 +1,246 @@
+"""
+Inner Bloom Search
+SQLite FTS5 index over scraped content, community posts and marketplace products
+"""
+
+import re
+import html
+import time
+import logging
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+from src.db_pool import connection
+from src.migrations import table_exists
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+SNIPPET_TOKENS = 24
+TITLE_WEIGHT = 5.0
+BODY_WEIGHT = 1.0
+# FTS5 wraps matches in these control characters; the text is HTML-escaped
+# before they become <mark> tags, so indexed user text never reaches a client as markup
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+# One indexed table. ``condition`` limits which rows are searchable (private
+# circle posts and inactive products are not); ``columns`` are the SQL watched
+# by the update trigger, so counter updates do not reindex the row.
+SearchSource = namedtuple('SearchSource', ['name', 'table', 'title', 'body', 'category', 'condition', 'columns'])
+
+SOURCES = {
+    source.name: source for source in (
+        SearchSource('content', 'scraped_content', "coalesce({r}.title, '')", "coalesce({r}.content, '')",
+                     '{r}.category', None, ('title', 'content', 'category')),
+        SearchSource('posts', 'community_posts', "''", '{r}.content',
+                     'NULL', None, ('content',)),
+        SearchSource('circle_posts', 'community_post', "coalesce({r}.title, '')", '{r}.content',
+                     '{r}.post_type', '{r}.circle_id IS NULL', ('title', 'content', 'post_type', 'circle_id')),
+        SearchSource('products', 'products', '{r}.title', "coalesce({r}.description, '')",
+                     '{r}.category', "{r}.status = 'active'", ('title', 'description', 'category', 'status')),
+    )
+}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _create_index(cursor):
+    # search_documents maps an FTS rowid to its source row, so triggers can
+    # find a document by primary key instead of scanning the FTS table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS search_documents (
+            rowid INTEGER PRIMARY KEY,
+            source TEXT NOT NULL,
+            source_id TEXT NOT NULL,
+            category TEXT,
+            UNIQUE (source, source_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            title, body, tokenize = 'porter unicode61 remove_diacritics 2'
+        )
+    ''')
+
+
+def _expr(template, ref):
+    return template.format(r=ref)
+
+
+def _insert_sql(source, ref):
+    """Statements that index row ``ref`` (NEW in a trigger, the table itself in a rebuild)"""
+    where = f"WHERE {_expr(source.condition, ref)}" if source.condition else ""
+    from_clause = "" if ref == 'NEW' else f"FROM {source.table}"
+    return [
+        f"""INSERT INTO search_documents (source, source_id, category)
+            SELECT '{source.name}', CAST({ref}.id AS TEXT), {_expr(source.category, ref)} {from_clause} {where}""",
+        f"""INSERT INTO search_index (rowid, title, body)
+            SELECT d.rowid, {_expr(source.title, ref)}, {_expr(source.body, ref)}
+            FROM {'' if ref == 'NEW' else f'{source.table}, '}search_documents d
+            WHERE d.source = '{source.name}' AND d.source_id = CAST({ref}.id AS TEXT)
+            {f'AND {_expr(source.condition, ref)}' if source.condition else ''}""",
+    ]
+
+
+def _delete_sql(source, ref):
+    return [
+        f"""DELETE FROM search_index WHERE rowid = (
+                SELECT rowid FROM search_documents
+                WHERE source = '{source.name}' AND source_id = CAST({ref}.id AS TEXT))""",
+        f"""DELETE FROM search_documents
+            WHERE source = '{source.name}' AND source_id = CAST({ref}.id AS TEXT)""",
+    ]
+
+
+def install(db_path=None) -> List[str]:
+    """Create the index and the sync triggers for every source table that exists.
+
+    Idempotent; run by ``manage migrate``. Returns the sources whose
+    triggers were installed.
+    """
+    installed = []
+    with connection(db_path) as conn:
+        cursor = conn.cursor()
+        _create_index(cursor)
+
+        for source in SOURCES.values():
+            if not table_exists(cursor, source.table):
+                logger.info(f"Search source {source.name} skipped: table {source.table} missing")
+                continue
+
+            # INSERT OR REPLACE does not fire the delete trigger, so clear any stale entry first
+            insert = ";\n".join(_delete_sql(source, 'NEW') + _insert_sql(source, 'NEW'))
+            delete = ";\n".join(_delete_sql(source, 'OLD'))
+            reindex = ";\n".join(_delete_sql(source, 'OLD') + _insert_sql(source, 'NEW'))
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS search_{source.table}_ai AFTER INSERT ON {source.table}
+                BEGIN {insert}; END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS search_{source.table}_ad AFTER DELETE ON {source.table}
+                BEGIN {delete}; END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS search_{source.table}_au
+                AFTER UPDATE OF {', '.join(source.columns)} ON {source.table}
+                BEGIN {reindex}; END
+            """)
+            installed.append(source.name)
+
+        cursor.execute("SELECT COUNT(*) FROM search_documents")
+        empty = cursor.fetchone()[0] == 0
+
+    if empty and installed:
+        rebuild(db_path)
+    return installed
+
+
+def rebuild(db_path=None) -> Dict:
+    """Re-index every source from scratch; returns rows and rows/second per source"""
+    metrics = {}
+    started = time.perf_counter()
+    with connection(db_path) as conn:
+        cursor = conn.cursor()
+        _create_index(cursor)
+        cursor.execute("DELETE FROM search_index")
+        cursor.execute("DELETE FROM search_documents")
+
+        for source in SOURCES.values():
+            if not table_exists(cursor, source.table):
+                continue
+            source_started = time.perf_counter()
+            for statement in _insert_sql(source, source.table):
+                cursor.execute(statement)
+            rows = cursor.rowcount
+            seconds = time.perf_counter() - source_started
+            metrics[source.name] = {
+                'rows': rows,
+                'seconds': round(seconds, 3),
+                'rows_per_second': round(rows / seconds) if seconds else rows
+            }
+
+        cursor.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+
+    total_rows = sum(entry['rows'] for entry in metrics.values())
+    seconds = time.perf_counter() - started
+    metrics['total'] = {
+        'rows': total_rows,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(total_rows / seconds) if seconds else total_rows
+    }
+    logger.info(f"Search index rebuilt: {total_rows} documents in {seconds:.2f}s")
+    return metrics
+
+
+def build_match_query(text) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word required, the last one as a prefix.
+
+    Words are quoted so user input can never be parsed as FTS5 syntax.
+    """
+    tokens = _TOKEN_RE.findall(text or '')
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def highlight_html(text) -> str:
+    """Escaped ``text`` with FTS5 match markers turned into <mark> tags"""
+    return html.escape(text or '').replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+
+def search(text, sources=None, category=None, limit=DEFAULT_LIMIT, offset=0, db_path=None) -> Dict:
+    """BM25-ranked matches with highlighted titles and body snippets.
+
+    ``sources`` restricts results to some of SOURCES; ``category`` to one
+    category within them.
+    """
+    query = build_match_query(text)
+    if sources:
+        unknown = set(sources) - set(SOURCES)
+        if unknown:
+            raise ValueError(f"Unknown search source: {', '.join(sorted(unknown))}")
+    if not query:
+        return {'query': text, 'results': [], 'count': 0}
+
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    filters = ""
+    params = [MATCH_START, MATCH_END, MATCH_START, MATCH_END, query]
+    if sources:
+        filters += f" AND d.source IN ({', '.join('?' for _ in sources)})"
+        params.extend(sources)
+    if category:
+        filters += " AND d.category = ?"
+        params.append(category)
+    params.extend([limit, int(offset)])
+
+    with connection(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT d.source, d.source_id, d.category,
+                   highlight(search_index, 0, ?, ?),
+                   snippet(search_index, 1, ?, ?, '…', {SNIPPET_TOKENS}),
+                   bm25(search_index, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS score
+            FROM search_index
+            JOIN search_documents d ON d.rowid = search_index.rowid
+            WHERE search_index MATCH ?{filters}
+            ORDER BY score
+            LIMIT ? OFFSET ?
+        ''', params)
+        rows = cursor.fetchall()
+
+    results = [
+        {
+            'source': row[0],
+            'id': row[1],
+            'category': row[2],
+            'title': highlight_html(row[3]),
+            'snippet': highlight_html(row[4]),
+            'score': round(-row[5], 4)  # bm25() is lower-is-better
+        }
+        for row in rows
+    ]
+    return {'query': text, 'results': results, 'count': len(results)}
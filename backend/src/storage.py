@@ -0,0 +1,58 @@
+"""
+Inner Bloom Storage Configuration
+One database URI shared by Flask-SQLAlchemy and the raw-sqlite data layer
+"""
+
+import os
+import sqlite3
+
+from src.db_pool import apply_pragmas, BUSY_TIMEOUT
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATABASE_PATH = os.path.join(BACKEND_DIR, 'src', 'database', 'app.db')
+
+SQLITE_PREFIX = 'sqlite:///'
+
+
+def _resolve_path(path):
+    # Relative paths are anchored at backend/, never at the process cwd
+    if not os.path.isabs(path):
+        path = os.path.join(BACKEND_DIR, path)
+    return os.path.normpath(path)
+
+
+def database_path():
+    """Absolute path of the SQLite file every data class runs on"""
+    uri = os.getenv('DATABASE_URL')
+    if not uri:
+        path = DEFAULT_DATABASE_PATH
+    elif uri.startswith(SQLITE_PREFIX):
+        path = _resolve_path(uri[len(SQLITE_PREFIX):])
+    else:
+        raise ValueError(f"Unsupported DATABASE_URL (only sqlite is supported): {uri}")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def database_uri():
+    """SQLAlchemy URI for the configured database"""
+    return f"{SQLITE_PREFIX}{database_path()}"
+
+
+def configure_app(app):
+    """Point Flask-SQLAlchemy at the shared store with the pool's connection settings"""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {'connect_args': {'timeout': BUSY_TIMEOUT}})
+
+    if not event.contains(Engine, 'connect', _set_sqlite_pragmas):
+        event.listen(Engine, 'connect', _set_sqlite_pragmas)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_pragmas(dbapi_connection)
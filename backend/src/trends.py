@@ -0,0 +1,255 @@
+"""
+Inner Bloom Trend Engine
+Time-decayed term and phrase counts over scraped content, kept incrementally per category
+"""
+
+import os
+import re
+import math
+import time
+import json
+import heapq
+import hashlib
+import logging
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from src.db_pool import connection
+
+logger = logging.getLogger(__name__)
+
+TREND_HALF_LIFE_HOURS = float(os.getenv('TREND_HALF_LIFE_HOURS', 24))
+SKETCH_WIDTH = 2048
+SKETCH_DEPTH = 4
+CANDIDATES_PER_CATEGORY = 200
+TOPICS_PER_CATEGORY = 25
+RENORMALIZE_EXPONENT = 50.0
+
+_WORD_RE = re.compile(r"[a-z][a-z']+")
+STOPWORDS = frozenset('''
+    a about above after again against all also am an and any are as at be because been before
+    being below between both but by can could did do does doing down during each even every
+    few for from further get gets got had has have having he her here hers herself him himself
+    his how however i if in into is it its itself just like make many may me might more most
+    much must my myself new no nor not now of off on once one only or other our ours ourselves
+    out over own per really said same say says see she should since so some still such than
+    that the their theirs them themselves then there these they this those through to too two
+    under until up upon us use used using very via want was way we well were what when where
+    which while who whom why will with within without would year years yet you your yours
+    yourself yourselves don't it's i'm you're can't won't isn't that's
+'''.split())
+
+
+def tokenize(text) -> List[str]:
+    return [word.strip("'") for word in _WORD_RE.findall(text.lower())]
+
+
+def document_terms(title, content) -> set:
+    """Distinct words and two-word phrases in a document, stopwords excluded.
+
+    A phrase is two adjacent words that are both not stopwords, so
+    "financial freedom" counts but "freedom of" does not.
+    """
+    terms = set()
+    previous = None
+    for word in tokenize(f"{title or ''} {content or ''}"):
+        if len(word) < 3 or word in STOPWORDS:
+            previous = None
+            continue
+        terms.add(word)
+        if previous:
+            terms.add(f"{previous} {word}")
+        previous = word
+    return terms
+
+
+def _timestamp(value):
+    # scraped_at is CURRENT_TIMESTAMP, naive UTC
+    try:
+        return datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+
+class CategoryTrends:
+    """Count-min sketch of decayed document counts plus a bounded top-k candidate set.
+
+    Decay uses forward decay: a mention at time t adds exp(λ·(t - epoch)),
+    and a stored value is scaled back by exp(-λ·(now - epoch)) when read. So
+    older mentions fade with a half-life of TREND_HALF_LIFE_HOURS without
+    touching every counter on every update. When the weights get large
+    everything is rescaled and the epoch moves forward.
+    """
+
+    def __init__(self, epoch, counts=None, candidates=None, decay=None):
+        self.epoch = epoch
+        self.decay = decay if decay is not None else math.log(2) / (TREND_HALF_LIFE_HOURS * 3600)
+        self.counts = counts if counts is not None else array('d', bytes(8 * SKETCH_WIDTH * SKETCH_DEPTH))
+        self.candidates = candidates or {}
+        self._heap = [(score, term) for term, score in self.candidates.items()]
+        heapq.heapify(self._heap)
+
+    @staticmethod
+    def _cells(term):
+        digest = hashlib.blake2b(term.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [row * SKETCH_WIDTH + (h1 + row * h2) % SKETCH_WIDTH for row in range(SKETCH_DEPTH)]
+
+    def _estimate(self, cells):
+        return min(self.counts[cell] for cell in cells)
+
+    def _renormalize(self, at):
+        factor = math.exp(-self.decay * (at - self.epoch))
+        for i in range(len(self.counts)):
+            self.counts[i] *= factor
+        self.candidates = {term: score * factor for term, score in self.candidates.items()}
+        self._heap = [(score, term) for term, score in self.candidates.items()]
+        heapq.heapify(self._heap)
+        self.epoch = at
+
+    def _offer(self, term, score):
+        if term in self.candidates or len(self.candidates) < CANDIDATES_PER_CATEGORY:
+            self.candidates[term] = score
+            heapq.heappush(self._heap, (score, term))
+        else:
+            # Drop stale heap entries until the real minimum candidate is on top
+            while self._heap[0][0] != self.candidates.get(self._heap[0][1]):
+                heapq.heappop(self._heap)
+            if score <= self._heap[0][0]:
+                return
+            _, evicted = heapq.heapreplace(self._heap, (score, term))
+            del self.candidates[evicted]
+            self.candidates[term] = score
+
+        if len(self._heap) > 4 * CANDIDATES_PER_CATEGORY:
+            self._heap = [(score, term) for term, score in self.candidates.items()]
+            heapq.heapify(self._heap)
+
+    def add_document(self, terms, at):
+        if self.decay * (at - self.epoch) > RENORMALIZE_EXPONENT:
+            self._renormalize(at)
+        weight = math.exp(self.decay * (at - self.epoch))
+        for term in terms:
+            cells = self._cells(term)
+            for cell in cells:
+                self.counts[cell] += weight
+            self._offer(term, self._estimate(cells))
+
+    def top(self, now, limit=TOPICS_PER_CATEGORY) -> List[tuple]:
+        """(term, decayed mentions) for the highest-scoring candidates"""
+        scale = math.exp(-self.decay * (now - self.epoch))
+        ranked = sorted(self.candidates.items(), key=lambda item: item[1], reverse=True)
+        return [(term, score * scale) for term, score in ranked[:limit]]
+
+
+class TrendEngine:
+    """Keeps ``trending_topics`` up to date from ``scraped_content``.
+
+    Each ``update`` reads only rows scraped since the stored watermark, adds
+    them to their category's sketch, then rewrites the ranked topics for
+    the touched categories. Sketch state lives in ``trend_state``, so any
+    worker can run the update. The database write lock serializes
+    concurrent updates.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.init_database()
+
+    def init_database(self):
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS trend_state (
+                    category TEXT PRIMARY KEY,
+                    epoch REAL NOT NULL,
+                    sketch BLOB NOT NULL,
+                    candidates TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS trend_watermark (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    scraped_at TIMESTAMP NOT NULL
+                )
+            ''')
+
+    def _load(self, cursor, category, now) -> CategoryTrends:
+        cursor.execute("SELECT epoch, sketch, candidates FROM trend_state WHERE category = ?", (category,))
+        row = cursor.fetchone()
+        if not row:
+            return CategoryTrends(now)
+        counts = array('d')
+        counts.frombytes(row[1])
+        return CategoryTrends(row[0], counts, json.loads(row[2]))
+
+    def _save(self, cursor, category, trends, now):
+        cursor.execute('''
+            INSERT INTO trend_state (category, epoch, sketch, candidates, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(category) DO UPDATE SET
+                epoch = excluded.epoch,
+                sketch = excluded.sketch,
+                candidates = excluded.candidates,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (category, trends.epoch, trends.counts.tobytes(), json.dumps(trends.candidates)))
+
+        cursor.execute("DELETE FROM trending_topics WHERE category = ?", (category,))
+        cursor.executemany('''
+            INSERT INTO trending_topics (topic, mentions, category, last_updated)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ''', [(term, max(1, round(score)), category) for term, score in trends.top(now)])
+
+    def update(self) -> Dict:
+        """Fold newly scraped documents into the trends; returns counts of work done"""
+        now = datetime.utcnow()
+        # Rows stamped in the current second may still be arriving; take them next time
+        upper = (now - timedelta(seconds=1)).strftime('%Y-%m-%d %H:%M:%S')
+
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+
+            cursor.execute("SELECT scraped_at FROM trend_watermark WHERE id = 1")
+            row = cursor.fetchone()
+            watermark = row[0] if row else ''
+
+            cursor.execute('''
+                SELECT title, content, category, scraped_at FROM scraped_content
+                WHERE scraped_at > ? AND scraped_at <= ?
+                ORDER BY scraped_at
+            ''', (watermark, upper))
+            documents = cursor.fetchall()
+            if not documents:
+                return {'documents': 0, 'categories': []}
+
+            now_ts = time.time()
+            touched = {}
+            for title, content, category, scraped_at in documents:
+                category = category or 'general'
+                if category not in touched:
+                    touched[category] = self._load(cursor, category, now_ts)
+                touched[category].add_document(document_terms(title, content), _timestamp(scraped_at))
+
+            for category, trends in touched.items():
+                self._save(cursor, category, trends, now_ts)
+
+            cursor.execute('''
+                INSERT INTO trend_watermark (id, scraped_at) VALUES (1, ?)
+                ON CONFLICT(id) DO UPDATE SET scraped_at = excluded.scraped_at
+            ''', (documents[-1][3],))
+
+        logger.info(f"Trends updated from {len(documents)} documents in {len(touched)} categories")
+        return {'documents': len(documents), 'categories': sorted(touched)}
+
+    def rebuild(self) -> Dict:
+        """Drop all trend state and recount every scraped document"""
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM trend_state")
+            cursor.execute("DELETE FROM trend_watermark")
+            cursor.execute("DELETE FROM trending_topics")
+        return self.update()
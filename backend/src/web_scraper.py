@@ -4,93 +4,100 @@ Scrapes content for user engagement, market research, and content aggregation
 """
 
 import requests
-from bs4 import BeautifulSoup
 import json
-import time
 import random
+import hashlib
 from urllib.parse import urljoin, urlparse
 from datetime import datetime
-import sqlite3
 import logging
 
+from src.db_pool import connection
+from src.storage import database_path
+from src.lazy import LazySingleton
+from src.crawler import Crawler
+from src.html_extract import HTMLExtractor
+from src.trends import TrendEngine
+from src.retrieval import ContentIndex
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class InnerBloomScraper:
-    def __init__(self, db_path="inner_bloom.db"):
-        self.db_path = db_path
+    def __init__(self, db_path=None):
+        self.db_path = db_path or database_path()
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
         self.init_database()
+        self.trends = TrendEngine(self.db_path)
+        self.content_index = ContentIndex(self.db_path)
+        self.crawler = Crawler(self)
+        self.extractor = HTMLExtractor()
     
     def init_database(self):
         """Initialize database tables for scraped content"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create scraped_content table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS scraped_content (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                url TEXT UNIQUE,
-                title TEXT,
-                content TEXT,
-                category TEXT,
-                scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                sentiment_score REAL,
-                keywords TEXT,
-                source_domain TEXT
-            )
-        ''')
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
         
-        # Create scraping_targets table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS scraping_targets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                url TEXT UNIQUE,
-                category TEXT,
-                frequency INTEGER DEFAULT 24,
-                last_scraped TIMESTAMP,
-                active BOOLEAN DEFAULT 1
-            )
-        ''')
+            # Create scraped_content table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS scraped_content (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT UNIQUE,
+                    title TEXT,
+                    content TEXT,
+                    category TEXT,
+                    scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    sentiment_score REAL,
+                    keywords TEXT,
+                    source_domain TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash TEXT
+                )
+            ''')
         
-        # Create trending_topics table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS trending_topics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                topic TEXT,
-                mentions INTEGER DEFAULT 1,
-                sentiment REAL,
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                category TEXT
-            )
-        ''')
+            # Create scraping_targets table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS scraping_targets (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT UNIQUE,
+                    category TEXT,
+                    frequency INTEGER DEFAULT 24,
+                    last_scraped TIMESTAMP,
+                    active BOOLEAN DEFAULT 1
+                )
+            ''')
         
-        conn.commit()
-        conn.close()
+            # Create trending_topics table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS trending_topics (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    topic TEXT,
+                    mentions INTEGER DEFAULT 1,
+                    sentiment REAL,
+                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    category TEXT
+                )
+            ''')
     
     def add_scraping_target(self, url, category="general", frequency=24):
         """Add a new URL to scrape regularly"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO scraping_targets (url, category, frequency)
-                VALUES (?, ?, ?)
-            ''', (url, category, frequency))
-            conn.commit()
-            logger.info(f"Added scraping target: {url}")
-            return True
-        except Exception as e:
-            logger.error(f"Error adding scraping target: {e}")
-            return False
-        finally:
-            conn.close()
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+        
+            try:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO scraping_targets (url, category, frequency)
+                    VALUES (?, ?, ?)
+                ''', (url, category, frequency))
+                logger.info(f"Added scraping target: {url}")
+                return True
+            except Exception as e:
+                logger.error(f"Error adding scraping target: {e}")
+                return False
     
     def scrape_empowerment_content(self):
         """Scrape women's empowerment and spiritual content"""
@@ -107,33 +114,69 @@ class InnerBloomScraper:
         
         return self.scrape_all_targets()
     
+    def get_validators(self, url):
+        """(etag, last_modified, content_hash) stored for a URL, or None if never scraped"""
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT etag, last_modified, content_hash FROM scraped_content WHERE url = ?
+            ''', (url,))
+            return cursor.fetchone()
+    
+    def update_validators(self, url, etag, last_modified):
+        """Keep the newest ETag/Last-Modified for a page whose content did not change"""
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE scraped_content SET etag = ?, last_modified = ? WHERE url = ?
+            ''', (etag, last_modified, url))
+    
     def scrape_url(self, url, category="general"):
-        """Scrape content from a single URL"""
+        """Scrape content from a single URL.
+
+        Sends If-None-Match / If-Modified-Since from the last scrape. A 304,
+        or a body whose hash matches the stored one, is reported as
+        ``unchanged`` without parsing or rewriting the page.
+        """
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
+            stored = self.get_validators(url)
+            headers = {}
+            if stored and stored[0]:
+                headers['If-None-Match'] = stored[0]
+            if stored and stored[1]:
+                headers['If-Modified-Since'] = stored[1]
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            response = self.session.get(url, timeout=10, headers=headers)
+            if response.status_code == 304:
+                logger.info(f"Not modified: {url}")
+                return {'url': url, 'status': 'unchanged', 'fetched': False}
+            response.raise_for_status()
             
-            # Extract title
-            title = soup.find('title')
-            title = title.get_text().strip() if title else "No Title"
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            content_hash = hashlib.sha256(response.content).hexdigest()
             
-            # Extract main content
-            content = self.extract_main_content(soup)
+            if stored and stored[2] == content_hash:
+                if (etag, last_modified) != (stored[0], stored[1]):
+                    self.update_validators(url, etag, last_modified)
+                logger.info(f"Unchanged: {url}")
+                return {'url': url, 'status': 'unchanged', 'fetched': True}
             
-            # Extract keywords
-            keywords = self.extract_keywords(soup, content)
+            title, content, keywords = self.extractor.extract(
+                response.content, response.headers.get('Content-Type'))
             
             # Get domain
             domain = urlparse(url).netloc
             
             # Store in database
-            self.store_scraped_content(url, title, content, category, keywords, domain)
+            self.store_scraped_content(url, title, content, category, keywords, domain,
+                                       etag, last_modified, content_hash)
             
             logger.info(f"Successfully scraped: {url}")
             return {
                 'url': url,
+                'status': 'changed',
+                'fetched': True,
                 'title': title,
                 'content': content[:500] + "..." if len(content) > 500 else content,
                 'keywords': keywords,
@@ -144,149 +187,123 @@ class InnerBloomScraper:
             logger.error(f"Error scraping {url}: {e}")
             return None
     
-    def extract_main_content(self, soup):
-        """Extract main content from HTML"""
-        # Remove script and style elements
-        for script in soup(["script", "style", "nav", "footer", "header"]):
-            script.decompose()
-        
-        # Try to find main content areas
-        content_selectors = [
-            'article', 'main', '.content', '.post-content', 
-            '.entry-content', '.article-body', '.story-body'
-        ]
-        
-        content = ""
-        for selector in content_selectors:
-            elements = soup.select(selector)
-            if elements:
-                content = " ".join([elem.get_text().strip() for elem in elements])
-                break
-        
-        # Fallback to body content
-        if not content:
-            body = soup.find('body')
-            if body:
-                content = body.get_text()
-        
-        # Clean up content
-        content = " ".join(content.split())
-        return content[:2000]  # Limit content length
-    
-    def extract_keywords(self, soup, content):
-        """Extract keywords from meta tags and content"""
-        keywords = []
-        
-        # Extract from meta keywords
-        meta_keywords = soup.find('meta', attrs={'name': 'keywords'})
-        if meta_keywords:
-            keywords.extend([k.strip() for k in meta_keywords.get('content', '').split(',')])
-        
-        # Extract from meta description
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        if meta_desc:
-            desc_words = meta_desc.get('content', '').split()
-            keywords.extend([w.strip('.,!?') for w in desc_words if len(w) > 4])
-        
-        # Simple keyword extraction from content
-        empowerment_keywords = [
-            'empowerment', 'women', 'spiritual', 'growth', 'success', 
-            'entrepreneur', 'leadership', 'confidence', 'purpose', 'faith',
-            'business', 'money', 'financial', 'freedom', 'independence'
-        ]
-        
-        content_lower = content.lower()
-        for keyword in empowerment_keywords:
-            if keyword in content_lower:
-                keywords.append(keyword)
-        
-        return list(set(keywords[:10]))  # Return unique keywords, max 10
-    
-    def store_scraped_content(self, url, title, content, category, keywords, domain):
+    def store_scraped_content(self, url, title, content, category, keywords, domain,
+                              etag=None, last_modified=None, content_hash=None):
         """Store scraped content in database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+        
+            try:
+                cursor.execute('''
+                    INSERT INTO scraped_content 
+                    (url, title, content, category, keywords, source_domain, etag, last_modified, content_hash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(url) DO UPDATE SET
+                        title = excluded.title,
+                        content = excluded.content,
+                        category = excluded.category,
+                        keywords = excluded.keywords,
+                        source_domain = excluded.source_domain,
+                        etag = excluded.etag,
+                        last_modified = excluded.last_modified,
+                        content_hash = excluded.content_hash,
+                        scraped_at = CURRENT_TIMESTAMP
+                ''', (url, title, content, category, json.dumps(keywords), domain,
+                      etag, last_modified, content_hash))
+            except Exception as e:
+                logger.error(f"Error storing content: {e}")
+    
+    def active_targets(self):
+        """(url, category) for every active scraping target"""
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
         
-        try:
             cursor.execute('''
-                INSERT OR REPLACE INTO scraped_content 
-                (url, title, content, category, keywords, source_domain)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (url, title, content, category, json.dumps(keywords), domain))
-            conn.commit()
-        except Exception as e:
-            logger.error(f"Error storing content: {e}")
-        finally:
-            conn.close()
+                SELECT url, category FROM scraping_targets 
+                WHERE active = 1
+            ''')
+            return cursor.fetchall()
+    
+    def mark_scraped(self, urls):
+        """Stamp last_scraped on the targets that were just scraped"""
+        if not urls:
+            return
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE scraping_targets SET last_scraped = CURRENT_TIMESTAMP
+                WHERE url = ?
+            ''', [(url,) for url in urls])
     
     def scrape_all_targets(self):
-        """Scrape all active targets"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT url, category FROM scraping_targets 
-            WHERE active = 1
-        ''')
-        targets = cursor.fetchall()
-        conn.close()
-        
-        results = []
-        for url, category in targets:
-            result = self.scrape_url(url, category)
-            if result:
-                results.append(result)
-            
-            # Be respectful - add delay between requests
-            time.sleep(random.uniform(1, 3))
-        
-        return results
+        """Scrape all active targets concurrently; blocks until done"""
+        return self.crawler.crawl(self.active_targets())
+    
+    def start_scrape_job(self):
+        """Scrape all active targets in the background; returns the CrawlJob"""
+        return self.crawler.start(self.active_targets())
+    
+    def update_trends(self):
+        """Fold content scraped since the last update into trending_topics"""
+        return self.trends.update()
     
     def get_trending_topics(self, category=None, limit=10):
         """Get trending topics from scraped content"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if category:
-            cursor.execute('''
-                SELECT topic, mentions, sentiment FROM trending_topics 
-                WHERE category = ? 
-                ORDER BY mentions DESC, last_updated DESC 
-                LIMIT ?
-            ''', (category, limit))
-        else:
-            cursor.execute('''
-                SELECT topic, mentions, sentiment FROM trending_topics 
-                ORDER BY mentions DESC, last_updated DESC 
-                LIMIT ?
-            ''', (limit,))
-        
-        topics = cursor.fetchall()
-        conn.close()
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+        
+            if category:
+                cursor.execute('''
+                    SELECT topic, mentions, sentiment FROM trending_topics 
+                    WHERE category = ? 
+                    ORDER BY mentions DESC, last_updated DESC 
+                    LIMIT ?
+                ''', (category, limit))
+            else:
+                # Topics are ranked per category; combine a topic's mentions across them
+                cursor.execute('''
+                    SELECT topic, SUM(mentions) AS total, AVG(sentiment) FROM trending_topics 
+                    GROUP BY topic
+                    ORDER BY total DESC 
+                    LIMIT ?
+                ''', (limit,))
+        
+            topics = cursor.fetchall()
         
         return [{'topic': t[0], 'mentions': t[1], 'sentiment': t[2]} for t in topics]
     
-    def get_content_for_ai(self, category=None, limit=5):
-        """Get scraped content for AI companion to use"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if category:
-            cursor.execute('''
-                SELECT title, content, keywords FROM scraped_content 
-                WHERE category = ? 
-                ORDER BY scraped_at DESC 
-                LIMIT ?
-            ''', (category, limit))
-        else:
-            cursor.execute('''
-                SELECT title, content, keywords FROM scraped_content 
-                ORDER BY scraped_at DESC 
-                LIMIT ?
-            ''', (limit,))
-        
-        content = cursor.fetchall()
-        conn.close()
+    def get_content_for_ai(self, category=None, limit=5, query=None):
+        """Get scraped content for AI companion to use.
+
+        With ``query`` the most relevant content is returned (TF-IDF cosine
+        similarity); without it, the newest.
+        """
+        if query:
+            return [{
+                'title': doc['title'],
+                'content': doc['content'],
+                'keywords': doc['keywords'],
+                'relevance': doc['score']
+            } for doc in self.content_index.search(query, limit, category)]
+        
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+        
+            if category:
+                cursor.execute('''
+                    SELECT title, content, keywords FROM scraped_content 
+                    WHERE category = ? 
+                    ORDER BY scraped_at DESC 
+                    LIMIT ?
+                ''', (category, limit))
+            else:
+                cursor.execute('''
+                    SELECT title, content, keywords FROM scraped_content 
+                    ORDER BY scraped_at DESC 
+                    LIMIT ?
+                ''', (limit,))
+        
+            content = cursor.fetchall()
         
         return [{
             'title': c[0], 
@@ -295,52 +312,30 @@ class InnerBloomScraper:
         } for c in content]
     
     def scrape_social_media_trends(self):
-        """Scrape social media trends (Twitter-like content)"""
-        # This would integrate with social media APIs
-        # For now, we'll simulate trending topics
-        trending_topics = [
-            "women empowerment", "spiritual awakening", "financial freedom",
-            "female entrepreneurs", "self love", "manifestation", 
-            "girl boss", "divine feminine", "abundance mindset"
-        ]
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        for topic in trending_topics:
-            cursor.execute('''
-                INSERT OR REPLACE INTO trending_topics (topic, mentions, category)
-                VALUES (?, ?, ?)
-            ''', (topic, random.randint(100, 1000), "empowerment"))
-        
-        conn.commit()
-        conn.close()
-        
-        return trending_topics
+        """Current trending topics across all scraped sources.
+
+        There is no social media integration; topics come from the trend
+        engine's counts over scraped content.
+        """
+        self.update_trends()
+        return [topic['topic'] for topic in self.get_trending_topics(limit=10)]
     
     def get_content_suggestions(self, user_interests=None):
-        """Get content suggestions based on scraped data"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        """Get content suggestions based on scraped data, ranked by relevance to the interests"""
         if user_interests:
-            # Find content matching user interests
-            interest_query = " OR ".join([f"keywords LIKE '%{interest}%'" for interest in user_interests])
-            cursor.execute(f'''
-                SELECT title, content, url FROM scraped_content 
-                WHERE {interest_query}
-                ORDER BY scraped_at DESC 
-                LIMIT 5
-            ''')
+            suggestions = [
+                (doc['title'], doc['content'], doc['url'])
+                for doc in self.content_index.search(" ".join(user_interests), 5)
+            ]
         else:
-            cursor.execute('''
-                SELECT title, content, url FROM scraped_content 
-                ORDER BY scraped_at DESC 
-                LIMIT 5
-            ''')
-        
-        suggestions = cursor.fetchall()
-        conn.close()
+            with connection(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT title, content, url FROM scraped_content 
+                    ORDER BY scraped_at DESC 
+                    LIMIT 5
+                ''')
+                suggestions = cursor.fetchall()
         
         return [{
             'title': s[0],
@@ -348,8 +343,8 @@ class InnerBloomScraper:
             'url': s[2]
         } for s in suggestions]
 
-# Initialize scraper instance
-scraper = InnerBloomScraper()
+# Shared instance, created on first use
+scraper = LazySingleton(InnerBloomScraper)
 
 def setup_default_targets():
     """Set up default scraping targets for Inner Bloom"""